@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Asyncio API of modeling and inversion.
+
+The computation runs in an executor, so the event loop keeps serving.
+Requests on the same angles and options that arrive within a short window
+are stacked row-wise into one vectorized call, see Coalescer.
+
+A request can be cancelled or given a timeout. Its result is then dropped.
+A batch whose requests are all cancelled before it starts is not run.
+A batch already running in the executor runs to the end.
+"""
+
+import asyncio
+from functools import partial
+import numpy as np
+from zoeppritz.anggrid import cached_grid
+from zoeppritz.modeling import parse_angles, modeling_batch
+from zoeppritz.invcer import cer1itr
+from zoeppritz.batch import invert_chunk
+
+
+class Coalescer(object):
+    """
+    Stack the rows of concurrent requests with the same key into one call.
+
+    Parameters
+    ----------
+    func : callable
+        func(*rows, *key) computes a batch. rows are arrays with a
+        leading axis over requests, stacked from all requests of the
+        batch. It returns an array or a tuple of arrays with the same
+        leading axis, split back to the requests.
+    window : float
+        seconds to wait for more requests after the first of a batch.
+    max_batch : int
+        number of rows that starts a batch before the window ends.
+    executor : concurrent.futures.Executor
+        runs func, the event loop default if None.
+
+    Attributes
+    ----------
+    stats : dict
+        number of requests and of batches computed.
+    """
+
+    def __init__(self, func, window=0.002, max_batch=4096, executor=None):
+        self.func = func
+        self.window = window
+        self.max_batch = max_batch
+        self.executor = executor
+        self.pending = {}
+        self.stats = {'requests': 0, 'batches': 0}
+
+    async def submit(self, key, *rows):
+        """
+        Queue rows for the next batch of key and wait for their results.
+
+        Parameters
+        ----------
+        key : tuple
+            hashable, requests with equal keys are batched together.
+        rows : array
+            arrays of the same length, one row per item of the request.
+
+        Returns
+        -------
+        result : array or tuple
+            the rows of the result of this request.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self.pending.get(key)
+        if batch is None:
+            batch = self.pending[key] = []
+            loop.call_later(self.window, self._flush, key, batch)
+        batch.append((rows, future))
+        self.stats['requests'] += 1
+        if sum(len(r[0]) for r, f in batch) >= self.max_batch:
+            self._flush(key, batch)
+        return await future
+
+    def _flush(self, key, batch):
+        # The timer of a batch flushed early finds another or no batch
+        if self.pending.get(key) is batch:
+            del self.pending[key]
+            asyncio.ensure_future(self._run(key, batch))
+
+    async def _run(self, key, batch):
+        batch = [(r, f) for r, f in batch if not f.done()]
+        if not batch:
+            return
+        self.stats['batches'] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            rows = [np.concatenate(r) for r in zip(*(r for r, f in batch))]
+            result = await loop.run_in_executor(
+                self.executor, partial(self.func, *rows, *key))
+        except Exception as e:
+            if len(batch) == 1:
+                if not batch[0][1].done():
+                    batch[0][1].set_exception(e)
+            else:
+                # Rerun one by one, so bad rows fail their request only
+                for item in batch:
+                    asyncio.ensure_future(self._run(key, [item]))
+            return
+        start = 0
+        for r, f in batch:
+            stop = start + len(r[0])
+            if not f.done():
+                if isinstance(result, tuple):
+                    f.set_result(tuple(a[start:stop] for a in result))
+                else:
+                    f.set_result(result[start:stop])
+            start = stop
+
+
+def _modeling_rows(models, angles, equation, reflection):
+    return modeling_batch(models, cached_grid(angles), equation, reflection)
+
+
+def _invert_rows(rpp, x_ini, vs_vp_ratio, rps, angles, options, with_rps):
+    return invert_chunk(np.array(angles), rpp, x_ini,
+                        rps=rps if with_rps else None,
+                        vs_vp_ratio=vs_vp_ratio, **dict(options))
+
+
+class AsyncEngine(object):
+    """
+    Coalescing modeling and inversion for asyncio code.
+
+    Parameters
+    ----------
+    executor : concurrent.futures.Executor
+        runs the computation, the event loop default if None.
+    window : float
+        seconds to wait for more requests to batch together.
+    max_batch : int
+        number of models or gathers that starts a batch at once.
+    """
+
+    def __init__(self, executor=None, window=0.002, max_batch=4096):
+        self.executor = executor
+        self.modeler = Coalescer(_modeling_rows, window, max_batch, executor)
+        self.inverter = Coalescer(_invert_rows, window, max_batch, executor)
+
+    async def modeling_batch(self, models, angles, equation, reflection,
+                             timeout=None):
+        """
+        Model reflection coefficients, see modeling.modeling_batch().
+
+        Returns
+        -------
+        amp, pha : array
+            shape (k, m) for the k models.
+        """
+        key = (tuple(np.asarray(angles, dtype=float).tolist()),
+               equation, reflection)
+        models = np.atleast_2d(np.asarray(models, dtype=float))
+        return await asyncio.wait_for(self.modeler.submit(key, models),
+                                      timeout)
+
+    async def modeling(self, model, inc_angles, equation, reflection,
+                       timeout=None):
+        """
+        Same as modeling.modeling().
+
+        Returns
+        -------
+        rc : array
+            shape (m, 3) of columns incident angle, amplitude, phase.
+        """
+        angles = parse_angles(inc_angles)
+        amp, pha = await self.modeling_batch(model, angles, equation,
+                                             reflection, timeout)
+        return np.vstack((angles, amp[0], pha[0])).T
+
+    async def invert(self, angles, rpp, x_ini, vs_vp_ratio=0.5,
+                     timeout=None, rps=None, **kwargs):
+        """
+        Invert gathers, see batch.invert_chunk().
+
+        Parameters
+        ----------
+        rpp : array
+            Rpp amplitude, shape (m,) or (k, m).
+        x_ini : array
+            initial model, shape (n,) or (k, n).
+        vs_vp_ratio : float or array
+            scalar or shape (k,).
+        rps : array
+            Rps amplitude, the shape of rpp. Requests with and without
+            Rps are batched apart.
+        kwargs : dict
+            other arguments of invert_chunk(), hashable values only.
+
+        Returns
+        -------
+        x : array
+            inverted models, shape (k, n).
+        """
+        rpp = np.atleast_2d(np.asarray(rpp, dtype=float))
+        k = len(rpp)
+        x_ini = np.asarray(x_ini, dtype=float)
+        x_ini = np.broadcast_to(x_ini, (k,) + x_ini.shape[-1:])
+        ratio = np.broadcast_to(np.asarray(vs_vp_ratio, dtype=float), (k,))
+        if rps is None:
+            rps = np.empty((k, 0))
+        else:
+            rps = np.atleast_2d(np.asarray(rps, dtype=float))
+        key = (tuple(np.asarray(angles, dtype=float).tolist()),
+               tuple(sorted(kwargs.items())), rps.shape[1] > 0)
+        return await asyncio.wait_for(
+            self.inverter.submit(key, rpp, x_ini, ratio, rps), timeout)
+
+    async def cer1itr(self, angles, rpp, x_ini, timeout=None, **kwargs):
+        """
+        One iteration of invcer.cer1itr() in the executor.
+        """
+        loop = asyncio.get_running_loop()
+        func = partial(cer1itr, angles, rpp, x_ini, **kwargs)
+        return await asyncio.wait_for(
+            loop.run_in_executor(self.executor, func), timeout)
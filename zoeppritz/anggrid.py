@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Angle grid, trigonometric terms shared by all models on the same angles.
+"""
+
+from functools import lru_cache
+from math import pi, sin, cos
+import numpy as np
+
+
+class AngleGrid(object):
+    """
+    Incident angles with precomputed ray parameter and trigonometric terms.
+
+    The notation follows gracer.psct, angle 1 is the incident P-wave angle.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees.
+    vp1 : float
+        P-wave velocity of the upper layer. The default 1 is the ratio
+        model where velocities are normalized by Vp1.
+    dtype : dtype
+        float type of the trigonometric terms, float64 or float32.
+        They are computed in float64 and rounded.
+
+    Attributes
+    ----------
+    degrees : array
+        incident angles in degrees, float64.
+    radians : array
+        incident angles in radians, float64.
+    p : array
+        ray parameter, sin(angle) / vp1
+    sin1 : array
+        sin(angle)
+    sin12 : array
+        sin(angle) ** 2
+    cos1 : array
+        cos(angle)
+    sin2 : array
+        sin(2 * angle)
+    """
+
+    def __init__(self, angles, vp1=1., dtype=np.float64):
+        self.vp1 = vp1
+        self.dtype = np.dtype(dtype)
+        self.degrees = np.atleast_1d(np.asarray(angles, dtype=float))
+        self.radians = self.degrees / 180. * pi
+        sin1 = np.sin(self.radians)
+        cos1 = np.cos(self.radians)
+        self.sin1 = sin1.astype(self.dtype)
+        self.sin12 = (sin1 ** 2).astype(self.dtype)
+        self.cos1 = cos1.astype(self.dtype)
+        self.sin2 = (2 * sin1 * cos1).astype(self.dtype)
+        self.p = (sin1 / vp1).astype(self.dtype)
+
+    def __len__(self):
+        return len(self.degrees)
+
+    def astype(self, dtype):
+        """The same grid in another float type, self if it is the same."""
+        if np.dtype(dtype) == self.dtype:
+            return self
+        return AngleGrid(self.degrees, self.vp1, dtype)
+
+
+def as_grid(angles, dtype=None):
+    """
+    Return angles as an AngleGrid, reuse it if it is one already.
+
+    Parameters
+    ----------
+    angles : array or AngleGrid
+        incident angles in degrees.
+    dtype : dtype
+        float type of the grid, keep that of a grid or float64 if None.
+
+    Returns
+    -------
+    grid : AngleGrid
+    """
+    if isinstance(angles, AngleGrid):
+        return angles if dtype is None else angles.astype(dtype)
+    return AngleGrid(angles, dtype=dtype or np.float64)
+
+
+@lru_cache(maxsize=64)
+def cached_grid(angles):
+    """
+    Return a shared AngleGrid, for processes serving many requests on the
+    same angles.
+
+    Parameters
+    ----------
+    angles : tuple
+        incident angles in degrees, hashable.
+
+    Returns
+    -------
+    grid : AngleGrid
+        do not modify, it is shared by all callers.
+    """
+    return AngleGrid(angles)
+
+
+def trig(angle):
+    """
+    Get sin, sin squared, cos and sin of double angle.
+
+    Parameters
+    ----------
+    angle : float or AngleGrid
+        incident angle in radians, or an angle grid.
+
+    Returns
+    -------
+    sin1, sin12, cos1, sin2 : float or array
+    """
+    if isinstance(angle, AngleGrid):
+        return angle.sin1, angle.sin12, angle.cos1, angle.sin2
+    sin1 = sin(angle)
+    cos1 = cos(angle)
+    return sin1, sin1 ** 2, cos1, 2 * sin1 * cos1
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Streaming AVO attribute volumes from angle stacks.
+
+Each angle stack is a volume of the same shape, e.g. (inline, crossline,
+sample), usually a memmap. The attributes of a sample are the pseudo-
+inverse of the coefficient matrix, invavo.avo_pinv(), times the amplitudes
+of the sample in all stacks. The pseudo-inverse is computed once, then the
+stacks are read chunk by chunk along the first axis, and all attribute
+volumes are written in the same pass. Reading runs in a background thread,
+see pipeline.buffered(), so it overlaps the products and the writes.
+"""
+
+import numpy as np
+from zoeppritz.modavo import NPARAM
+from zoeppritz.invavo import avo_pinv
+from zoeppritz.dataio import open_gathers, create_volume, rows_per_chunk
+from zoeppritz.pipeline import buffered
+
+
+def read_stacks(stacks, chunk_size):
+    """
+    Read the same rows of all angle stacks.
+
+    Yields
+    ------
+    start, stop, block : int, int, array
+        block of shape (m,) + the chunk shape of a stack.
+    """
+    stacks = list(stacks)
+    for start in range(0, len(stacks[0]), chunk_size):
+        stop = min(start + chunk_size, len(stacks[0]))
+        yield start, stop, np.stack([s[start:stop] for s in stacks])
+
+
+def avo_attributes(stacks, outs, angles, method='shuey3', vs_vp_ratio=0.5,
+                   chunk_size=None, maxsize=2, **kwargs):
+    """
+    Compute attribute volumes from angle stacks in one pass.
+
+    Parameters
+    ----------
+    stacks : sequence
+        m angle stacks of the same shape, arrays or memmaps.
+    outs : sequence
+        n output volumes of the shape of the stacks, written in place,
+        e.g. intercept, gradient and curvature for 'shuey3'.
+    angles : array
+        incident angles of the stacks in degrees, shape (m,).
+    method : str
+        parameterization, see modavo.NPARAM.
+    vs_vp_ratio : float
+        Vs over Vp ratio of background model.
+    chunk_size : int
+        rows of the first axis per chunk, default about 64 MB per stack.
+    maxsize : int
+        chunks read ahead.
+    kwargs : dict
+        other arguments of invavo.avo_pinv(), e.g. vp_rd, gardner.
+
+    Returns
+    -------
+    nchunk : int
+        number of chunks written.
+    """
+    if len(stacks) != len(angles):
+        raise ValueError("%d stacks for %d angles" %
+                         (len(stacks), len(angles)))
+    if len(outs) != NPARAM[method]:
+        raise ValueError("%d outputs for %d parameters of %s" %
+                         (len(outs), NPARAM[method], method))
+    P = avo_pinv(method, tuple(np.asarray(angles, dtype=float).tolist()),
+                 float(vs_vp_ratio), **kwargs)
+    # Float32 stacks are computed in float32
+    P = P.astype(np.result_type(stacks[0].dtype, np.float32))
+    if chunk_size is None:
+        chunk_size = rows_per_chunk(stacks[0])
+
+    nchunk = 0
+    for start, stop, block in buffered(read_stacks(stacks, chunk_size),
+                                       maxsize):
+        attrs = np.tensordot(P, block, axes=1)
+        for out, attr in zip(outs, attrs):
+            out[start:stop] = attr
+        nchunk += 1
+    return nchunk
+
+
+def run_attributes(stack_paths, out_paths, angles, dtype=None, **kwargs):
+    """
+    Compute attribute volume files from angle stack files.
+
+    Parameters
+    ----------
+    stack_paths : sequence
+        m angle stack files, see dataio.open_gathers().
+    out_paths : sequence
+        n attribute files to create, see dataio.create_volume().
+    angles : array
+        incident angles of the stacks in degrees, shape (m,).
+    dtype : dtype
+        data type of the outputs, default that of the stacks.
+    kwargs : dict
+        other arguments of avo_attributes().
+
+    Returns
+    -------
+    nchunk : int
+        number of chunks written.
+    """
+    stacks = [open_gathers(path) for path in stack_paths]
+    if dtype is None:
+        dtype = stacks[0].dtype
+    outs = [create_volume(path, stacks[0].shape, dtype)
+            for path in out_paths]
+    nchunk = avo_attributes(stacks, outs, angles, **kwargs)
+    for out in outs:
+        out.flush()
+    return nchunk
@@ -0,0 +1,554 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Batch inversion of many gathers, chunk by chunk.
+"""
+
+import os
+from functools import lru_cache
+from inspect import signature
+from time import perf_counter
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from zoeppritz.anggrid import AngleGrid, as_grid
+from zoeppritz.modeling import modeling_batch
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modwan import wang1999
+from zoeppritz.invcer import cer1itr
+from zoeppritz.invwan import wan1inv_batch
+from zoeppritz.invaki import aki1itr
+from zoeppritz.dataio import iter_chunks
+from zoeppritz.checkpt import Checkpoint, job_header
+from zoeppritz.workspace import Workspace
+
+# Number of model parameters of each equation
+NPARAM = {'zoeppritz': 4, 'quadratic': 3, 'linear': 3}
+
+# Arguments of invert_chunk() and cer1itr() hashed as arrays or without
+# effect on the models, left out of job_options()
+JOB_EXCLUDED = ('rps', 'vs_vp_ratio', 'workspace', 'full_output')
+
+# Tile sizes in rows tried by autotune_tile()
+TILE_CANDIDATES = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def invert_chunk(angles, rpp, x_ini, equation='zoeppritz', niter=5,
+                 rps=None, vs_vp_ratio=0.5, dtype=np.float64, tol=1e-10,
+                 full_output=False, **kwargs):
+    """
+    Invert a chunk of gathers.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    rpp : array
+        Rpp amplitude, shape (k, m) for k gathers. NaN are muted samples,
+        each gather is inverted with its live angles only.
+    x_ini : array
+        Initial model, shape (n,) shared by all gathers, or (k, n).
+        The model is r1, r2, r3, r4 for 'zoeppritz', and relative
+        differences of density, Vp, Vs for 'quadratic' and 'linear'.
+    equation : str
+        'zoeppritz' by cer1itr(), 'quadratic' by wan1inv_batch() on all
+        gathers at once, 'linear' by aki1itr().
+    niter : int
+        number of iterations, the maximum for 'quadratic'.
+    rps : array
+        Rps amplitude, shape (k, m), absolute for 'zoeppritz', real with
+        sign for 'linear', not supported by 'quadratic'.
+    vs_vp_ratio : float or array
+        Vs/Vp ratio for 'quadratic' and 'linear', scalar or shape (k,).
+    dtype : dtype
+        float type of the iterations, float64 or float32. The models are
+        returned in float64.
+    tol : float
+        for 'quadratic', gathers stop updating when no parameter changes
+        by more than tol.
+    full_output : bool
+        True to also return the iterations reached by each gather.
+    kwargs : dict
+        other arguments of cer1itr(), e.g. fm, constraints.
+
+    Returns
+    -------
+    x : array
+        Inverted models, shape (k, n). Gathers with fewer live angles than
+        model parameters are NaN.
+    nit : array
+        iterations reached by each gather, shape (k,), 0 for NaN gathers.
+        Only if full_output.
+    """
+    if equation not in NPARAM:
+        raise NotImplementedError
+    if rps is not None and equation == 'quadratic':
+        raise NotImplementedError("Rps with quadratic inversion")
+    n = NPARAM[equation]
+    rpp = np.asarray(rpp, dtype=dtype)
+    angles = np.asarray(angles, dtype=float)
+    k = len(rpp)
+    x = np.array(np.broadcast_to(x_ini, (k, n)), dtype=float)
+    live = np.isfinite(rpp)
+    if rps is not None:
+        rps = np.asarray(rps, dtype=dtype)
+        live &= np.isfinite(rps)
+    full = live.all(axis=1)
+    ratio = np.broadcast_to(np.asarray(vs_vp_ratio, dtype=dtype), (k,))
+    angles_d = angles.astype(dtype)
+    if equation == 'quadratic':
+        x[:], nit = wan1inv_batch(angles_d, rpp, x.astype(dtype), ratio,
+                                  niter, tol)
+        return (x, nit) if full_output else x
+    grid = AngleGrid(angles, dtype=dtype) if equation == 'zoeppritz' \
+        else None
+    # Buffers shared by all iterations and gathers of the chunk
+    workspace = Workspace(len(angles), n, 1 if rps is None else 2, dtype)
+
+    nit = np.full(k, niter)
+    for i in range(k):
+        if full[i]:
+            keep = slice(None)
+            grid_i = grid
+        else:
+            keep = live[i]
+            if keep.sum() < n:
+                x[i] = np.nan
+                nit[i] = 0
+                continue
+            grid_i = AngleGrid(angles[keep], dtype=dtype) \
+                if grid is not None else None
+        x_i = x[i].astype(dtype)
+        rps_i = None if rps is None else rps[i][keep]
+        if equation == 'zoeppritz':
+            for j in range(niter):
+                x_i = cer1itr(grid_i, rpp[i][keep], x_i, rps=rps_i,
+                              workspace=workspace, **kwargs)
+        else:
+            for j in range(niter):
+                x_i = aki1itr(angles_d[keep], rpp[i][keep], x_i, ratio[i],
+                              workspace=workspace, rps=rps_i)
+        x[i] = x_i
+    return (x, nit) if full_output else x
+
+
+def job_options(kwargs):
+    """
+    Options of invert_chunk() and cer1itr() with their defaults filled in.
+
+    Parameters
+    ----------
+    kwargs : dict
+        keyword arguments of invert_chunk() other than the arrays.
+
+    Returns
+    -------
+    options : dict
+        for checkpt.job_header(), dtype by name.
+    """
+    options = {}
+    for func in (cer1itr, invert_chunk):
+        for name, param in signature(func).parameters.items():
+            if param.default is not param.empty and name not in JOB_EXCLUDED:
+                options[name] = param.default
+    options.update(kwargs)
+    options['dtype'] = np.dtype(options['dtype']).name
+    return options
+
+
+def run_batch(gathers, out, angles, x_ini, chunk_size=1024, rps=None,
+              vs_vp_ratio=0.5, checkpoint=None, checkpoint_every=1,
+              **kwargs):
+    """
+    Invert all gathers chunk by chunk, write the models in place.
+
+    With a checkpoint file, finished chunks and the iterations they reached
+    are appended to it every checkpoint_every chunks. A restarted run with
+    the same file restores those chunks to the output and skips them. The
+    file records the shape, chunk size, array inputs and options of the
+    job, see job_options(). A run of another job raises ValueError.
+
+    Parameters
+    ----------
+    gathers : array
+        Rpp gathers, shape (k, m), usually a memmap by
+        dataio.open_gathers().
+    out : array
+        Output models, shape (k, n), usually a memmap by
+        dataio.create_volume().
+    angles : array
+        incident angles in degrees, shape (m,).
+    x_ini : array
+        Initial model, shape (n,) or (k, n).
+    chunk_size : int
+        number of gathers per chunk.
+    rps : array
+        Rps gathers, shape (k, m), see invert_chunk().
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or shape (k,).
+    checkpoint : str
+        checkpoint file path, see checkpt.Checkpoint.
+    checkpoint_every : int
+        number of chunks between checkpoint writes.
+    kwargs : dict
+        other arguments of invert_chunk(), e.g. equation, niter.
+
+    Returns
+    -------
+    stats : dict
+        'chunks' number of chunks inverted in this run,
+        'skipped' number of chunks restored from the checkpoint,
+        'compute_time' seconds spent in inversion,
+        'checkpoint_time' seconds spent in checkpoint load and write.
+
+    Raises
+    ------
+    ValueError
+        if the checkpoint is of another job.
+    """
+    stats = {'chunks': 0, 'skipped': 0, 'compute_time': 0.,
+             'checkpoint_time': 0.}
+    ckpt, done, pending = None, set(), []
+    if checkpoint is not None:
+        t0 = perf_counter()
+        job = job_header(np.shape(gathers), chunk_size,
+                         {'angles': angles, 'x_ini': x_ini,
+                          'vs_vp_ratio': vs_vp_ratio, 'rps': rps},
+                         job_options(kwargs))
+        ckpt = Checkpoint(checkpoint, job)
+        ckpt.restore(out)
+        done = ckpt.done()
+        stats['checkpoint_time'] += perf_counter() - t0
+
+    x_ini = np.asarray(x_ini, dtype=float)
+    for start, stop, chunk in iter_chunks(gathers, chunk_size):
+        if (start, stop) in done:
+            stats['skipped'] += 1
+            continue
+        t0 = perf_counter()
+        x, nit = invert_chunk(
+            angles, chunk,
+            x_ini[start:stop] if x_ini.ndim == 2 else x_ini,
+            rps=None if rps is None else rps[start:stop],
+            vs_vp_ratio=vs_vp_ratio if np.ndim(vs_vp_ratio) == 0
+            else vs_vp_ratio[start:stop],
+            full_output=True, **kwargs)
+        out[start:stop] = x
+        stats['chunks'] += 1
+        stats['compute_time'] += perf_counter() - t0
+        if ckpt is not None:
+            pending.append((start, stop, nit, x))
+            if len(pending) >= checkpoint_every:
+                t0 = perf_counter()
+                ckpt.append(pending)
+                pending = []
+                stats['checkpoint_time'] += perf_counter() - t0
+    if ckpt is not None:
+        t0 = perf_counter()
+        ckpt.append(pending)
+        stats['checkpoint_time'] += perf_counter() - t0
+    return stats
+
+
+def run_parallel(gathers, angles, x_ini, nproc=None, chunk_size=1024,
+                 out=None, rps=None, vs_vp_ratio=0.5, **kwargs):
+    """
+    Invert all gathers with a process pool over shared memory.
+
+    Gathers and models are placed in shared memory blocks. Workers receive
+    row ranges only and write the models in place, nothing is pickled but
+    the ranges.
+
+    Parameters
+    ----------
+    gathers : array
+        Rpp gathers, shape (k, m), a memmap is copied chunk by chunk.
+    angles : array
+        incident angles in degrees, shape (m,).
+    x_ini : array
+        Initial model, shape (n,) or (k, n).
+    nproc : int
+        number of worker processes, default the number of CPUs.
+    chunk_size : int
+        number of gathers per task.
+    out : array
+        Output models, shape (k, n), a new array by default.
+    rps : array
+        Rps gathers, shape (k, m), see invert_chunk().
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or shape (k,).
+    kwargs : dict
+        other arguments of invert_chunk(), e.g. equation, niter.
+
+    Returns
+    -------
+    out : array
+        The output models.
+    """
+    k = len(gathers)
+    n = NPARAM[kwargs.get('equation', 'zoeppritz')]
+    arrays = {'rpp': gathers, 'x_ini': np.asarray(x_ini, dtype=float)}
+    if rps is not None:
+        arrays['rps'] = rps
+    if np.ndim(vs_vp_ratio) > 0:
+        arrays['vs_vp_ratio'] = np.asarray(vs_vp_ratio, dtype=float)
+    else:
+        kwargs['vs_vp_ratio'] = vs_vp_ratio
+
+    blocks, specs, views = [], {}, []
+    try:
+        for name, arr in arrays.items():
+            block, view = _share(arr.shape, np.float64)
+            blocks.append(block)
+            views.append(view)
+            for start, stop, chunk in iter_chunks(arr, chunk_size):
+                view[start:stop] = chunk
+            specs[name] = (block.name, arr.shape)
+        block, models = _share((k, n), np.float64)
+        blocks.append(block)
+        views.append(models)
+        specs['out'] = (block.name, (k, n))
+
+        ranges = [(i, min(i + chunk_size, k)) for i in range(0, k, chunk_size)]
+        with Pool(nproc, initializer=_attach,
+                  initargs=(specs, angles, kwargs)) as pool:
+            pool.starmap(_invert_range, ranges)
+
+        if out is None:
+            out = np.array(models)
+        else:
+            out[:] = models
+    finally:
+        # Views must be released before the blocks are closed
+        del views[:]
+        view = models = None
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return out
+
+
+def _share(shape, dtype):
+    """Create a shared memory block and an array view of it."""
+    nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    block = SharedMemory(create=True, size=nbytes)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+# Shared arrays and arguments of a worker process, set by _attach()
+_worker = {}
+
+
+def _attach(specs, angles, kwargs):
+    """Pool initializer, map the shared memory blocks."""
+    _worker['blocks'] = []
+    _worker['arrays'] = {}
+    for name, (block_name, shape) in specs.items():
+        block = SharedMemory(name=block_name)
+        _worker['blocks'].append(block)
+        _worker['arrays'][name] = np.ndarray(shape, dtype=np.float64,
+                                             buffer=block.buf)
+    _worker['angles'] = angles
+    _worker['kwargs'] = kwargs
+
+
+def _invert_range(start, stop):
+    """Pool task, invert rows start:stop in place."""
+    arrays = _worker['arrays']
+    kwargs = dict(_worker['kwargs'])
+    x_ini = arrays['x_ini']
+    if x_ini.ndim == 2:
+        x_ini = x_ini[start:stop]
+    if 'rps' in arrays:
+        kwargs['rps'] = arrays['rps'][start:stop]
+    if 'vs_vp_ratio' in arrays:
+        kwargs['vs_vp_ratio'] = arrays['vs_vp_ratio'][start:stop]
+    arrays['out'][start:stop] = invert_chunk(
+        _worker['angles'], arrays['rpp'][start:stop], x_ini, **kwargs)
+
+
+@lru_cache(maxsize=None)
+def autotune_tile(m, equation='zoeppritz', reflection='PP', tolerance=0.1):
+    """
+    Find the tile size of batch modeling on this machine.
+
+    Each candidate of TILE_CANDIDATES is timed once. The result is the
+    smallest tile whose time per model is within tolerance of the best,
+    as smaller tiles balance the threads better. It is cached for the
+    process.
+
+    Parameters
+    ----------
+    m : int
+        number of angles.
+    equation, reflection : str
+        see modeling.modeling_batch().
+    tolerance : float
+        relative slack to the best time per model.
+
+    Returns
+    -------
+    tile : int
+        number of models per tile.
+    """
+    grid = AngleGrid(np.linspace(0, 40, m))
+    model = np.array([3.0, 1.5, 2.3, 3.3, 1.7, 2.4])
+    models = model * np.linspace(0.95, 1.05, max(TILE_CANDIDATES))[:, None]
+    costs = []
+    for tile in TILE_CANDIDATES:
+        modeling_batch(models[:tile], grid, equation, reflection)
+        t0 = perf_counter()
+        modeling_batch(models[:tile], grid, equation, reflection)
+        costs.append((perf_counter() - t0) / tile)
+    return _pick_tile(costs, tolerance)
+
+
+@lru_cache(maxsize=None)
+def autotune_invert_tile(m, tolerance=0.1):
+    """
+    Find the tile size of 'quadratic' inversion on this machine.
+
+    As autotune_tile(), each candidate is timed once by wan1inv_batch()
+    with the default niter and tol, and the result is cached.
+
+    Parameters
+    ----------
+    m : int
+        number of angles.
+    tolerance : float
+        relative slack to the best time per gather.
+
+    Returns
+    -------
+    tile : int
+        number of gathers per tile.
+    """
+    angles = np.linspace(0, 40, m)
+    scale = np.linspace(0.8, 1.2, max(TILE_CANDIDATES))[:, None]
+    ro_rd, vp_rd, vs_rd, ratio = 0.043, 0.095, 0.125, 0.5
+    rpp = wang1999(ratio, ro_rd, vp_rd, vs_rd,
+                   inc2ave_angle(angles, vp_rd)) * scale
+    costs = []
+    for tile in TILE_CANDIDATES:
+        wan1inv_batch(angles, rpp[:tile], (0., 0., 0.), ratio)
+        t0 = perf_counter()
+        wan1inv_batch(angles, rpp[:tile], (0., 0., 0.), ratio)
+        costs.append((perf_counter() - t0) / tile)
+    return _pick_tile(costs, tolerance)
+
+
+def _pick_tile(costs, tolerance):
+    """Smallest candidate within tolerance of the best cost per row."""
+    best = min(costs)
+    for tile, cost in zip(TILE_CANDIDATES, costs):
+        if cost <= best * (1 + tolerance):
+            return tile
+
+
+def model_threaded(models, angles, equation, reflection, nthread=None,
+                   tile=None):
+    """
+    Batch modeling by tiles of models on a thread pool.
+
+    NumPy releases the GIL in the array operations of each tile, so the
+    threads run in parallel without the start and pickling cost of
+    processes.
+
+    Parameters
+    ----------
+    models : array
+        shape (k, 6), see modeling.modeling_batch().
+    angles : array or AngleGrid
+        incident angles in degrees, shape (m,).
+    equation, reflection : str
+        see modeling.modeling_batch().
+    nthread : int
+        number of threads, default the number of CPUs.
+    tile : int
+        number of models per tile, default by autotune_tile().
+
+    Returns
+    -------
+    amp, pha : array
+        shape (k, m).
+    """
+    grid = as_grid(angles)
+    models = np.asarray(models, dtype=float)
+    k, m = len(models), len(grid)
+    if tile is None:
+        tile = autotune_tile(m, equation, reflection)
+    amp = np.empty((k, m))
+    pha = np.empty((k, m))
+
+    def run(start):
+        stop = min(start + tile, k)
+        amp[start:stop], pha[start:stop] = modeling_batch(
+            models[start:stop], grid, equation, reflection)
+
+    with ThreadPoolExecutor(nthread or os.cpu_count()) as pool:
+        list(pool.map(run, range(0, k, tile)))
+    return amp, pha
+
+
+def run_threaded(gathers, out, angles, x_ini, nthread=None, chunk_size=None,
+                 rps=None, vs_vp_ratio=0.5, **kwargs):
+    """
+    Invert all gathers by chunks on a thread pool, write the models in
+    place.
+
+    Only 'quadratic' scales with threads. Its chunks are tiles inverted by
+    wan1inv_batch() in NumPy kernels, which release the GIL. The
+    'zoeppritz' and 'linear' equations invert gather by gather in a
+    Python loop, which holds the GIL, so their threads mostly take turns;
+    use run_parallel() for them.
+
+    Parameters
+    ----------
+    gathers : array
+        Rpp gathers, shape (k, m).
+    out : array
+        Output models, shape (k, n).
+    angles : array
+        incident angles in degrees, shape (m,).
+    x_ini : array
+        Initial model, shape (n,) or (k, n).
+    nthread : int
+        number of threads, default the number of CPUs.
+    chunk_size : int
+        number of gathers per chunk, default by autotune_invert_tile() for
+        'quadratic' and four chunks per thread otherwise.
+    rps : array
+        Rps gathers, shape (k, m), see invert_chunk().
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or shape (k,).
+    kwargs : dict
+        other arguments of invert_chunk(), e.g. equation, niter.
+
+    Returns
+    -------
+    out : array
+        The output models.
+    """
+    nthread = nthread or os.cpu_count()
+    k = len(gathers)
+    if chunk_size is None:
+        if kwargs.get('equation', 'zoeppritz') == 'quadratic':
+            chunk_size = autotune_invert_tile(len(angles))
+        else:
+            chunk_size = max(1, -(-k // (4 * nthread)))
+    x_ini = np.asarray(x_ini, dtype=float)
+
+    def run(start):
+        stop = min(start + chunk_size, k)
+        out[start:stop] = invert_chunk(
+            angles, gathers[start:stop],
+            x_ini[start:stop] if x_ini.ndim == 2 else x_ini,
+            rps=None if rps is None else rps[start:stop],
+            vs_vp_ratio=vs_vp_ratio if np.ndim(vs_vp_ratio) == 0
+            else vs_vp_ratio[start:stop],
+            **kwargs)
+
+    with ThreadPoolExecutor(nthread) as pool:
+        list(pool.map(run, range(0, k, chunk_size)))
+    return out
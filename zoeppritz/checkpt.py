@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Append-only checkpoint of batch inversion results.
+
+The file starts with a job header, the inputs that decide the results of
+the chunks, as JSON:
+
+    magic  4 bytes b'ZCKJ'
+    length  uint32, bytes of the JSON
+    job  JSON of job_header()
+    crc32  uint32 of everything above
+
+A checkpoint of a different job raises ValueError, so a resume with other
+chunks, arrays or options does not mix results. Each following
+record holds the models of a finished chunk of gathers:
+
+    magic  4 bytes b'ZCKP'
+    start, stop, nparam  int64 each
+    models  (stop - start) * nparam float64
+    nit  (stop - start) int64, iterations reached by each gather
+    crc32  uint32 of everything above
+
+A record cut short by a crash fails the length or CRC check. Loading stops
+there and the file is truncated to the last good record.
+"""
+
+import os
+import json
+import struct
+import zlib
+import hashlib
+import numpy as np
+from zoeppritz.dataio import rows_per_chunk
+
+MAGIC = b'ZCKP'
+JOB_MAGIC = b'ZCKJ'
+JOB_HEADER = '<4sI'
+JOB_HEADER_SIZE = struct.calcsize(JOB_HEADER)
+RECORD_HEADER = '<4s3q'
+RECORD_HEADER_SIZE = struct.calcsize(RECORD_HEADER)
+CRC_SIZE = 4
+
+
+def digest(arr):
+    """
+    SHA-1 of the shape and float64 values of an array, None for None.
+
+    Large arrays such as memmaps are read chunk by chunk.
+    """
+    if arr is None:
+        return None
+    arr = np.asanyarray(arr)
+    sha = hashlib.sha1(repr(arr.shape).encode())
+    if arr.ndim == 0:
+        sha.update(np.asarray(arr, dtype='<f8').tobytes())
+        return sha.hexdigest()
+    rows = rows_per_chunk(arr)
+    for start in range(0, len(arr), rows):
+        sha.update(np.ascontiguousarray(arr[start:start + rows],
+                                        dtype='<f8').tobytes())
+    return sha.hexdigest()
+
+
+def _jsonable(value):
+    """JSON value of NumPy scalars, arrays and dtypes."""
+    if isinstance(value, np.dtype):
+        return value.name
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError("%s in a job header" % type(value).__name__)
+
+
+def job_header(shape, chunk_size, arrays, options):
+    """
+    Job header of a batch inversion.
+
+    Parameters
+    ----------
+    shape : tuple
+        shape of the gathers.
+    chunk_size : int
+        number of gathers per chunk.
+    arrays : dict
+        array inputs of the inversion by name, e.g. angles, x_ini, rps,
+        stored as digest(). None for an input not given.
+    options : dict
+        scalar inputs of the inversion by name, e.g. equation, niter,
+        tol, stored as values.
+
+    Returns
+    -------
+    job : dict
+        JSON-serializable job header.
+    """
+    job = {'shape': [int(n) for n in shape], 'chunk_size': int(chunk_size),
+           'arrays': {name: digest(arr) for name, arr in arrays.items()},
+           'options': options}
+    return json.loads(json.dumps(job, sort_keys=True, default=_jsonable))
+
+
+class Checkpoint(object):
+    """
+    Checkpoint file of finished chunks.
+
+    Parameters
+    ----------
+    path : str
+        file path, created if it does not exist.
+    job : dict
+        job header by job_header(), written to a new file and compared
+        with that of an existing file. None to read any job.
+
+    Raises
+    ------
+    ValueError
+        if the file is of another job.
+    """
+
+    def __init__(self, path, job=None):
+        self.path = path
+        self.job = job
+        self.records = []
+        if os.path.exists(path):
+            self._load()
+        elif job is not None:
+            self._write_job()
+
+    def _write_job(self):
+        text = json.dumps(self.job, sort_keys=True).encode()
+        body = struct.pack(JOB_HEADER, JOB_MAGIC, len(text)) + text
+        with open(self.path, 'wb') as fp:
+            fp.write(body + struct.pack('<I', zlib.crc32(body)))
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def _load_job(self, buf):
+        """Job of the file and its size, None if cut short."""
+        if len(buf) < JOB_HEADER_SIZE:
+            return None, 0
+        magic, length = struct.unpack_from(JOB_HEADER, buf)
+        end = JOB_HEADER_SIZE + length + CRC_SIZE
+        if magic != JOB_MAGIC:
+            raise ValueError("%s is not a checkpoint" % self.path)
+        if end > len(buf):
+            return None, 0
+        crc, = struct.unpack_from('<I', buf, end - CRC_SIZE)
+        if crc != zlib.crc32(buf[:end - CRC_SIZE]):
+            return None, 0
+        return json.loads(buf[JOB_HEADER_SIZE:end - CRC_SIZE]), end
+
+    def _load(self):
+        with open(self.path, 'rb') as fp:
+            buf = fp.read()
+        job, pos = self._load_job(buf)
+        if job is None:
+            # Cut short before any record, start the file again
+            if self.job is not None:
+                self._write_job()
+            return
+        if self.job is None:
+            self.job = job
+        elif json.loads(json.dumps(self.job)) != job:
+            raise ValueError("Checkpoint %s is of job %s, not %s" %
+                             (self.path, job, self.job))
+        while pos + RECORD_HEADER_SIZE <= len(buf):
+            magic, start, stop, nparam = struct.unpack_from(
+                RECORD_HEADER, buf, pos)
+            count = stop - start
+            size = count * (nparam + 1) * 8
+            end = pos + RECORD_HEADER_SIZE + size + CRC_SIZE
+            if magic != MAGIC or count < 0 or end > len(buf):
+                break
+            crc, = struct.unpack_from('<I', buf, end - CRC_SIZE)
+            if crc != zlib.crc32(buf[pos:end - CRC_SIZE]):
+                break
+            offset = pos + RECORD_HEADER_SIZE
+            x = np.frombuffer(buf, '<f8', count * nparam, offset)
+            nit = np.frombuffer(buf, '<i8', count, offset + count * nparam * 8)
+            self.records.append((start, stop, nit,
+                                 x.reshape(count, nparam)))
+            pos = end
+        if pos < len(buf):
+            with open(self.path, 'r+b') as fp:
+                fp.truncate(pos)
+
+    def done(self):
+        """Set of (start, stop) of finished chunks."""
+        return set((r[0], r[1]) for r in self.records)
+
+    def restore(self, out):
+        """
+        Copy the checkpointed models to the output.
+
+        Parameters
+        ----------
+        out : array
+            models of all gathers, shape (k, n).
+        """
+        for start, stop, nit, x in self.records:
+            out[start:stop] = x
+
+    def append(self, records):
+        """
+        Append records and flush them to disk.
+
+        Parameters
+        ----------
+        records : list
+            (start, stop, nit, x) of finished chunks, x has shape
+            (stop - start, n) and nit the iterations reached by each
+            gather, scalar or shape (stop - start,).
+        """
+        if not records:
+            return
+        if not os.path.exists(self.path):
+            self._write_job()
+        parts = []
+        for start, stop, nit, x in records:
+            x = np.ascontiguousarray(x, dtype='<f8')
+            nit = np.ascontiguousarray(np.broadcast_to(nit, (stop - start,)),
+                                       dtype='<i8')
+            body = struct.pack(RECORD_HEADER, MAGIC, start, stop,
+                               x.shape[1]) + x.tobytes() + nit.tobytes()
+            parts.append(body + struct.pack('<I', zlib.crc32(body)))
+        with open(self.path, 'ab') as fp:
+            fp.write(b''.join(parts))
+            fp.flush()
+            os.fsync(fp.fileno())
+        self.records.extend(records)
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Memory-mapped gather and parameter volume I/O.
+
+Gathers are 2-D arrays of shape (number of gathers, number of angles),
+one row per gather, e.g. a time sample of a CDP angle gather.
+Parameter volumes have one row per gather and one column per parameter,
+e.g. r1, r2, r3, r4 or density, Vp, Vs relative differences.
+
+Two file formats are supported, chosen by file extension:
+    .npy   NumPy format
+    other  raw binary with a small header, see write_header()
+"""
+
+import struct
+import numpy as np
+
+MAGIC = b'ZOEPRAW1'
+HEADER_SIZE = 128
+MAX_NDIM = 6
+# magic, dtype string, ndim, shape
+HEADER_FORMAT = '<8s8sI4x%dQ' % MAX_NDIM
+
+
+def write_header(fp, shape, dtype):
+    """
+    Write the raw binary header.
+
+    Parameters
+    ----------
+    fp : file
+        binary file opened for writing, at position 0.
+    shape : tuple
+        array shape, at most 6 dimensions.
+    dtype : numpy dtype
+        array data type, e.g. '<f4', '>f8'.
+    """
+    shape = tuple(int(n) for n in shape)
+    if len(shape) > MAX_NDIM:
+        raise ValueError("Too many dimensions {}".format(shape))
+    descr = np.dtype(dtype).str.encode('ascii')
+    dims = shape + (0,) * (MAX_NDIM - len(shape))
+    header = struct.pack(HEADER_FORMAT, MAGIC, descr, len(shape), *dims)
+    fp.write(header.ljust(HEADER_SIZE, b'\0'))
+
+
+def read_header(fp):
+    """
+    Read the raw binary header.
+
+    Parameters
+    ----------
+    fp : file
+        binary file opened for reading, at position 0.
+
+    Returns
+    -------
+    shape : tuple
+        array shape
+    dtype : numpy dtype
+        array data type
+    """
+    header = fp.read(HEADER_SIZE)
+    size = struct.calcsize(HEADER_FORMAT)
+    if len(header) < HEADER_SIZE or header[:8] != MAGIC:
+        raise ValueError("Not a raw gather file")
+    magic, descr, ndim, *dims = struct.unpack(HEADER_FORMAT, header[:size])
+    dtype = np.dtype(descr.rstrip(b'\0').decode('ascii'))
+    return tuple(dims[:ndim]), dtype
+
+
+def open_gathers(path, mode='r'):
+    """
+    Memory-map a gather or parameter file.
+
+    Parameters
+    ----------
+    path : str
+        file path, .npy or raw binary with header.
+    mode : str
+        'r' for read only, 'r+' for read and write in place.
+
+    Returns
+    -------
+    arr : memmap
+        memory-mapped array, nothing is read until it is accessed.
+    """
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode=mode)
+    with open(path, 'rb') as fp:
+        shape, dtype = read_header(fp)
+    return np.memmap(path, dtype=dtype, mode=mode, offset=HEADER_SIZE,
+                     shape=shape)
+
+
+def create_volume(path, shape, dtype=np.float64):
+    """
+    Create a memory-mapped file to be filled in place, e.g. inverted
+    parameters.
+
+    Parameters
+    ----------
+    path : str
+        file path, .npy or raw binary with header.
+    shape : tuple
+        array shape, e.g. (number of gathers, number of parameters).
+    dtype : numpy dtype
+        array data type.
+
+    Returns
+    -------
+    arr : memmap
+        writable memory-mapped array.
+    """
+    if path.endswith('.npy'):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                         shape=tuple(shape))
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, 'wb') as fp:
+        write_header(fp, shape, dtype)
+        fp.truncate(HEADER_SIZE + nbytes)
+    return open_gathers(path, mode='r+')
+
+
+def save_gathers(path, arr):
+    """
+    Write an in-memory array to a gather file.
+
+    Parameters
+    ----------
+    path : str
+        file path, .npy or raw binary with header.
+    arr : array
+        the array to write.
+    """
+    arr = np.asarray(arr)
+    out = create_volume(path, arr.shape, arr.dtype)
+    for start, stop, chunk in iter_chunks(arr, rows_per_chunk(arr)):
+        out[start:stop] = chunk
+    out.flush()
+    del out
+
+
+def rows_per_chunk(arr, nbytes=64 * 2**20):
+    """
+    Number of rows of a chunk of about nbytes.
+
+    Parameters
+    ----------
+    arr : array
+        the array to be chunked along the first axis.
+    nbytes : int
+        target chunk size in bytes, default 64 MB.
+
+    Returns
+    -------
+    rows : int
+        number of rows per chunk, at least 1.
+    """
+    row_bytes = arr.itemsize * int(np.prod(arr.shape[1:]))
+    return max(1, nbytes // max(1, row_bytes))
+
+
+def iter_chunks(arr, chunk_size, start=0, stop=None):
+    """
+    Iterate fixed-size chunks of rows.
+
+    Parameters
+    ----------
+    arr : array
+        array or memmap, chunked along the first axis.
+    chunk_size : int
+        number of rows per chunk, the last chunk may be shorter.
+    start : int
+        first row
+    stop : int
+        end row, exclusive, default is the number of rows.
+
+    Yields
+    ------
+    start : int
+        first row of the chunk
+    stop : int
+        end row of the chunk, exclusive
+    chunk : array
+        view of the rows, read from disk when accessed.
+    """
+    if stop is None:
+        stop = len(arr)
+    for i in range(start, stop, chunk_size):
+        j = min(i + chunk_size, stop)
+        yield i, j, arr[i:j]
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+D-optimal selection of incident angles.
+
+The information of a set of angles about r1, r2, r3, r4 is M = J'J, with
+J the rows of gracer.jacobian() at the angles. Angles are added greedily,
+each the one of the largest gain of log det M summed over the models.
+By the matrix determinant lemma, adding the rows A of an angle gains
+log det(I + A M^-1 A'), and M^-1 is updated by the Woodbury identity,
+Sherman-Morrison for PP only, so no step factorizes a candidate. M starts
+from a ridge far below the information of any useful set of angles.
+"""
+
+import numpy as np
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.gracer import jacobian
+
+
+def angle_rows(angles, models, rps=False, fm='analytic'):
+    """
+    Jacobian rows of each angle.
+
+    Parameters
+    ----------
+    angles : array
+        candidate incident angles in degrees, shape (m,).
+    models : array
+        models r1, r2, r3, r4, shape (4,) or (k, 4) for a distribution.
+    rps : bool
+        True to add the PS row of each angle.
+    fm : str
+        the method of the Jacobian, 'numeric' or 'analytic'.
+
+    Returns
+    -------
+    rows : array
+        shape (k, m, r, 4), r is 1 for PP and 2 for PP and PS.
+    """
+    models = np.atleast_2d(np.asarray(models, dtype=float))
+    grid = AngleGrid(angles)
+    r = tuple(models[:, i:i + 1] for i in range(4))
+    modes = ('PP', 'PS') if rps else ('PP',)
+    return np.stack([jacobian(*r, grid, mode, method=fm) for mode in modes],
+                    axis=2)
+
+
+def log_det_information(angles, models, rps=False, fm='analytic'):
+    """
+    Sum over the models of log det J'J of a set of angles.
+    """
+    rows = angle_rows(angles, models, rps, fm)
+    J = rows.reshape(len(rows), -1, 4)
+    return np.linalg.slogdet(np.einsum('kmi,kmj->kij', J, J))[1].sum()
+
+
+def select_angles(angles, models, nangle, rps=False, fm='analytic',
+                  ridge=1e-9):
+    """
+    Greedy D-optimal selection of angles.
+
+    Parameters
+    ----------
+    angles : array
+        candidate incident angles in degrees, shape (m,).
+    models : array
+        models r1, r2, r3, r4, shape (4,) or (k, 4) for a distribution,
+        e.g. samples of the expected models.
+    nangle : int
+        number of angles to select.
+    rps, fm
+        see angle_rows().
+    ridge : float
+        initial M is ridge times the smallest eigenvalue of the
+        information of all angles, so the first angles have finite gains.
+        It is negligible next to the information of the selected angles,
+        and the greedy steps are those of the pseudo-determinant until M
+        has full rank.
+
+    Returns
+    -------
+    index : array
+        indices of the selected angles, in the order of selection.
+    log_det : array
+        sum over the models of log det of the information of the angles
+        selected so far, without the ridge. It is -inf while they are
+        fewer than the parameters.
+    """
+    rows = angle_rows(angles, models, rps, fm)
+    k, m, r, n = rows.shape
+    if not 0 < nangle <= m:
+        raise ValueError("Select %d of %d angles" % (nangle, m))
+    full = np.einsum('kmai,kmaj->kij', rows, rows)
+    eig = np.linalg.eigvalsh(full)
+    scale = ridge * np.maximum(eig[:, 0], np.finfo(float).eps * eig[:, -1])
+    Minv = np.eye(n) / scale[:, None, None]
+    M = np.zeros((k, n, n))
+    eye = np.eye(r)
+
+    index = []
+    history = []
+    free = np.ones(m, dtype=bool)
+    for step in range(nangle):
+        # S = I + A M^-1 A' of every model and candidate, (k, m, r, r)
+        AM = np.einsum('kmai,kij->kmaj', rows, Minv)
+        S = eye + np.einsum('kmaj,kmbj->kmab', AM, rows)
+        gain = np.linalg.slogdet(S)[1].sum(axis=0)
+        gain[~free] = -np.inf
+        best = int(np.argmax(gain))
+        # Woodbury, M^-1 -= M^-1 A' S^-1 A M^-1
+        AMb = AM[:, best]
+        Minv = Minv - np.einsum('kai,kab,kbj->kij', AMb,
+                                np.linalg.inv(S[:, best]), AMb)
+        M += np.einsum('kai,kaj->kij', rows[:, best], rows[:, best])
+        if (step + 1) * r >= n > step * r:
+            # Full rank, drop the rounding of the 1 / ridge terms
+            Minv = np.linalg.inv(M + scale[:, None, None] * np.eye(n))
+        sign, logdet = np.linalg.slogdet(M)
+        if (step + 1) * r < n:
+            logdet = -np.inf
+        free[best] = False
+        index.append(best)
+        history.append(np.where(sign > 0, logdet, -np.inf).sum())
+    return np.array(index), np.array(history)
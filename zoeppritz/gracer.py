@@ -4,7 +4,9 @@
 Zoeppritz partial derivatives
 """
 
-from math import pi, sin, cos, sqrt
+from math import pi
+import numpy as np
+from zoeppritz.anggrid import AngleGrid, as_grid, trig
 from zoeppritz.modcer import rpp_cer1977, rps_cer1977, physics_check
 
 
@@ -42,9 +44,105 @@ def gradient(r1, r2, r3, r4, angle, mode, rid, method='numeric', delta=0.001):
     return gra
 
 
+def jacobian(r1, r2, r3, r4, angles, mode, method='numeric', delta=0.001,
+             dtype=None, out=None):
+    """
+    Calculate the Jacobian matrix w.r.t. r1-r4 at all angles in one pass.
+
+    Parameters
+    ----------
+    r1, r2, r3, r4 : float or array
+        The ratio model, arrays are broadcast against the angles,
+        e.g. shape (k, 1) for k models.
+    angles : float, array or AngleGrid
+        incident angles in degrees.
+    mode : str
+        'PP' or 'PS'
+    method : str
+        'numeric' or 'analytic'
+    delta : float
+        perturbation amount of the numeric method
+    dtype : dtype
+        float type of the numeric method, that of the angle grid or
+        float64 if None.
+    out : array
+        buffer to fill in place, shape (..., m, 4), or (..., 4) for a
+        scalar angle.
+
+    Returns
+    -------
+    jac : array
+        Partial derivatives, shape (..., m, 4), or (..., 4) for a scalar
+        angle, the last axis is for r1, r2, r3, r4, respectively.
+    """
+    if np.ndim(angles) == 0 and not isinstance(angles, AngleGrid):
+        # A scalar angle in degrees is a grid of one angle
+        col = None if out is None else out[..., None, :]
+        return jacobian(r1, r2, r3, r4, [angles], mode, method, delta,
+                        dtype, col)[..., 0, :]
+    grid = as_grid(angles, dtype)
+    if method == 'numeric':
+        if mode == 'PP':
+            forward, amp_type = rpp_cer1977, 'real'
+        elif mode == 'PS':
+            forward, amp_type = rps_cer1977, 'abs'
+        else:
+            raise ValueError("Unsupported wave mode")
+        # The base amplitude is shared by the four perturbations
+        a1, _ = forward(r1, r2, r3, r4, grid, amp_type=amp_type)
+        models = ((r1 + delta, r2, r3, r4), (r1, r2 + delta, r3, r4),
+                  (r1, r2, r3 + delta, r4), (r1, r2, r3, r4 + delta))
+        for i, model in enumerate(models):
+            a2, _ = forward(*model, grid, amp_type=amp_type)
+            if out is None:
+                shape = np.broadcast_shapes(np.shape(a1), np.shape(a2))
+                out = np.empty(shape + (4,), dtype=np.result_type(a1, a2))
+            col = out[..., i]
+            np.subtract(a2, a1, out=col)
+            col /= delta
+        return out
+    cols = [gradient(r1, r2, r3, r4, grid, mode, rid, method=method)
+            for rid in range(1, 5)]
+    cols = np.broadcast_arrays(*cols)
+    if out is None:
+        return np.stack(cols, axis=-1)
+    for i, col in enumerate(cols):
+        out[..., i] = col
+    return out
+
+
+def to_radians(angle):
+    """Convert angle in degrees to radians, angle grids are kept."""
+    if isinstance(angle, AngleGrid):
+        return angle
+    if np.ndim(angle) > 0:
+        return AngleGrid(angle)
+    return angle * pi / 180.0
+
+
+def postcritical(r1, angle):
+    """
+    Flag post-critical incident angles, r1 * sin(angle) >= 1.
+
+    Parameters
+    ----------
+    r1 : float or array
+        Vp2 / Vp1, arrays are broadcast against the angles.
+    angle : float or AngleGrid
+        incident angle in radians, or an angle grid.
+
+    Returns
+    -------
+    flag : bool or array
+        True at post-critical angles.
+    """
+    sin1 = trig(angle)[0]
+    return r1 * sin1 >= 1
+
+
 def stability_check(r1, angle):
     # require Vp1 > Vp2, i.e., r1 < 1
-    if (r1 * sin(angle)) >= 1:
+    if np.any(postcritical(r1, angle)):
         raise ValueError("Cannot handle post-critical angle")
     # Physically, Vp always larger than Vs, so
     # alpha1 > beta1, alpha2 > beta2
@@ -53,11 +151,12 @@ def stability_check(r1, angle):
 
 
 def getqt(r1, r2, r3, r4, angle):
-    Q = 2 * sin(angle)**2 * (r4*r3**2 - r2**2)
-    T0 = sin(angle) / cos(angle)
-    T1 = r1 * sin(angle) / sqrt(1.0 - r1**2 * sin(angle)**2)
-    T2 = r2 * sin(angle) / sqrt(1.0 - r2**2 * sin(angle)**2)
-    T3 = r3 * sin(angle) / sqrt(1.0 - r3**2 * sin(angle)**2)
+    sin1, sin12, cos1, _ = trig(angle)
+    Q = 2 * sin12 * (r4*r3**2 - r2**2)
+    T0 = sin1 / cos1
+    T1 = r1 * sin1 / np.sqrt(1.0 - r1**2 * sin12)
+    T2 = r2 * sin1 / np.sqrt(1.0 - r2**2 * sin12)
+    T3 = r3 * sin1 / np.sqrt(1.0 - r3**2 * sin12)
     return Q, T0, T1, T2, T3
 
 
@@ -78,7 +177,7 @@ def ppr1(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -87,7 +186,7 @@ def ppr1(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r1
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     Q, T0, T1, T2, T3 = getqt(r1, r2, r3, r4, angle)
 
@@ -173,7 +272,7 @@ def ppr2(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -182,7 +281,7 @@ def ppr2(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r2
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     Q, T0, T1, T2, T3 = getqt(r1, r2, r3, r4, angle)
 
@@ -191,7 +290,7 @@ def ppr2(r1, r2, r3, r4, angle):
     tc2 = (r4 - Q)
     tc3 = (r4 - Q - 1)
 
-    tc4 = 8 * r2 * sin(angle)**2
+    tc4 = 8 * r2 * trig(angle)[1]
 
     # Notation:
     # term, page #, counting #
@@ -279,7 +378,7 @@ def ppr3(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -288,7 +387,7 @@ def ppr3(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r3
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     Q, T0, T1, T2, T3 = getqt(r1, r2, r3, r4, angle)
 
@@ -297,7 +396,7 @@ def ppr3(r1, r2, r3, r4, angle):
     tc2 = (r4 - Q)
     tc3 = (r4 - Q - 1)
 
-    tc4 = 8 * r3 * r4 * sin(angle) ** 2
+    tc4 = 8 * r3 * r4 * trig(angle)[1]
 
     # Notation:
     # term, page  # , counting #
@@ -383,7 +482,7 @@ def ppr4(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -392,7 +491,7 @@ def ppr4(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r4
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     Q, T0, T1, T2, T3 = getqt(r1, r2, r3, r4, angle)
 
@@ -401,8 +500,9 @@ def ppr4(r1, r2, r3, r4, angle):
     tc2 = (r4 - Q)
     tc3 = (r4 - Q - 1)
 
-    tc4 = 4 * r3 ** 2 * sin(angle) ** 2
-    tc5 = 2 * (1 - 2 * r3 ** 2 * sin(angle) ** 2)
+    sin12 = trig(angle)[1]
+    tc4 = 4 * r3 ** 2 * sin12
+    tc5 = 2 * (1 - 2 * r3 ** 2 * sin12)
 
     # Notation:
     # term, page  # , counting #
@@ -464,15 +564,15 @@ def ppr4(r1, r2, r3, r4, angle):
 def psct(r1, r2, r3, r4, angle):
     """Get the common terms for PS frechet derivatives"""
     # --- constantly used terms ---
-    sin12 = sin(angle) ** 2
+    _, sin12, _, sin2 = trig(angle)
     r12 = r1 * r1
     r22 = r2 * r2
     r32 = r3 * r3
     r42 = r4 * r4
-    q1 = sqrt(1 - sin12)
-    q2 = sqrt(1 - r12 * sin12)
-    q3 = sqrt(1 - r22 * sin12)
-    q4 = sqrt(1 - r32 * sin12)
+    q1 = np.sqrt(1 - sin12)
+    q2 = np.sqrt(1 - r12 * sin12)
+    q3 = np.sqrt(1 - r22 * sin12)
+    q4 = np.sqrt(1 - r32 * sin12)
     Q = 2 * sin12 * (r4 * r32 - r22)
     a = r4 - Q - 1
     b = r4 - Q
@@ -489,7 +589,6 @@ def psct(r1, r2, r3, r4, angle):
     l = r22 / (r1 * r32) + r4 / r1
     m = 1 - 2 * r32 * sin12
     n = q2 * q3 / r1 + r2 * q1 * q4 / r3
-    sin2 = sin(2 * angle)
     b2 = b * b
     c2 = c * c
     return q1, q2, q3, q4, a, b, c, d, e, f, g, h, i, j, k, l, m, n, \
@@ -514,7 +613,7 @@ def psr1(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -523,7 +622,7 @@ def psr1(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r1
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     #
     q1, q2, q3, q4, a, b, c, d, e, f, g, h, i, j, k, l, m, n, \
@@ -581,7 +680,7 @@ def psr2(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -590,7 +689,7 @@ def psr2(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r1
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     #
     q1, q2, q3, q4, a, b, c, d, e, f, g, h, i, j, k, l, m, n, \
@@ -653,7 +752,7 @@ def psr3(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -662,7 +761,7 @@ def psr3(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r1
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     #
     q1, q2, q3, q4, a, b, c, d, e, f, g, h, i, j, k, l, m, n, \
@@ -724,7 +823,7 @@ def psr4(r1, r2, r3, r4, angle):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    angle : float
+    angle : float or AngleGrid
         incident angle in degrees
 
     Returns
@@ -733,7 +832,7 @@ def psr4(r1, r2, r3, r4, angle):
         gradient or partial derivative w.r.t. r1
     """
     physics_check(r1, r2, r3, r4, angle)
-    angle = angle * pi / 180.0
+    angle = to_radians(angle)
     stability_check(r1, angle)
     #
     q1, q2, q3, q4, a, b, c, d, e, f, g, h, i, j, k, l, m, n, \
@@ -805,13 +904,13 @@ def pdn(r1, r2, r3, r4, angle, mode, rid, delta=0.001):
     if mode is 'PP':
         a1, _ = rpp_cer1977(r1, r2, r3, r4, angle)
         if rid == 1:
-            r1 += delta
+            r1 = r1 + delta
         elif rid == 2:
-            r2 += delta
+            r2 = r2 + delta
         elif rid == 3:
-            r3 += delta
+            r3 = r3 + delta
         elif rid == 4:
-            r4 += delta
+            r4 = r4 + delta
         else:
             raise ValueError("Illegal ratio index")
         a2, _ = rpp_cer1977(r1, r2, r3, r4, angle)
@@ -819,13 +918,13 @@ def pdn(r1, r2, r3, r4, angle, mode, rid, delta=0.001):
     elif mode is 'PS':
         a1, _ = rps_cer1977(r1, r2, r3, r4, angle, amp_type='abs')
         if rid == 1:
-            r1 += delta
+            r1 = r1 + delta
         elif rid == 2:
-            r2 += delta
+            r2 = r2 + delta
         elif rid == 3:
-            r3 += delta
+            r3 = r3 + delta
         elif rid == 4:
-            r4 += delta
+            r4 = r4 + delta
         else:
             raise ValueError("Illegal ratio index")
         a2, _ = rps_cer1977(r1, r2, r3, r4, angle, amp_type='abs')
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Elastic impedance (Connolly, 1999) and extended elastic impedance
+(Whitcombe et al., 2002) of Vp, Vs and density arrays.
+
+Both are normalized by a background vp0, vs0, ro0,
+
+    EI = vp0 * ro0 * (vp / vp0) ** a * (vs / vs0) ** b * (ro / ro0) ** c
+
+so that EI has the unit of acoustic impedance at all angles. The background
+Vs/Vp ratio K is vs0 / vp0, the ratio of averages as in
+utils.elapar_hs2delta(). A background of (1, 1, 1) gives Connolly's
+original EI. The exponents of several angles are applied in one broadcast
+along a new leading axis.
+"""
+
+import numpy as np
+from zoeppritz.dataio import rows_per_chunk
+from zoeppritz.pipeline import buffered
+
+
+def ei_exponents(angles, vs_vp_ratio):
+    """
+    Exponents of elastic impedance.
+
+    Parameters
+    ----------
+    angles : float or array
+        incident angles in degrees.
+    vs_vp_ratio : float
+        Vs over Vp ratio of background model.
+
+    Returns
+    -------
+    a, b, c : array
+        exponents of Vp, Vs and density, the shape of angles.
+    """
+    theta = np.radians(angles)
+    ks2 = vs_vp_ratio ** 2 * np.sin(theta) ** 2
+    return 1 + np.tan(theta) ** 2, -8 * ks2, 1 - 4 * ks2
+
+
+def eei_exponents(chi, vs_vp_ratio):
+    """
+    Exponents of extended elastic impedance.
+
+    Parameters
+    ----------
+    chi : float or array
+        chi angles in degrees, from -90 to 90.
+    vs_vp_ratio : float
+        Vs over Vp ratio of background model.
+
+    Returns
+    -------
+    p, q, r : array
+        exponents of Vp, Vs and density, the shape of chi.
+    """
+    chi = np.radians(chi)
+    k2 = vs_vp_ratio ** 2
+    return (np.cos(chi) + np.sin(chi), -8 * k2 * np.sin(chi),
+            np.cos(chi) - 4 * k2 * np.sin(chi))
+
+
+def background(vp, vs, ro, chunk_size=None):
+    """
+    Background of the impedances, the means ignoring NaN.
+
+    The means are accumulated chunk by chunk along the first axis, so
+    memmaps are read in one pass without a full copy in memory.
+
+    Parameters
+    ----------
+    vp, vs, ro : array
+        Vp, Vs and density of the same shape, arrays or memmaps.
+    chunk_size : int
+        rows of the first axis per chunk, default about 64 MB per volume.
+
+    Returns
+    -------
+    vp0, vs0, ro0 : float
+    """
+    vp, vs, ro = (np.asanyarray(x) for x in (vp, vs, ro))
+    if vp.ndim == 0:
+        return float(vp), float(vs), float(ro)
+    if chunk_size is None:
+        chunk_size = rows_per_chunk(vp)
+    sums = np.zeros(3)
+    counts = np.zeros(3)
+    for start, stop, logs in read_elastic(vp, vs, ro, chunk_size):
+        for i, x in enumerate(logs):
+            live = np.isfinite(x)
+            sums[i] += x[live].sum()
+            counts[i] += live.sum()
+    return tuple(float(v) for v in sums / counts)
+
+
+def impedance(vp, vs, ro, exponents, back):
+    """
+    Normalized impedance of given exponents.
+
+    Parameters
+    ----------
+    vp, vs, ro : array
+        Vp, Vs and density of the same shape.
+    exponents : tuple
+        exponents of Vp, Vs and density, scalar or shape (n,).
+    back : tuple
+        background vp0, vs0, ro0.
+
+    Returns
+    -------
+    imp : array
+        the shape of vp, or (n,) + the shape of vp.
+    """
+    vp0, vs0, ro0 = back
+    vp, vs, ro = (np.asarray(x) for x in (vp, vs, ro))
+    a, b, c = (np.reshape(e, np.shape(e) + (1,) * vp.ndim)
+               for e in exponents)
+    log_imp = a * np.log(vp / vp0) + b * np.log(vs / vs0) + \
+        c * np.log(ro / ro0)
+    return vp0 * ro0 * np.exp(log_imp)
+
+
+def elastic_impedance(vp, vs, ro, angles, vs_vp_ratio=None, back=None):
+    """
+    Elastic impedance of Connolly (1999), normalized.
+
+    Parameters
+    ----------
+    vp, vs, ro : array
+        Vp, Vs and density of the same shape, e.g. logs or volumes.
+    angles : float or array
+        incident angles in degrees, scalar or shape (n,).
+    vs_vp_ratio : float
+        background Vs/Vp, default vs0 / vp0.
+    back : tuple
+        background vp0, vs0, ro0, default background() of the arrays,
+        computed chunk by chunk.
+
+    Returns
+    -------
+    ei : array
+        the shape of vp, or (n,) + the shape of vp.
+    """
+    if back is None:
+        back = background(vp, vs, ro)
+    if vs_vp_ratio is None:
+        vs_vp_ratio = back[1] / back[0]
+    return impedance(vp, vs, ro, ei_exponents(angles, vs_vp_ratio), back)
+
+
+def extended_elastic_impedance(vp, vs, ro, chi, vs_vp_ratio=None,
+                               back=None):
+    """
+    Extended elastic impedance of Whitcombe et al. (2002).
+
+    Parameters
+    ----------
+    vp, vs, ro : array
+        Vp, Vs and density of the same shape, e.g. logs or volumes.
+    chi : float or array
+        chi angles in degrees, scalar or shape (n,) for a sweep.
+    vs_vp_ratio, back
+        see elastic_impedance().
+
+    Returns
+    -------
+    eei : array
+        the shape of vp, or (n,) + the shape of vp.
+    """
+    if back is None:
+        back = background(vp, vs, ro)
+    if vs_vp_ratio is None:
+        vs_vp_ratio = back[1] / back[0]
+    return impedance(vp, vs, ro, eei_exponents(chi, vs_vp_ratio), back)
+
+
+def read_elastic(vp, vs, ro, chunk_size):
+    """
+    Read the same rows of the Vp, Vs and density volumes.
+
+    Yields
+    ------
+    start, stop, (vp, vs, ro) : int, int, tuple of arrays
+    """
+    for start in range(0, len(vp), chunk_size):
+        stop = min(start + chunk_size, len(vp))
+        yield start, stop, tuple(np.asarray(x[start:stop], dtype=float)
+                                 for x in (vp, vs, ro))
+
+
+def impedance_volumes(vp, vs, ro, outs, angles=None, chi=None,
+                      vs_vp_ratio=None, back=None, chunk_size=None,
+                      maxsize=2):
+    """
+    Compute EI or EEI volumes chunk by chunk, all angles in one pass.
+
+    Parameters
+    ----------
+    vp, vs, ro : array
+        Vp, Vs and density volumes of the same shape, usually memmaps.
+    outs : sequence
+        n output volumes of the same shape, written in place.
+    angles : array
+        n incident angles in degrees for EI.
+    chi : array
+        n chi angles in degrees for EEI, if angles is None.
+    vs_vp_ratio : float
+        background Vs/Vp, default vs0 / vp0.
+    back : tuple
+        background vp0, vs0, ro0, default background() of the volumes,
+        which takes an extra chunked pass.
+    chunk_size : int
+        rows of the first axis per chunk, default about 64 MB per volume.
+    maxsize : int
+        chunks read ahead.
+
+    Returns
+    -------
+    nchunk : int
+        number of chunks written.
+    """
+    if (angles is None) == (chi is None):
+        raise ValueError("Give either angles or chi")
+    if chunk_size is None:
+        chunk_size = rows_per_chunk(vp)
+    if back is None:
+        back = background(vp, vs, ro, chunk_size)
+    if vs_vp_ratio is None:
+        vs_vp_ratio = back[1] / back[0]
+    exponents = ei_exponents(np.atleast_1d(angles), vs_vp_ratio) \
+        if chi is None else eei_exponents(np.atleast_1d(chi), vs_vp_ratio)
+    if len(outs) != len(exponents[0]):
+        raise ValueError("%d outputs for %d angles" %
+                         (len(outs), len(exponents[0])))
+
+    nchunk = 0
+    for start, stop, logs in buffered(read_elastic(vp, vs, ro, chunk_size),
+                                      maxsize):
+        imps = impedance(*logs, exponents, back)
+        for out, imp in zip(outs, imps):
+            out[start:stop] = imp
+        nchunk += 1
+    return nchunk
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Compact containers of two half-space models.
+
+An interface takes 48 bytes in a structured array of INTERFACE_DTYPE, the
+six float64 of (vp1, vs1, ro1, vp2, vs2, ro2). The ratio and delta models
+are computed for the whole collection at once.
+"""
+
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta, elapar_hs2ratio
+from zoeppritz.modeling import modeling_batch
+
+FIELDS = ('vp1', 'vs1', 'ro1', 'vp2', 'vs2', 'ro2')
+INTERFACE_DTYPE = np.dtype([(name, '<f8') for name in FIELDS])
+
+
+class Interface(object):
+    """
+    A two half-space model.
+
+    Unpacks like the tuple (vp1, vs1, ro1, vp2, vs2, ro2), e.g. for
+    modeling.modeling().
+    """
+
+    __slots__ = FIELDS
+
+    def __init__(self, vp1, vs1, ro1, vp2, vs2, ro2):
+        self.vp1 = vp1
+        self.vs1 = vs1
+        self.ro1 = ro1
+        self.vp2 = vp2
+        self.vs2 = vs2
+        self.ro2 = ro2
+
+    def __iter__(self):
+        return iter(self.astuple())
+
+    def __repr__(self):
+        return 'Interface(%s)' % ', '.join(
+            '%s=%g' % (name, getattr(self, name)) for name in FIELDS)
+
+    def astuple(self):
+        return tuple(getattr(self, name) for name in FIELDS)
+
+    def ratio(self):
+        """r1, r2, r3, r4, see utils.elapar_hs2ratio()."""
+        return elapar_hs2ratio(*self.astuple())
+
+    def delta(self):
+        """ro_rd, vp_rd, vs_rd, vs_vp_ratio, see utils.elapar_hs2delta()."""
+        return elapar_hs2delta(*self.astuple())
+
+
+class Interfaces(object):
+    """
+    A collection of interfaces in a structured array.
+
+    Parameters
+    ----------
+    data : array
+        structured array of INTERFACE_DTYPE, shape (k,), kept without
+        copy.
+
+    Attributes
+    ----------
+    vp1, vs1, ro1, vp2, vs2, ro2 : array
+        views of the fields, shape (k,).
+    """
+
+    def __init__(self, data):
+        if data.dtype != INTERFACE_DTYPE:
+            raise ValueError("Expect dtype %s, got %s" %
+                             (INTERFACE_DTYPE, data.dtype))
+        self.data = data
+
+    @classmethod
+    def empty(cls, k):
+        return cls(np.empty(k, dtype=INTERFACE_DTYPE))
+
+    @classmethod
+    def from_models(cls, models):
+        """
+        Collection of models, shape (k, 6).
+
+        A C-contiguous float64 array is viewed without copy.
+        """
+        models = np.ascontiguousarray(models, dtype='<f8')
+        if models.ndim != 2 or models.shape[1] != 6:
+            raise ValueError("Expect models of shape (k, 6), got %s" %
+                             (models.shape,))
+        return cls(models.view(INTERFACE_DTYPE)[:, 0])
+
+    @classmethod
+    def from_logs(cls, vp, vs, ro):
+        """Interfaces between adjacent samples of logs, see las.py."""
+        interfaces = cls.empty(len(vp) - 1)
+        for name, log in zip(('vp', 'vs', 'ro'), (vp, vs, ro)):
+            interfaces.data[name + '1'] = log[:-1]
+            interfaces.data[name + '2'] = log[1:]
+        return interfaces
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        item = self.data[index]
+        if isinstance(item, np.void):
+            return Interface(*item.tolist())
+        return Interfaces(item)
+
+    def __getattr__(self, name):
+        if name in FIELDS:
+            return self.data[name]
+        raise AttributeError(name)
+
+    @property
+    def models(self):
+        """View as models of shape (k, 6), without copy if contiguous."""
+        data = np.ascontiguousarray(self.data)
+        return data.view('<f8').reshape(len(data), 6)
+
+    def fields(self):
+        """vp1, vs1, ro1, vp2, vs2, ro2 views."""
+        return tuple(self.data[name] for name in FIELDS)
+
+    def ratio(self):
+        """
+        Ratio models of all interfaces.
+
+        Returns
+        -------
+        r1, r2, r3, r4 : array
+            shape (k,), see utils.elapar_hs2ratio().
+        """
+        return elapar_hs2ratio(*self.fields())
+
+    def delta(self):
+        """
+        Delta models of all interfaces.
+
+        Returns
+        -------
+        ro_rd, vp_rd, vs_rd, vs_vp_ratio : array
+            shape (k,), see utils.elapar_hs2delta().
+        """
+        return elapar_hs2delta(*self.fields())
+
+    def modeling(self, angles, equation, reflection):
+        """
+        Reflection coefficients, see modeling.modeling_batch().
+
+        Returns
+        -------
+        amp, pha : array
+            shape (k, m).
+        """
+        return modeling_batch(self.models, angles, equation, reflection)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Time-lapse differential inversion around converged baseline models.
+
+The monitor models are the baseline models plus the changes that explain
+the monitor less baseline amplitudes. The Jacobians of the baseline models
+and their pseudo-inverses are computed once in Baseline, and every monitor
+vintage is inverted with products only. Further iterations keep the
+baseline Jacobian, so they cost one forward modeling each.
+"""
+
+import numpy as np
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.modcer import rpp_cer1977, rps_cer1977
+from zoeppritz.gracer import jacobian
+
+
+class Baseline(object):
+    """
+    Linearization of baseline models, reused by every monitor vintage.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    models : array
+        converged baseline models r1, r2, r3, r4, shape (k, 4).
+    rps : bool
+        True to add PS rows for joint PP and PS data, absolute Rps as
+        in invcer.cer1itr().
+    fm : str
+        the method of the Jacobian, 'numeric' or 'analytic'.
+
+    Attributes
+    ----------
+    data : array
+        modeled baseline amplitudes, shape (k, m) or (k, 2 * m) with PS.
+    jac : array
+        baseline Jacobians, shape (k, m, 4) or (k, 2 * m, 4).
+    pinv : array
+        their pseudo-inverses, shape (k, 4, m) or (k, 4, 2 * m).
+    """
+
+    def __init__(self, angles, models, rps=False, fm='analytic'):
+        self.angles = np.asarray(angles, dtype=float)
+        self.grid = AngleGrid(self.angles)
+        self.models = np.array(models, dtype=float)
+        self.rps = rps
+        self.data = self.forward(self.models)
+        r = tuple(self.models[:, i:i + 1] for i in range(4))
+        jacs = [jacobian(*r, self.grid, 'PP', method=fm)]
+        if rps:
+            jac = jacobian(*r, self.grid, 'PS', method=fm)
+            if fm == 'analytic':
+                # The analytic derivatives are of -Rps, those of |Rps|
+                # follow its sign
+                real, _ = rps_cer1977(*r, self.grid)
+                jac *= -np.sign(real)[..., None]
+            jacs.append(jac)
+        self.jac = np.concatenate(jacs, axis=1)
+        self.pinv = np.linalg.pinv(self.jac)
+
+    @classmethod
+    def from_arrays(cls, angles, models, rps, data, jac, pinv):
+        baseline = cls.__new__(cls)
+        baseline.angles = np.asarray(angles, dtype=float)
+        baseline.grid = AngleGrid(baseline.angles)
+        baseline.models = models
+        baseline.rps = bool(rps)
+        baseline.data = data
+        baseline.jac = jac
+        baseline.pinv = pinv
+        return baseline
+
+    def save(self, path):
+        """Save to a .npz file, to reuse across runs."""
+        np.savez(path, angles=self.angles, models=self.models, rps=self.rps,
+                 data=self.data, jac=self.jac, pinv=self.pinv)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls.from_arrays(**{name: f[name] for name in f.files})
+
+    def forward(self, models):
+        """
+        Amplitudes of models, shape (k, m) or (k, 2 * m) with PS.
+        """
+        r = tuple(models[:, i:i + 1] for i in range(4))
+        rpp, _ = rpp_cer1977(*r, self.grid)
+        if not self.rps:
+            return rpp
+        rps, _ = rps_cer1977(*r, self.grid, amp_type='abs')
+        return np.concatenate([rpp, rps], axis=1)
+
+    def invert(self, monitor, baseline=None, niter=1):
+        """
+        Invert a monitor vintage for the changes of the models.
+
+        Parameters
+        ----------
+        monitor : array
+            monitor amplitudes, shape (k, m), or (k, 2 * m) of PP then PS.
+        baseline : array
+            observed baseline amplitudes of the same shape. The monitor
+            less baseline differences are added to the modeled baseline,
+            so errors common to both vintages cancel. The monitor is used
+            as is if None.
+        niter : int
+            number of iterations, each after the first costs a forward
+            modeling.
+
+        Returns
+        -------
+        x : array
+            monitor models, shape (k, 4). Samples muted to NaN in either
+            vintage are left out. The pseudo-inverses of gathers with
+            muted samples are computed again without their rows, once
+            per call.
+        """
+        monitor = np.asarray(monitor, dtype=float)
+        if baseline is None:
+            target = monitor
+        else:
+            target = self.data + (monitor - np.asarray(baseline, float))
+        live = np.isfinite(target)
+        pinv = self.pinv
+        muted = np.flatnonzero(~live.all(axis=1))
+        if len(muted):
+            # Zero rows of the Jacobian give zero columns of its
+            # pseudo-inverse, so muted samples do not weigh in
+            pinv = pinv.copy()
+            pinv[muted] = np.linalg.pinv(
+                np.where(live[muted, :, None], self.jac[muted], 0))
+        x = self.models.copy()
+        residual = np.where(live, target - self.data, 0)
+        for j in range(niter):
+            if j > 0:
+                residual = np.where(live, target - self.forward(x), 0)
+            x += np.einsum('kij,kj->ki', pinv, residual)
+        return x
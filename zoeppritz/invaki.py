@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Rpp inversion with linearized approximation, Aki 1980.
+"""
+
+import numpy as np
+from zoeppritz.modaki import aki1980_coe, aki1980_ps_coe, inc2ave_angle
+from zoeppritz.workspace import Workspace
+
+
+def aki1itr(angles, rpp, x_ini, vs_vp_ratio=0.5, workspace=None, rps=None):
+    """
+    One iteration of linear inversion.
+
+    The approximation is linear in the model, only the average angles
+    depend on the Vp relative difference of the previous iteration.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees.
+    rpp : array
+        Rpp amplitude at the angles, also the b in Ax=b.
+    x_ini : tuple
+        Initial or starting model of this iteration.
+    vs_vp_ratio
+        Vs/Vp ratio, assumed known a priori.
+    workspace : Workspace
+        buffers of A and b to reuse, see workspace.py.
+    rps : array
+        Rps amplitude at the angles, real with sign, for joint PP and PS
+        inversion with modaki.aki1980_ps_coe().
+
+    Returns
+    -------
+    x_new : array
+        Updated model
+    """
+    ro_rd_ini, vp_rd_ini, vs_rd_ini = x_ini
+
+    m = len(angles)
+    nmode = 1 if rps is None else 2
+    if workspace is None:
+        workspace = Workspace(m, 3, nmode)
+    A, b = workspace.views(m, nmode)
+
+    ave_angles = inc2ave_angle(angles, vp_rd_ini)
+    aki1980_coe(vs_vp_ratio, ave_angles, out=A[:m])
+    if rps is None:
+        b = rpp
+    else:
+        aki1980_ps_coe(vs_vp_ratio, ave_angles, out=A[m:])
+        b[:m] = rpp
+        b[m:] = rps
+
+    lstsq = np.linalg.lstsq(A, b, rcond=None)
+    x_new = lstsq[0]
+    return x_new
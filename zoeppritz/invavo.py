@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Rpp inversion with reparameterized linear approximations.
+
+The approximations of modavo.py are linear in the model, so the inversion
+is one product with the pseudo-inverse of the coefficient matrix. The
+pseudo-inverse is computed once per set of angles and background.
+"""
+
+from functools import lru_cache
+import numpy as np
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modavo import avo_coe
+
+
+@lru_cache(maxsize=64)
+def avo_pinv(method, angles, vs_vp_ratio=0.5, vp_rd=0., gardner=0.25):
+    """
+    Pseudo-inverse of the coefficient matrix.
+
+    Parameters
+    ----------
+    method : str
+        parameterization, see modavo.NPARAM.
+    angles : tuple
+        incident angles in degrees, hashable.
+    vs_vp_ratio : float
+        Vs over Vp ratio of background model.
+    vp_rd : float
+        relative difference of Vp for the average angles, 0 to use the
+        incident angles.
+    gardner : float
+        see modavo.transform().
+
+    Returns
+    -------
+    P : array
+        shape (n, m), read-only.
+    """
+    ave_angles = inc2ave_angle(np.array(angles, dtype=float), vp_rd)
+    P = np.linalg.pinv(avo_coe(method, vs_vp_ratio, ave_angles, gardner))
+    P.setflags(write=False)
+    return P
+
+
+def avo_inv(method, angles, rpp, vs_vp_ratio=0.5, vp_rd=0., gardner=0.25):
+    """
+    Least squares inversion of gathers.
+
+    Parameters
+    ----------
+    method : str
+        parameterization, see modavo.NPARAM.
+    angles : array
+        incident angles in degrees, shape (m,).
+    rpp : array
+        Rpp amplitude, shape (m,) or (k, m), without NaN.
+    vs_vp_ratio, vp_rd, gardner : float
+        see avo_pinv().
+
+    Returns
+    -------
+    x : array
+        Inverted models, shape (n,) or (k, n).
+    """
+    P = avo_pinv(method, tuple(np.asarray(angles, dtype=float).tolist()),
+                 float(vs_vp_ratio), float(vp_rd), gardner)
+    return np.asarray(rpp) @ P.T
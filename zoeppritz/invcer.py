@@ -5,19 +5,22 @@ Linearized inversion
 """
 
 import numpy as np
+from zoeppritz.anggrid import AngleGrid, as_grid
 from zoeppritz.modcer import rpp_cer1977, rps_cer1977
-from zoeppritz.gracer import gradient
+from zoeppritz.gracer import jacobian
+from zoeppritz.workspace import Workspace
 
 
 def cer1itr(angles, rpp, x_ini, rps=None, fm='numeric', scale=1,
-    constraints={}):
+    constraints={}, workspace=None):
     """
     One iteration of linearized inversion.
 
     Parameters
     ----------
-    angles : array
-        incident angles in degrees.
+    angles : array or AngleGrid
+        incident angles in degrees. Pass an AngleGrid to reuse the
+        trigonometric terms across iterations.
     rpp : array
         Rpp amplitude at the angles, also the b in Ax=b.
     x_ini : tuple
@@ -30,6 +33,8 @@ def cer1itr(angles, rpp, x_ini, rps=None, fm='numeric', scale=1,
         Scale to the model update
     constraints : dict
         constraints e.g. {'r2': 0.5}
+    workspace : Workspace
+        buffers of A and b to reuse, see workspace.py.
 
     Returns
     -------
@@ -47,41 +52,26 @@ def cer1itr(angles, rpp, x_ini, rps=None, fm='numeric', scale=1,
         x_ini_copy[3] = constraints['r4']
     r1_ini, r2_ini, r3_ini, r4_ini = x_ini_copy
 
-    m = len(angles)
-    n = 4
-    rpp_ini = np.zeros(m)
-    A1 = np.zeros((m, n))
-    for i in range(m):
-        angle = angles[i]
-        amp, pha = rpp_cer1977(r1_ini, r2_ini, r3_ini, r4_ini, angle)
-        rpp_ini[i] = amp
-        # Calculate the Jacobian matrix A in Ax=b
-        for j in range(n):
-            fre = gradient(r1_ini, r2_ini, r3_ini, r4_ini, angle,
-                'PP', j+1, method=fm)
-            A1[i, j] = fre
+    grid = as_grid(angles)
+    m = len(grid)
+    nmode = 1 if rps is None else 2
+    if workspace is None:
+        workspace = Workspace(m, 4, nmode, grid.dtype)
+    A, b_dif = workspace.views(m, nmode)
+
+    rpp_ini, _ = rpp_cer1977(r1_ini, r2_ini, r3_ini, r4_ini, grid)
+    # Calculate the Jacobian matrix A in Ax=b
+    jacobian(r1_ini, r2_ini, r3_ini, r4_ini, grid, 'PP', method=fm,
+             out=A[:m])
     # A *= -1  # needed when we take abs of negative rpp
-    b1 = rpp - rpp_ini
-
-    if rps is None:
-        A = A1
-        b_dif = b1
-    else:
-        rps_ini = np.zeros(m)
-        A2 = np.zeros((m, n))
-        for i in range(m):
-            angle = angles[i]
-            amp, pha = rps_cer1977(r1_ini, r2_ini, r3_ini, r4_ini, angle,
-                amp_type='abs')
-            rps_ini[i] = amp
-            # Calculate the Jacobian matrix A in Ax=b
-            for j in range(n):
-                fre = gradient(r1_ini, r2_ini, r3_ini, r4_ini, angle,
-                    'PS', j+1, method=fm)
-                A2[i, j] = fre
-        b2 = rps - rps_ini
-        A = np.concatenate((A1, A2), axis=0)
-        b_dif = np.concatenate((b1, b2), axis=0)
+    np.subtract(rpp, rpp_ini, out=b_dif[:m])
+
+    if rps is not None:
+        rps_ini, _ = rps_cer1977(r1_ini, r2_ini, r3_ini, r4_ini, grid,
+            amp_type='abs')
+        jacobian(r1_ini, r2_ini, r3_ini, r4_ini, grid, 'PS', method=fm,
+                 out=A[m:])
+        np.subtract(rps, rps_ini, out=b_dif[m:])
 
     lstsq = np.linalg.lstsq(A, b_dif, rcond=None)
     x_dif = lstsq[0]
@@ -95,3 +85,110 @@ def cer1itr(angles, rpp, x_ini, rps=None, fm='numeric', scale=1,
         x_dif[3] = 0
     x_new = x_ini_copy + x_dif * scale
     return x_new
+
+
+def cer1inv(angles, rpp, x_ini, rps=None, niter=10, tol=1e-8,
+            workspace=None, **kwargs):
+    """
+    Iterate cer1itr() until the model update is below tol.
+
+    Parameters
+    ----------
+    angles : array or AngleGrid
+        incident angles in degrees.
+    rpp : array
+        Rpp amplitude at the angles.
+    x_ini : tuple
+        Initial model.
+    rps : array
+        Rps amplitude at the angles, see cer1itr().
+    niter : int
+        maximum number of iterations.
+    tol : float
+        convergence threshold of the largest parameter update.
+    workspace : Workspace
+        buffers shared by the iterations, see workspace.py.
+    kwargs : dict
+        other arguments of cer1itr(), e.g. fm, constraints.
+
+    Returns
+    -------
+    x_new : array
+        Inverted model
+    nit : int
+        number of iterations.
+    """
+    grid = as_grid(angles)
+    if workspace is None:
+        workspace = Workspace(len(grid), 4, 1 if rps is None else 2,
+                              grid.dtype)
+    x = np.asarray(x_ini, dtype=float)
+    for j in range(niter):
+        x_new = cer1itr(grid, rpp, x, rps=rps, workspace=workspace,
+                        **kwargs)
+        step = np.max(np.abs(x_new - x))
+        x = x_new
+        if step <= tol:
+            return x, j + 1
+    return x, niter
+
+
+def cer1inv_coarse(angles, rpp, x_ini, rps=None, strides=(4, 2, 1),
+                   switch=1e-3, niter=10, tol=1e-8, **kwargs):
+    """
+    Invert with angle subsets from coarse to fine.
+
+    The iterations start on every strides[0]-th angle, and move to the
+    next stride when the largest update is below switch. The last stride
+    iterates until the update is below tol. Strides leaving fewer than
+    4 angles are skipped.
+
+    Parameters
+    ----------
+    angles : array or AngleGrid
+        incident angles in degrees.
+    rpp : array
+        Rpp amplitude at the angles.
+    x_ini : tuple
+        Initial model.
+    rps : array
+        Rps amplitude at the angles, see cer1itr().
+    strides : tuple
+        angle strides from coarse to fine, usually ending with 1.
+    switch : float
+        update threshold to move to the next stride.
+    niter : int
+        maximum number of iterations of each stride.
+    tol : float
+        convergence threshold of the last stride.
+    kwargs : dict
+        other arguments of cer1itr(), e.g. fm, constraints.
+
+    Returns
+    -------
+    x_new : array
+        Inverted model
+    stats : dict
+        'nit' total iterations, 'evaluations' angles modeled, each a
+        forward modeling and a Jacobian row per wave mode, 'strides' list
+        of (stride, iterations). A full-set inversion costs len(angles)
+        evaluations per iteration.
+    """
+    grid = as_grid(angles)
+    rpp = np.asarray(rpp)
+    strides = [s for s in strides[:-1] if len(grid.degrees[::s]) >= 4] + \
+        [strides[-1]]
+    x = np.asarray(x_ini, dtype=float)
+    stats = {'nit': 0, 'evaluations': 0, 'strides': []}
+    for level, stride in enumerate(strides):
+        sub = slice(None, None, stride)
+        grid_sub = grid if stride == 1 else \
+            AngleGrid(grid.degrees[sub], grid.vp1, grid.dtype)
+        limit = tol if level == len(strides) - 1 else switch
+        x, nit = cer1inv(grid_sub, rpp[sub], x,
+                         rps=None if rps is None else np.asarray(rps)[sub],
+                         niter=niter, tol=limit, **kwargs)
+        stats['nit'] += nit
+        stats['evaluations'] += nit * len(grid_sub)
+        stats['strides'].append((stride, nit))
+    return x, stats
@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Spatially regularized inversion of a grid of gathers.
+
+All gathers of a 1-D, 2-D or 3-D grid are inverted together, minimizing
+
+    sum_g |A_g dx_g - r_g| ** 2 + |Lam D (x + dx)| ** 2
+
+at each Gauss-Newton iteration, where A_g and r_g are the Jacobian and
+residual of gather g, and D is the first differences between neighbours
+along every axis of the grid, so that |D x| ** 2 is the Laplacian form
+x' D'D x. Lam weights the parameters, density, Vp and Vs, or r1 to r4 of
+the exact Zoeppritz equation. The Jacobians form a sparse block-diagonal
+matrix, stacked over Lam D and solved by LSQR, so memory is linear in the
+number of gathers.
+"""
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import lsqr
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.modaki import inc2ave_angle, aki1980, aki1980_coe
+from zoeppritz.modwan import wang1999
+from zoeppritz.modcer import rpp_cer1977, physical
+from zoeppritz.gracer import jacobian
+from zoeppritz.invwan import wang1999_jac
+from zoeppritz.batch import NPARAM
+
+# Times a step is halved by safe_step() before it is dropped
+MAX_HALVINGS = 10
+
+
+def difference_operator(shape):
+    """
+    First differences between neighbours along every axis of a grid.
+
+    Parameters
+    ----------
+    shape : tuple
+        grid shape, the grid is flattened in C order.
+
+    Returns
+    -------
+    D : sparse matrix
+        shape (number of neighbour pairs, number of grid points).
+    """
+    blocks = []
+    for axis, n in enumerate(shape):
+        if n < 2:
+            continue
+        diff = sp.diags([-np.ones(n - 1), np.ones(n - 1)], [0, 1],
+                        shape=(n - 1, n))
+        before = sp.identity(int(np.prod(shape[:axis])))
+        after = sp.identity(int(np.prod(shape[axis + 1:])))
+        blocks.append(sp.kron(sp.kron(before, diff), after))
+    if not blocks:
+        return sp.csr_matrix((0, int(np.prod(shape))))
+    return sp.vstack(blocks).tocsr()
+
+
+def block_jacobian(A, live):
+    """
+    Block-diagonal sparse matrix of the Jacobians of all gathers.
+
+    Parameters
+    ----------
+    A : array
+        Jacobians, shape (k, m, n).
+    live : array
+        bool, shape (k, m), muted samples get zero rows.
+
+    Returns
+    -------
+    J : sparse matrix
+        shape (k * m, k * n).
+    """
+    k, m, n = A.shape
+    rows = np.repeat(np.arange(k * m), n)
+    cols = (np.arange(k)[:, None, None] * n + np.arange(n)) \
+        .repeat(m, axis=1).ravel()
+    data = np.where(live[..., None], A, 0).ravel()
+    return sp.csr_matrix((data, (rows, cols)), shape=(k * m, k * n))
+
+
+def defined(angles, x, equation='linear'):
+    """
+    Samples where the equation is defined.
+
+    The linear and quadratic equations are defined before the critical
+    angle, the exact equation at physical models, see
+    modcer.physics_check().
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    x : array
+        models, shape (k, n), see invert_regularized().
+    equation : str
+        see invert_regularized().
+
+    Returns
+    -------
+    ok : array
+        bool, shape (k, m).
+    """
+    if equation == 'zoeppritz':
+        ok = physical(*x.T) & np.isfinite(x).all(axis=1)
+        return np.repeat(ok[:, None], len(angles), axis=1)
+    with np.errstate(invalid='ignore'):
+        ave_angles = inc2ave_angle(angles, x[:, 1:2])
+    return np.isfinite(ave_angles) & np.isfinite(x).all(axis=1)[:, None]
+
+
+def safe_step(angles, x, dx, live, equation='linear', nhalve=MAX_HALVINGS):
+    """
+    Halve the steps that make live samples undefined.
+
+    A step of a gather is accepted if every live sample defined at x is
+    still defined at x + dx, e.g. no angle turns post-critical. Otherwise
+    it is halved, up to nhalve times, and then dropped.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    x, dx : array
+        models and steps, shape (k, n).
+    live : array
+        bool, shape (k, m).
+    equation : str
+        see invert_regularized().
+
+    Returns
+    -------
+    dx : array
+        accepted steps, shape (k, n).
+    """
+    before = defined(angles, x, equation) & live
+    dx = np.where(np.isfinite(dx), dx, 0)
+    for i in range(nhalve + 1):
+        lost = (before & ~defined(angles, x + dx, equation)).any(axis=1)
+        if not lost.any():
+            break
+        dx[lost] *= 0 if i == nhalve else 0.5
+    return dx
+
+
+def invert_regularized(angles, gathers, x_ini, lam=0.1, equation='linear',
+                       vs_vp_ratio=0.5, niter=3, fm='numeric', atol=1e-10,
+                       btol=1e-10, iter_lim=None):
+    """
+    Jointly invert a grid of gathers with a smoothness penalty.
+
+    Samples where the Jacobian or residual is not finite, e.g. beyond the
+    critical angle of the current model or of a nonphysical model, are
+    left out of the iteration like muted samples, and steps are limited by
+    safe_step(). One such sample cannot turn the whole grid NaN.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    gathers : array
+        Rpp amplitude, shape grid + (m,), e.g. (ny, nx, m). NaN are muted
+        samples.
+    x_ini : array
+        Initial model, shape (n,) or grid + (n,). Relative differences of
+        density, Vp and Vs for 'linear' and 'quadratic', r1, r2, r3, r4
+        for 'zoeppritz'.
+    lam : float or array
+        weight of the penalty, scalar or (n,) per parameter.
+    equation : str
+        'linear' by modaki.aki1980(), 'quadratic' by modwan.wang1999(),
+        'zoeppritz' by modcer.rpp_cer1977() as in invcer.cer1itr().
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or the grid shape, not used by 'zoeppritz'.
+    niter : int
+        number of Gauss-Newton iterations, the average angles and the
+        quadratic terms are updated at each.
+    fm : str
+        Jacobian method of 'zoeppritz', 'numeric' or 'analytic', see
+        gracer.jacobian().
+    atol, btol, iter_lim
+        stopping criteria of scipy.sparse.linalg.lsqr().
+
+    Returns
+    -------
+    x : array
+        Inverted models, shape grid + (n,).
+    """
+    if equation not in NPARAM:
+        raise NotImplementedError
+    n = NPARAM[equation]
+    gathers = np.asarray(gathers, dtype=float)
+    grid, m = gathers.shape[:-1], gathers.shape[-1]
+    k = int(np.prod(grid))
+    rpp = gathers.reshape(k, m)
+    live = np.isfinite(rpp)
+    rpp = np.where(live, rpp, 0)
+    x = np.array(np.broadcast_to(x_ini, grid + (n,)), dtype=float) \
+        .reshape(k, n)
+    ratio = np.broadcast_to(np.asarray(vs_vp_ratio, dtype=float), grid) \
+        .reshape(k, 1)
+    angle_grid = AngleGrid(angles) if equation == 'zoeppritz' else None
+
+    D = difference_operator(grid)
+    R = sp.kron(D, sp.diags(np.broadcast_to(lam, (n,)).astype(float)))
+    R = R.tocsr()
+    for j in range(niter):
+        if equation == 'zoeppritz':
+            A, r = _linearize_exact(angle_grid, rpp, x, fm)
+        else:
+            A, r = _linearize(angles, rpp, x, ratio, equation)
+        used = live & np.isfinite(r) & np.isfinite(A).all(axis=-1)
+        J = block_jacobian(A, used)
+        lhs = sp.vstack([J, R]).tocsr()
+        rhs = np.concatenate([np.where(used, r, 0).ravel(), -R @ x.ravel()])
+        dx = lsqr(lhs, rhs, atol=atol, btol=btol, iter_lim=iter_lim)[0]
+        x += safe_step(angles, x, dx.reshape(k, n), live, equation)
+    return x.reshape(grid + (n,))
+
+
+def _linearize(angles, rpp, x, ratio, equation):
+    """Jacobians and residuals of the linear or quadratic equation."""
+    ro, vp, vs = x[:, 0:1], x[:, 1:2], x[:, 2:3]
+    with np.errstate(invalid='ignore'):
+        ave_angles = inc2ave_angle(angles, vp)
+        if equation == 'linear':
+            A = aki1980_coe(ratio, ave_angles)
+            r = rpp - aki1980(ratio, ro, vp, vs, ave_angles)
+        else:
+            A = wang1999_jac(ratio, ro, vs, ave_angles,
+                             inc_angles=angles, vp_rd=vp)
+            r = rpp - wang1999(ratio, ro, vp, vs, ave_angles)
+    return A, r
+
+
+def _linearize_exact(grid, rpp, x, fm):
+    """Jacobians and residuals of the exact equation, NaN if nonphysical."""
+    k, m = rpp.shape
+    A = np.full((k, m, 4), np.nan)
+    r = np.full((k, m), np.nan)
+    ok = physical(*x.T)
+    if ok.any():
+        rs = [x[ok, i:i + 1] for i in range(4)]
+        A[ok] = jacobian(*rs, grid, 'PP', method=fm)
+        r[ok] = rpp[ok] - rpp_cer1977(*rs, grid)[0]
+    return A, r
@@ -8,9 +8,10 @@ from math import pi
 import numpy as np
 from zoeppritz.modaki import aki1980_coe, inc2ave_angle
 from zoeppritz.modwan import wang1999
+from zoeppritz.workspace import Workspace
 
 
-def wan1itr(angles, rpp, x_ini, vs_vp_ratio=0.5):
+def wan1itr(angles, rpp, x_ini, vs_vp_ratio=0.5, workspace=None):
     """
     One iteration of linearized inversion.
 
@@ -24,6 +25,8 @@ def wan1itr(angles, rpp, x_ini, vs_vp_ratio=0.5):
         Initial or starting model of this iteration.
     vs_vp_ratio
         Vs/Vp ratio, assumed known a priori.
+    workspace : Workspace
+        buffers of A and b to reuse, see workspace.py.
 
     Returns
     -------
@@ -31,25 +34,35 @@ def wan1itr(angles, rpp, x_ini, vs_vp_ratio=0.5):
         Updated model
     """
     ro_rd_ini, vp_rd_ini, vs_rd_ini = x_ini
+    if workspace is None:
+        workspace = Workspace(len(angles), 3)
+    A, b_dif = workspace.views(len(angles))
 
     ave_angles = inc2ave_angle(angles, vp_rd_ini)
     rpp_ini = wang1999(vs_vp_ratio, ro_rd_ini, vp_rd_ini, vs_rd_ini, ave_angles)
 
     # Calculate the Jacobian matrix A in Ax=b
-    A = wang1999_jac(vs_vp_ratio, ro_rd_ini, vs_rd_ini, ave_angles)
+    wang1999_jac(vs_vp_ratio, ro_rd_ini, vs_rd_ini, ave_angles, out=A,
+                 inc_angles=angles, vp_rd=vp_rd_ini)
 
-    b_dif = rpp - rpp_ini
+    np.subtract(rpp, rpp_ini, out=b_dif)
     lstsq = np.linalg.lstsq(A, b_dif, rcond=None)
     x_dif = lstsq[0]
     x_new = x_ini + x_dif
     return x_new
 
 
-def wang1999_jac(vs_vp_ratio, ro_rd, vs_rd, average_angles):
+def wang1999_jac(vs_vp_ratio, ro_rd, vs_rd, average_angles, out=None,
+                 inc_angles=None, vp_rd=None):
     """
     Calculate Jacobian matrix of partial derivatives using Wang (1999)
     quadratic approximation (equation 10)
 
+    With inc_angles and vp_rd, the Vp column includes the change of the
+    average angles with vp_rd, the exact derivative of wang1999() at
+    inc2ave_angle(inc_angles, vp_rd), so Gauss-Newton converges
+    quadratically. Otherwise the average angles are held fixed.
+
     Parameters
     ----------
     vs_vp_ratio : float
@@ -63,6 +76,12 @@ def wang1999_jac(vs_vp_ratio, ro_rd, vs_rd, average_angles):
     average_angles : array
         average of incident and transmission angles.
         The unit is degree. Length is m.
+    out : array
+        buffer to fill in place, shape (m, 3).
+    inc_angles : array
+        incident angles in degrees of the average angles.
+    vp_rd : float
+        relative difference of Vp of the average angles.
 
     Returns
     -------
@@ -71,11 +90,146 @@ def wang1999_jac(vs_vp_ratio, ro_rd, vs_rd, average_angles):
         The three columns are for density, Vp, and Vs, respectively.
     """
     angles = average_angles / 180. * pi
-    quad_coef = vs_vp_ratio ** 3 * np.cos(angles) * np.sin(angles) ** 2
+    sin1, cos1 = np.sin(angles), np.cos(angles)
+    quad_coef = vs_vp_ratio ** 3 * cos1 * sin1 ** 2
     quad_ro_pd = 2 * (ro_rd + 2 * vs_rd)
     quad_vs_pd = 2 * quad_ro_pd
 
-    A = aki1980_coe(vs_vp_ratio, average_angles)
-    A[:, 0] += quad_coef * quad_ro_pd
-    A[:, 2] += quad_coef * quad_vs_pd
+    A = aki1980_coe(vs_vp_ratio, average_angles, out=out)
+    A[..., 0] += quad_coef * quad_ro_pd
+    A[..., 2] += quad_coef * quad_vs_pd
+    if vp_rd is not None:
+        # dR/d(average angle), all terms of wang1999()
+        cs_pd = -8 * vs_vp_ratio ** 2 * sin1 * cos1
+        cp_pd = sin1 / cos1 ** 3
+        quad_pd = vs_vp_ratio ** 3 * sin1 * (2 * cos1 ** 2 - sin1 ** 2)
+        ave_pd = (0.5 * ro_rd + vs_rd) * cs_pd + vp_rd * cp_pd + \
+            quad_pd * (ro_rd + 2 * vs_rd) ** 2
+        # d(average angle)/d(vp_rd), average = (inc + arcsin(r1 sin inc)) / 2
+        inc = inc_angles / 180. * pi
+        r1 = (2 + vp_rd) / (2 - vp_rd)
+        r1_pd = 4 / (2 - vp_rd) ** 2
+        sin_inc = np.sin(inc)
+        trans_pd = sin_inc * r1_pd / np.sqrt(1 - (r1 * sin_inc) ** 2)
+        A[..., 1] += ave_pd * 0.5 * trans_pd
     return A
+
+
+def wan1itr_batch(angles, rpp, x_ini, vs_vp_ratio=0.5, live=None):
+    """
+    One iteration of linearized inversion of k gathers at once.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    rpp : array
+        Rpp amplitude, shape (k, m).
+    x_ini : array
+        Initial models of this iteration, shape (k, 3).
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or shape (k,).
+    live : array
+        bool, shape (k, m), False at muted samples, which may hold any
+        value in rpp. All samples are live if None.
+
+    Returns
+    -------
+    x_new : array
+        Updated models, shape (k, 3)
+    """
+    ratio = np.asarray(vs_vp_ratio)[..., None]
+    ro_rd_ini, vp_rd_ini, vs_rd_ini = (x_ini[:, i:i + 1] for i in range(3))
+
+    ave_angles = inc2ave_angle(angles, vp_rd_ini)
+    rpp_ini = wang1999(ratio, ro_rd_ini, vp_rd_ini, vs_rd_ini, ave_angles)
+
+    # The Jacobian matrices, shape (k, m, 3)
+    A = wang1999_jac(ratio, ro_rd_ini, vs_rd_ini, ave_angles,
+                     inc_angles=angles, vp_rd=vp_rd_ini)
+
+    b_dif = rpp - rpp_ini
+    if live is not None:
+        A = np.where(live[..., None], A, 0)
+        b_dif = np.where(live, b_dif, 0)
+    x_dif = solve_normal(A, b_dif)
+    return x_ini + x_dif
+
+
+def solve_normal(A, b):
+    """
+    Least squares solutions of stacked systems by the normal equations.
+
+    Parameters
+    ----------
+    A : array
+        shape (..., m, n), full column rank.
+    b : array
+        shape (..., m).
+
+    Returns
+    -------
+    x : array
+        shape (..., n).
+    """
+    AtA = np.einsum('...mi,...mj->...ij', A, A)
+    Atb = np.einsum('...mi,...m->...i', A, b)
+    return np.linalg.solve(AtA, Atb[..., None])[..., 0]
+
+
+def wan1inv_batch(angles, rpp, x_ini, vs_vp_ratio=0.5, niter=20, tol=1e-10):
+    """
+    Iterate wan1itr_batch() until every gather converges.
+
+    A gather stops updating when no parameter changes by more than tol,
+    the remaining iterations run on the unconverged gathers only.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    rpp : array
+        Rpp amplitude, shape (k, m). NaN are muted samples.
+    x_ini : array
+        Initial model, shape (3,) shared by all gathers, or (k, 3).
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or shape (k,).
+    niter : int
+        maximum number of iterations.
+    tol : float
+        convergence threshold of the model update.
+
+    Returns
+    -------
+    x : array
+        Inverted models, shape (k, 3), in the float type of rpp. Gathers
+        with fewer than 3 live samples are NaN.
+    nit : array
+        number of iterations of each gather, shape (k,).
+    """
+    rpp = np.asarray(rpp)
+    if rpp.dtype.kind != 'f':
+        rpp = rpp.astype(float)
+    k = len(rpp)
+    x = np.array(np.broadcast_to(x_ini, (k, 3)), dtype=rpp.dtype)
+    ratio = np.broadcast_to(np.asarray(vs_vp_ratio, dtype=rpp.dtype), (k,))
+    live = np.isfinite(rpp)
+    if live.all():
+        live = None
+        active = np.ones(k, dtype=bool)
+    else:
+        rpp = np.where(live, rpp, 0)
+        active = live.sum(axis=1) >= 3
+        x[~active] = np.nan
+    nit = np.zeros(k, dtype=int)
+    for j in range(niter):
+        index = np.flatnonzero(active)
+        if len(index) == 0:
+            break
+        x_new = wan1itr_batch(angles, rpp[index], x[index], ratio[index],
+                              None if live is None else live[index])
+        step = np.abs(x_new - x[index]).max(axis=1)
+        x[index] = x_new
+        nit[index] += 1
+        active[index[step <= tol]] = False
+    return x, nit
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+LAS 2.0 well log reader for the modeling path.
+
+The ~A section is parsed line by line, wrapped or not, skipping # comment
+lines. Curves are stored as rows of a C-contiguous array, so every curve
+is a contiguous 1-D array.
+Velocities are converted to km/s and density to g/cc, the units used by
+utils.elapar_hs2delta() and utils.elapar_hs2ratio().
+"""
+
+import numpy as np
+
+# Curve mnemonics and unit conversion factors
+VP_MNEMONICS = ('VP', 'VPVEL', 'PVEL', 'VELP')
+VS_MNEMONICS = ('VS', 'VSVEL', 'SVEL', 'VELS')
+DTP_MNEMONICS = ('DT', 'DTC', 'DTCO', 'DTP', 'AC')
+DTS_MNEMONICS = ('DTS', 'DTSM', 'DTSH', 'DTSD')
+RO_MNEMONICS = ('RHOB', 'RHOZ', 'ZDEN', 'DEN', 'DENS', 'RHO')
+
+# velocity in km/s = value * factor
+VELOCITY_UNITS = {'KM/S': 1., 'M/S': 1e-3, 'FT/S': 3.048e-4, 'F/S': 3.048e-4}
+# velocity in km/s = factor / value
+SLOWNESS_UNITS = {'US/F': 304.8, 'US/FT': 304.8, 'USEC/FT': 304.8,
+                  'US/M': 1000., 'USEC/M': 1000.}
+# density in g/cc = value * factor
+DENSITY_UNITS = {'G/CC': 1., 'G/CM3': 1., 'GM/CC': 1., 'G/C3': 1.,
+                 'KG/M3': 1e-3}
+
+
+class Las(object):
+    """
+    A LAS file read by read_las().
+
+    Attributes
+    ----------
+    well : dict
+        ~W section values by mnemonic, e.g. 'WELL', 'NULL', 'STRT'.
+    curves : list
+        (mnemonic, unit, description) of the curves in the ~C section.
+    data : array
+        curve values, shape (number of curves, number of samples),
+        C-contiguous, null values are NaN.
+    """
+
+    def __init__(self, well, curves, data):
+        self.well = well
+        self.curves = curves
+        self.data = data
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    def mnemonics(self):
+        return [c[0] for c in self.curves]
+
+    def curve(self, mnemonic):
+        """
+        Get a curve by mnemonic.
+
+        Parameters
+        ----------
+        mnemonic : str
+            curve mnemonic, case insensitive.
+
+        Returns
+        -------
+        values : array
+            contiguous view of the curve.
+        unit : str
+            unit of the curve
+        """
+        for i, (mnem, unit, _) in enumerate(self.curves):
+            if mnem.upper() == mnemonic.upper():
+                return self.data[i], unit
+        raise KeyError(mnemonic)
+
+
+def read_las(path):
+    """
+    Read a LAS 2.0 file.
+
+    Parameters
+    ----------
+    path : str
+        file path.
+
+    Returns
+    -------
+    las : Las
+    """
+    with open(path, 'r', errors='replace') as fp:
+        text = fp.read()
+
+    # Split the ~A section off before looking at header lines
+    head, sep, body = text.partition('\n~A')
+    if not sep:
+        if text.startswith('~A'):
+            head, body = '', text[2:]
+        else:
+            raise ValueError("No ~A section in {}".format(path))
+    body = body.split('\n', 1)[1] if '\n' in body else ''
+    # Line number of the first line after ~A
+    first = head.count('\n') + (3 if sep else 2)
+
+    sections = {}
+    name = None
+    for line in head.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith('~'):
+            name = line[1:2].upper()
+            sections.setdefault(name, [])
+        elif name is not None:
+            sections[name].append(parse_header_line(line))
+
+    well = {mnem.upper(): value for mnem, unit, value, descr
+            in sections.get('W', [])}
+    curves = [(mnem, unit, descr) for mnem, unit, value, descr
+              in sections.get('C', [])]
+    if not curves:
+        raise ValueError("No curves in {}".format(path))
+
+    values = parse_data(body, first, path)
+    if values.size % len(curves):
+        raise ValueError("{} values for {} curves in ~A section of {}"
+                         .format(values.size, len(curves), path))
+    data = np.ascontiguousarray(values.reshape(-1, len(curves)).T)
+    null = well.get('NULL')
+    if null:
+        data[data == float(null)] = np.nan
+    return Las(well, curves, data)
+
+
+def parse_data(body, first, path):
+    """
+    Parse the lines of an ~A section, skipping blank and # comment lines.
+
+    Parameters
+    ----------
+    body : str
+        the lines after the ~A line.
+    first : int
+        line number of the first line in the file, for error messages.
+    path : str
+        file path, for error messages.
+
+    Returns
+    -------
+    values : array
+        all values in the order of the file, 1-D.
+    """
+    values = []
+    for number, line in enumerate(body.splitlines(), first):
+        tokens = line.split()
+        if not tokens or tokens[0].startswith('#'):
+            continue
+        try:
+            values.extend(map(float, tokens))
+        except ValueError:
+            bad = next(t for t in tokens if not _is_float(t))
+            raise ValueError("Bad value {!r} on line {} of {}"
+                             .format(bad, number, path)) from None
+    return np.array(values)
+
+
+def _is_float(token):
+    try:
+        float(token)
+    except ValueError:
+        return False
+    return True
+
+
+def parse_header_line(line):
+    """
+    Parse 'MNEM.UNIT  VALUE : DESCRIPTION' of a header section.
+
+    Returns
+    -------
+    mnem, unit, value, descr : str
+    """
+    left, _, descr = line.rpartition(':')
+    if not _:
+        left, descr = line, ''
+    mnem, _, rest = left.partition('.')
+    if rest[:1].isspace() or not rest:
+        unit, value = '', rest
+    else:
+        unit, _, value = rest.partition(' ')
+    return mnem.strip(), unit.strip(), value.strip(), descr.strip()
+
+
+def elastic_logs(las, vp=None, vs=None, ro=None):
+    """
+    Get Vp, Vs and density logs in km/s and g/cc.
+
+    Velocity curves are looked up first, then sonic slowness curves.
+
+    Parameters
+    ----------
+    las : Las
+        the well logs.
+    vp, vs, ro : str
+        curve mnemonics to override the default look up.
+
+    Returns
+    -------
+    vp : array
+        P-wave velocity in km/s
+    vs : array
+        S-wave velocity in km/s
+    ro : array
+        density in g/cc
+    """
+    vp = _velocity(las, vp, VP_MNEMONICS, DTP_MNEMONICS)
+    vs = _velocity(las, vs, VS_MNEMONICS, DTS_MNEMONICS)
+    values, unit = _find(las, (ro,) if ro else RO_MNEMONICS)
+    ro = values * _factor(DENSITY_UNITS, unit)
+    return vp, vs, ro
+
+
+def log2interfaces(vp, vs, ro):
+    """
+    Half-space models of all interfaces between adjacent log samples.
+
+    The output feeds utils.elapar_hs2delta() and utils.elapar_hs2ratio(),
+    which work element-wise on arrays.
+
+    Parameters
+    ----------
+    vp, vs, ro : array
+        logs of the same length n.
+
+    Returns
+    -------
+    vp1, vs1, ro1, vp2, vs2, ro2 : array
+        the upper and lower layers, length n-1.
+    """
+    return vp[:-1], vs[:-1], ro[:-1], vp[1:], vs[1:], ro[1:]
+
+
+def _velocity(las, mnemonic, velocities, slownesses):
+    if mnemonic:
+        values, unit = las.curve(mnemonic)
+    else:
+        try:
+            values, unit = _find(las, velocities)
+        except KeyError:
+            values, unit = _find(las, slownesses)
+    if unit.upper() in SLOWNESS_UNITS:
+        with np.errstate(divide='ignore'):
+            return SLOWNESS_UNITS[unit.upper()] / values
+    return values * _factor(VELOCITY_UNITS, unit)
+
+
+def _find(las, mnemonics):
+    for mnem in mnemonics:
+        try:
+            return las.curve(mnem)
+        except KeyError:
+            pass
+    raise KeyError("None of curves {}".format(mnemonics))
+
+
+def _factor(units, unit):
+    try:
+        return units[unit.upper()]
+    except KeyError:
+        raise ValueError("Unknown unit {}".format(unit))
@@ -34,30 +34,38 @@ def inc2ave_angle(inc_angles, vp_rd):
     return ave_angles
 
 
-def aki1980_coe(vs_vp_ratio, average_angles):
+def aki1980_coe(vs_vp_ratio, average_angles, out=None):
     """
     Get the Coefficient matrix A in Ax=b.
 
     Parameters
     ----------
-    vs_vp_ratio : float
+    vs_vp_ratio : float or array
         Vs over Vp ratio of background model
-    average_angles : list
+    average_angles : array
         average of incident and transmission angles.
-        The unit is degree. Length is m.
+        The unit is degree. Length is m, or shape (k, m) for k models
+        with vs_vp_ratio of shape (k, 1).
+    out : array
+        buffer to fill in place, shape (m, 3) or (k, m, 3).
 
     Returns
     -------
     A : array
-        The coefficient matrix, shape (m, 3). The three columns are for
-        density, Vp, and Vs, respectively.
+        The coefficient matrix, shape (m, 3) or (k, m, 3). The three
+        columns are for density, Vp, and Vs, respectively.
     """
     angles = average_angles / 180. * pi
     cs = -4 * vs_vp_ratio ** 2 * np.sin(angles) ** 2
     cd = 0.5 * (1 + cs)
     cp = 0.5 / np.cos(angles) ** 2
-    A = np.column_stack((cd, cp, cs))
-    return A
+    if out is None:
+        shape = np.broadcast_shapes(np.shape(cd), np.shape(cp)) + (3,)
+        out = np.empty(shape, dtype=np.result_type(cd, cp))
+    out[..., 0] = cd
+    out[..., 1] = cp
+    out[..., 2] = cs
+    return out
 
 
 def aki1980(vs_vp_ratio, ro_rd, vp_rd, vs_rd, average_angles,
@@ -94,11 +102,78 @@ def aki1980(vs_vp_ratio, ro_rd, vp_rd, vs_rd, average_angles,
         P-wave reflection amplitude. Shape is (m, 1).
     """
     A = aki1980_coe(vs_vp_ratio, average_angles)
-    x = np.array([ro_rd, vp_rd, vs_rd])
-    R = np.matmul(A, x)
+    # Broadcast over models, e.g. parameters of shape (k, 1)
+    R = A[..., 0] * ro_rd + A[..., 1] * vp_rd + A[..., 2] * vs_rd
     if amp_type is 'real':
         return R
     elif amp_type is 'abs':
         return np.abs(R)
     else:
         raise ValueError("Unknown amplitude type")
+
+
+def aki1980_ps_coe(vs_vp_ratio, average_angles, out=None):
+    """
+    Get the coefficient matrix A in Ax=b of PS reflection.
+
+    Aki and Richards (1980) equation 5.46, with sin(j) = vs_vp_ratio *
+    sin(i) for the average S-wave angle j. The sign follows
+    modcer.rps_cer1977().
+
+    Parameters
+    ----------
+    vs_vp_ratio : float or array
+        Vs over Vp ratio of background model
+    average_angles : array
+        average of incident and transmission P-wave angles.
+        The unit is degree. Length is m, or shape (k, m) for k models
+        with vs_vp_ratio of shape (k, 1).
+    out : array
+        buffer to fill in place, shape (m, 3) or (k, m, 3).
+
+    Returns
+    -------
+    A : array
+        The coefficient matrix, shape (m, 3) or (k, m, 3). The three
+        columns are for density, Vp, and Vs, respectively. The Vp column
+        is zero.
+    """
+    angles = average_angles / 180. * pi
+    sin1 = np.sin(angles)
+    cos1 = np.cos(angles)
+    cosj = np.sqrt(1 - (vs_vp_ratio * sin1) ** 2)
+    scale = sin1 / (2 * cosj)
+    kcc = 2 * vs_vp_ratio * cos1 * cosj
+    kss = 2 * vs_vp_ratio ** 2 * sin1 ** 2
+    cd = scale * (1 - kss + kcc)
+    cs = scale * 2 * (kcc - kss)
+    if out is None:
+        shape = np.broadcast_shapes(np.shape(cd), np.shape(cs)) + (3,)
+        out = np.empty(shape, dtype=np.result_type(cd, cs))
+    out[..., 0] = cd
+    out[..., 1] = 0
+    out[..., 2] = cs
+    return out
+
+
+def aki1980_ps(vs_vp_ratio, ro_rd, vp_rd, vs_rd, average_angles,
+               amp_type='real'):
+    """
+    Calculate PS reflection amplitude using Aki and Richards (1980)
+    linear approximation.
+
+    For arguments, refer function aki1980()
+
+    Returns
+    -------
+    rps : array
+        PS reflection amplitude, shape (m,) or (k, m).
+    """
+    A = aki1980_ps_coe(vs_vp_ratio, average_angles)
+    R = A[..., 0] * ro_rd + A[..., 2] * vs_rd
+    if amp_type == 'real':
+        return R
+    elif amp_type == 'abs':
+        return np.abs(R)
+    else:
+        raise ValueError("Unknown amplitude type")
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Rpp modeling with reparameterized linear approximations.
+
+Shuey (1985), Fatti et al. (1994) and Smith and Gidlow (1987) rewrite the
+Aki and Richards (1980) approximation in other parameters. The coefficient
+matrix of each is that of modaki.aki1980_coe() times the matrix T of the
+change of parameters, x_aki = T x, where x_aki is the relative differences
+of density, Vp and Vs.
+
+    'aki'           ro_rd, vp_rd, vs_rd
+    'shuey3'        intercept, gradient, curvature
+    'shuey2'        intercept, gradient
+    'fatti'         ip_rd, is_rd, ro_rd, relative differences of P and S
+                    impedances and density
+    'smith-gidlow'  vp_rd, vs_rd, density by Gardner's relation
+"""
+
+import numpy as np
+from zoeppritz.modaki import aki1980_coe
+
+# Number of model parameters of each method
+NPARAM = {'aki': 3, 'shuey3': 3, 'shuey2': 2, 'fatti': 3, 'smith-gidlow': 2}
+
+
+def transform(method, vs_vp_ratio=0.5, gardner=0.25):
+    """
+    Get the matrix T of x_aki = T x.
+
+    Parameters
+    ----------
+    method : str
+        parameterization, see NPARAM.
+    vs_vp_ratio : float
+        Vs over Vp ratio of background model.
+    gardner : float
+        exponent of Gardner's relation density ~ Vp ** gardner, for
+        'smith-gidlow'.
+
+    Returns
+    -------
+    T : array
+        shape (3, n).
+    """
+    if method == 'aki':
+        return np.eye(3)
+    elif method in ('shuey3', 'shuey2'):
+        # intercept = (ro + vp) / 2, curvature = vp / 2,
+        # gradient = vp / 2 - 2 * K ** 2 * (ro + 2 * vs)
+        c = 1 / (4 * vs_vp_ratio ** 2)
+        T = np.array([[2., 0., -2.],
+                      [0., 0., 2.],
+                      [-1., -c, 1 + c]])
+        return T if method == 'shuey3' else T[:, :2]
+    elif method == 'fatti':
+        return np.array([[0., 0., 1.],
+                         [1., 0., -1.],
+                         [0., 1., -1.]])
+    elif method == 'smith-gidlow':
+        return np.array([[gardner, 0.],
+                         [1., 0.],
+                         [0., 1.]])
+    else:
+        raise ValueError("Unknown method %s" % method)
+
+
+def avo_coe(method, vs_vp_ratio, average_angles, gardner=0.25):
+    """
+    Get the coefficient matrix A in Ax=b.
+
+    Parameters
+    ----------
+    method : str
+        parameterization, see NPARAM.
+    vs_vp_ratio : float
+        Vs over Vp ratio of background model.
+    average_angles : array
+        average of incident and transmission angles in degrees, shape (m,).
+    gardner : float
+        see transform().
+
+    Returns
+    -------
+    A : array
+        The coefficient matrix, shape (m, n).
+    """
+    T = transform(method, vs_vp_ratio, gardner)
+    return aki1980_coe(vs_vp_ratio, average_angles) @ T
+
+
+def avo_modeling(method, vs_vp_ratio, x, average_angles, gardner=0.25):
+    """
+    Calculate PP reflection amplitude.
+
+    Parameters
+    ----------
+    method : str
+        parameterization, see NPARAM.
+    vs_vp_ratio : float
+        Vs over Vp ratio of background model.
+    x : array
+        model, shape (n,) or (k, n).
+    average_angles : array
+        average angles in degrees, shape (m,).
+    gardner : float
+        see transform().
+
+    Returns
+    -------
+    rpp : array
+        P-wave reflection amplitude, shape (m,) or (k, m).
+    """
+    A = avo_coe(method, vs_vp_ratio, average_angles, gardner)
+    return np.asarray(x) @ A.T
@@ -6,10 +6,19 @@ Zoeppritz equation, explicit form, Cerveny 1977.
 
 from math import pi, sin, sqrt
 from cmath import phase
+import numpy as np
+from zoeppritz.anggrid import AngleGrid
+
+# In float32, samples where 1 - (r * sin(angle)) ** 2 is below this margin
+# for any of the ratios 1, r1, r2, r3 are computed again in float64
+CRITICAL_MARGIN = 0.02
 
 
 def physics_check(r1, r2, r3, r4, inc_angle):
     """Equation 6 in Zhu and McMechan 2014"""
+    if isinstance(inc_angle, AngleGrid):
+        physics_check_grid(r1, r2, r3, r4, inc_angle)
+        return
     if inc_angle < 0 or inc_angle >= 90:
         raise ValueError("Wrong angle {}".format(inc_angle))
     if r1 <= 0:
@@ -22,6 +31,27 @@ def physics_check(r1, r2, r3, r4, inc_angle):
         raise ValueError("Nonphysical r4 {}".format(r4))
 
 
+def physics_check_grid(r1, r2, r3, r4, grid):
+    """Equation 6 in Zhu and McMechan 2014, for arrays of models and angles"""
+    angles = grid.degrees
+    if np.any(angles < 0) or np.any(angles >= 90):
+        raise ValueError("Wrong angle {}".format(angles))
+    if np.any(r1 <= 0):
+        raise ValueError("Nonphysical r1 {}".format(r1))
+    if np.any(r2 <= 0) or np.any(r2 > 0.707):
+        raise ValueError("Nonphysical r2 {}".format(r2))
+    if np.any(r3 <= 0) or np.any(r3 > 0.707 * r1):
+        raise ValueError("Nonphysical r3 {}".format(r3))
+    if np.any(r4 <= 0):
+        raise ValueError("Nonphysical r4 {}".format(r4))
+
+
+def physical(r1, r2, r3, r4):
+    """Elementwise True where a model passes physics_check(), not NaN."""
+    return (r1 > 0) & (r2 > 0) & (r2 <= 0.707) & (r3 > 0) & \
+        (r3 <= 0.707 * r1) & (r4 > 0)
+
+
 def rps_cer1977(r1, r2, r3, r4, inc_angle, amp_type='real'):
     """
     Calculate Rps using Zoeppritz equation, explicit and exact, Zhu 2014.
@@ -36,19 +66,22 @@ def rps_cer1977(r1, r2, r3, r4, inc_angle, amp_type='real'):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    inc_angle : float
-        incident angle in degrees
+    inc_angle : float or AngleGrid
+        incident angle in degrees. With an AngleGrid the ratios may be
+        arrays broadcastable against the angles, e.g. shape (k, 1).
     amp_type : str
         amplitude type, 'abs' for absolute value, 'real' for the real part
         of a complex number which preserves the sign.
 
     Returns
     -------
-    amp : float
+    amp : float or array
         Amplitude
-    pha : float
+    pha : float or array
         Phase in degrees
     """
+    if isinstance(inc_angle, AngleGrid):
+        return rps_cer1977_grid(r1, r2, r3, r4, inc_angle, amp_type)
     physics_check(r1, r2, r3, r4, inc_angle)
 
     if inc_angle == 0:
@@ -100,19 +133,22 @@ def rpp_cer1977(r1, r2, r3, r4, inc_angle, amp_type='real'):
         Vs2 / Vp1
     r4 : float
         Ro2 / Ro1
-    inc_angle : float
-        incident angle in degrees
+    inc_angle : float or AngleGrid
+        incident angle in degrees. With an AngleGrid the ratios may be
+        arrays broadcastable against the angles, e.g. shape (k, 1).
     amp_type : str
         amplitude type, 'abs' for absolute value, 'real' for the real part
         of a complex number which preserves the sign.
 
     Returns
     -------
-    amp : float
+    amp : float or array
         Amplitude
-    pha : float
+    pha : float or array
         Phase in degrees
     """
+    if isinstance(inc_angle, AngleGrid):
+        return rpp_cer1977_grid(r1, r2, r3, r4, inc_angle, amp_type)
     physics_check(r1, r2, r3, r4, inc_angle)
 
     if inc_angle == 0:
@@ -154,22 +190,208 @@ def rpp_cer1977(r1, r2, r3, r4, inc_angle, amp_type='real'):
         raise ValueError("Unknown amplitude type")
 
 
+def rps_cer1977_grid(r1, r2, r3, r4, grid, amp_type='real'):
+    """
+    Calculate Rps on an angle grid, see rps_cer1977().
+
+    With a float32 grid, the ratios are rounded to float32 and samples
+    near critical angles are computed in float64, see single_precision().
+
+    Parameters
+    ----------
+    r1, r2, r3, r4 : float or array
+        The ratio model, arrays are broadcast against the angles.
+    grid : AngleGrid
+        incident angles
+    amp_type : str
+        amplitude type, 'abs' or 'real'
+
+    Returns
+    -------
+    amp : array
+        Amplitude
+    pha : array
+        Phase in degrees
+    """
+    if grid.dtype == np.float32:
+        return single_precision(_rps_grid, r1, r2, r3, r4, grid, amp_type)
+    return _rps_grid(r1, r2, r3, r4, grid, amp_type)
+
+
+def _rps_grid(r1, r2, r3, r4, grid, amp_type):
+    physics_check_grid(r1, r2, r3, r4, grid)
+
+    sin1 = grid.sin1
+    CT0 = sin1 / complex_sqrt(1, grid)
+    CT1 = r1 * sin1 / complex_sqrt(r1, grid)
+    CT2 = r2 * sin1 / complex_sqrt(r2, grid)
+    CT3 = r3 * sin1 / complex_sqrt(r3, grid)
+
+    Q = 2 * grid.sin12 * (r4 * r3 ** 2 - r2 ** 2)
+    A = (r4 - Q) ** 2 * CT1 * CT3
+    B = (r4 - Q - 1) ** 2 * CT0 * CT1 * CT2 * CT3
+    C = (1 + Q) ** 2 * CT0 * CT2
+    D = r4 * CT1 * CT2
+    E = r4 * CT0 * CT3
+    F = Q ** 2
+    G = Q * (1 + Q)
+    H = (r4 - Q) * (r4 - Q - 1) * CT1 * CT3
+
+    upp = 2 * CT2 * (G + H) / r2
+    low = F + E + D + C + B + A
+    # normal incidence, no PS conversion, avoid 0 / 0
+    low = np.where(sin1 == 0, 1, low)
+    rps = upp / low
+    return _amp_pha(rps, amp_type)
+
+
+def rpp_cer1977_grid(r1, r2, r3, r4, grid, amp_type='real'):
+    """
+    Calculate Rpp on an angle grid, see rpp_cer1977().
+
+    With a float32 grid, the ratios are rounded to float32 and samples
+    near critical angles are computed in float64, see single_precision().
+
+    Parameters
+    ----------
+    r1, r2, r3, r4 : float or array
+        The ratio model, arrays are broadcast against the angles.
+    grid : AngleGrid
+        incident angles
+    amp_type : str
+        amplitude type, 'abs' or 'real'
+
+    Returns
+    -------
+    amp : array
+        Amplitude
+    pha : array
+        Phase in degrees
+    """
+    if grid.dtype == np.float32:
+        return single_precision(_rpp_grid, r1, r2, r3, r4, grid, amp_type)
+    return _rpp_grid(r1, r2, r3, r4, grid, amp_type)
+
+
+def _rpp_grid(r1, r2, r3, r4, grid, amp_type):
+    physics_check_grid(r1, r2, r3, r4, grid)
+
+    sin1 = grid.sin1
+    CT0 = sin1 / complex_sqrt(1, grid)
+    CT1 = r1 * sin1 / complex_sqrt(r1, grid)
+    CT2 = r2 * sin1 / complex_sqrt(r2, grid)
+    CT3 = r3 * sin1 / complex_sqrt(r3, grid)
+
+    Q = 2 * grid.sin12 * (r4 * r3 ** 2 - r2 ** 2)
+    A = (r4 - Q) ** 2 * CT1 * CT3
+    B = (r4 - Q - 1) ** 2 * CT0 * CT1 * CT2 * CT3
+    C = (1 + Q) ** 2 * CT0 * CT2
+    D = r4 * CT1 * CT2
+    E = r4 * CT0 * CT3
+    F = Q ** 2
+
+    upp = F - E + D - C - B + A
+    low = F + E + D + C + B + A
+    # normal incidence, elastic Rpp reduces to acoustic
+    normal = sin1 == 0
+    acoustic = (r1 * r4 - 1) / (r1 * r4 + 1)
+    upp = np.where(normal, acoustic, upp)
+    low = np.where(normal, 1, low)
+    rpp = upp / low
+    return _amp_pha(rpp, amp_type)
+
+
+def near_critical(r1, r2, r3, grid):
+    """
+    Flag samples near critical angles, where the square roots of
+    complex_sqrt() lose precision.
+
+    Parameters
+    ----------
+    r1, r2, r3 : float or array
+        The ratio model, arrays are broadcast against the angles.
+    grid : AngleGrid
+        incident angles
+
+    Returns
+    -------
+    flag : array
+        True where 1 - (r * sin(angle)) ** 2 < CRITICAL_MARGIN in
+        absolute value for r in 1, r1, r2, r3.
+    """
+    sin12 = np.sin(grid.radians) ** 2
+    flag = np.abs(1 - sin12) < CRITICAL_MARGIN
+    for r in (r1, r2, r3):
+        r = np.asarray(r, dtype=np.float64)
+        flag = flag | (np.abs(1 - r ** 2 * sin12) < CRITICAL_MARGIN)
+    return flag
+
+
+def single_precision(func, r1, r2, r3, r4, grid, amp_type):
+    """
+    Evaluate a grid function in float32, with float64 near critical angles.
+
+    Away from critical angles, the float32 amplitude is within 1e-5 and the
+    phase within 0.01 degree of float64 over physical models, see
+    test_modcer. Near critical angles the cancellation in
+    1 - (r * sin(angle)) ** 2 amplifies the rounding error, so the angles
+    flagged by near_critical() are computed again in float64 and rounded.
+
+    Returns
+    -------
+    amp, pha : array
+        float32
+    """
+    rs = [np.asarray(r, dtype=np.float32) for r in (r1, r2, r3, r4)]
+    amp, pha = func(*rs, grid, amp_type)
+    near = near_critical(r1, r2, r3, grid)
+    if not np.any(near):
+        return amp, pha
+    shape = np.broadcast_shapes(amp.shape, near.shape)
+    amp = np.array(np.broadcast_to(amp, shape))
+    pha = np.array(np.broadcast_to(pha, shape))
+    near = np.broadcast_to(near, shape)
+    cols = near.reshape(-1, shape[-1]).any(axis=0)
+    sub = AngleGrid(grid.degrees[cols], grid.vp1)
+    rs = [np.asarray(r, dtype=np.float64) for r in (r1, r2, r3, r4)]
+    amp64, pha64 = func(*rs, sub, amp_type)
+    near = near[..., cols]
+    amp[..., cols] = np.where(near, amp64, amp[..., cols])
+    pha[..., cols] = np.where(near, pha64, pha[..., cols])
+    return amp, pha
+
+
+def _amp_pha(rc, amp_type):
+    """Split complex reflection coefficients to amplitude and phase."""
+    pha = np.angle(rc, deg=True)
+    if amp_type == 'real':
+        return rc.real, pha
+    elif amp_type == 'abs':
+        return np.abs(rc), pha
+    else:
+        raise ValueError("Unknown amplitude type")
+
+
 def complex_sqrt(r, angle):
     """
     Calculate complex square root in equations 2c-f in Zhu 2012.
 
     Parameters
     ----------
-    r : float
+    r : float or array
         A ratio, one of r0, r1, r2, r3.
-    angle : float
-        incident angle in radians.
+    angle : float or AngleGrid
+        incident angle in radians, or an angle grid.
 
     Returns
     -------
-    crsr : complex
+    crsr : complex or array
         The square root, refer to the equations.
     """
+    if isinstance(angle, AngleGrid):
+        rss = 1. - r ** 2 * angle.sin12
+        rsr = np.sqrt(np.abs(rss))
+        return np.where(rss >= 0, rsr + 0j, -1j * rsr)
     rsin = r * sin(angle)
     rss = 1. - rsin ** 2
     rsr = sqrt(abs(rss))
@@ -3,9 +3,11 @@
 
 import numpy as np
 from zoeppritz.utils import elapar_hs2delta, elapar_hs2ratio
-from zoeppritz.modaki import aki1980, inc2ave_angle
+from zoeppritz.modaki import aki1980, aki1980_ps, inc2ave_angle
 from zoeppritz.modwan import wang1999
+from zoeppritz.modqps import rps_quadratic
 from zoeppritz.modcer import rpp_cer1977, rps_cer1977
+from zoeppritz.anggrid import as_grid
 
 
 def modeling(model, inc_angles, equation, reflection):
@@ -30,12 +32,25 @@ def modeling(model, inc_angles, equation, reflection):
         amplitude and phase of the reflection coefficients at the angles.
         The array shape is mx3 of columns: incident angle, amplitude, phase.
     """
-    # Change parameterization
-    vp1, vs1, ro1, vp2, vs2, ro2 = model
-    ro_rd, vp_rd, vs_rd, vs_vp_ratio = \
-        elapar_hs2delta(vp1, vs1, ro1, vp2, vs2, ro2)
-    r1, r2, r3, r4 = elapar_hs2ratio(vp1, vs1, ro1, vp2, vs2, ro2)
+    angles = parse_angles(inc_angles)
+    a, p = modeling_batch(np.atleast_2d(model), angles, equation, reflection)
+    return np.vstack((angles, a[0], p[0])).T  # mx3 array
 
+
+def parse_angles(inc_angles):
+    """
+    Parse incident angles, see modeling().
+
+    Parameters
+    ----------
+    inc_angles : str
+        comma separated values, or 1-60(2) for 1 to 60 with step 2.
+
+    Returns
+    -------
+    angles : array
+        incident angles in degrees.
+    """
     if '-' in inc_angles:
         a, b = inc_angles.split('-')
         c, d = b.split('(')
@@ -46,37 +61,65 @@ def modeling(model, inc_angles, equation, reflection):
         angles = np.arange(a1, a2, ad)
     else:
         angles = np.array([float(a) for a in inc_angles.split(',')])
-    ave_angles = inc2ave_angle(angles, vp_rd)
+    return angles
+
+
+def modeling_batch(models, angles, equation, reflection, dtype=None):
+    """
+    Model reflection coefficients of many models at the same angles.
 
-    m = len(angles)
-    a, p = np.zeros(m), np.zeros(m)
+    Parameters
+    ----------
+    models : array
+        two half-space elastic models, shape (k, 6) of columns
+        vp1, vs1, ro1, vp2, vs2, ro2.
+    angles : array or AngleGrid
+        incident angles in degrees, shape (m,).
+    equation : str
+        modeling equation, 'linear', 'quadratic', 'zoeppritz'
+    reflection : str
+        reflection type, 'PP', 'PS'
+    dtype : dtype
+        float64 or float32, that of the angle grid or float64 if None.
+        float32 halves the memory traffic, see modcer.single_precision()
+        for its accuracy.
+
+    Returns
+    -------
+    amp, pha : array
+        amplitude and phase of the reflection coefficients, shape (k, m).
+    """
+    grid = as_grid(angles, dtype)
+    # Change parameterization, each parameter of shape (k, 1)
+    elapar = np.asarray(models, dtype=grid.dtype).T[:, :, None]
+    ro_rd, vp_rd, vs_rd, vs_vp_ratio = elapar_hs2delta(*elapar)
+    r1, r2, r3, r4 = elapar_hs2ratio(*elapar)
+
+    shape = (elapar.shape[1], len(grid))
+    p = np.zeros(shape, dtype=grid.dtype)
     if reflection == 'PP':
         if equation == 'linear':
+            ave_angles = inc2ave_angle(grid.degrees.astype(grid.dtype), vp_rd)
             a = aki1980(vs_vp_ratio, ro_rd, vp_rd, vs_rd, ave_angles)
-            return np.vstack((angles, a, p)).T  # mx3 array
         elif equation == 'quadratic':
+            ave_angles = inc2ave_angle(grid.degrees.astype(grid.dtype), vp_rd)
             a = wang1999(vs_vp_ratio, ro_rd, vp_rd, vs_rd, ave_angles)
-            return np.vstack((angles, a, p)).T  # mx3 array
         elif equation == 'zoeppritz':
-            for i in range(m):
-                angle = angles[i]
-                amp, pha = rpp_cer1977(r1, r2, r3, r4, angle)
-                a[i], p[i] = amp, pha
-            return np.vstack((angles, a, p)).T  # mx3 array
+            a, p = rpp_cer1977(r1, r2, r3, r4, grid)
         else:
             raise NotImplementedError
     elif reflection == 'PS':
         if equation == 'linear':
-            raise NotImplementedError
+            ave_angles = inc2ave_angle(grid.degrees.astype(grid.dtype), vp_rd)
+            a = aki1980_ps(vs_vp_ratio, ro_rd, vp_rd, vs_rd, ave_angles)
         elif equation == 'quadratic':
-            raise NotImplementedError
+            a = rps_quadratic(vs_vp_ratio, ro_rd, vp_rd, vs_rd,
+                              grid.degrees.astype(grid.dtype))
         elif equation == 'zoeppritz':
-            for i in range(m):
-                angle = angles[i]
-                amp, pha = rps_cer1977(r1, r2, r3, r4, angle)
-                a[i], p[i] = amp, pha
-            return np.vstack((angles, a, p)).T  # mx3 array
+            a, p = rps_cer1977(r1, r2, r3, r4, grid)
         else:
             raise NotImplementedError
     else:
         raise NotImplementedError
+    a = np.asarray(a, dtype=grid.dtype)
+    return np.broadcast_to(a, shape), np.broadcast_to(p, shape)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Rps modeling with quadratic approximation.
+
+The linear Rps of Aki and Richards at average angles, modaki.aki1980_ps(),
+plus the second order term of the exact Rps in the relative differences.
+At zero contrast the Hessian of rps_cer1977() less that of aki1980_ps()
+depends on the Vs/Vp ratio and the incident angle only. It is tabulated
+by finite differences over VS_VP_NODES once per set of angles, and
+interpolated linearly in Vs/Vp. The error of the approximation is of
+third order in the relative differences.
+"""
+
+from functools import lru_cache
+import numpy as np
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.modaki import inc2ave_angle, aki1980_ps, aki1980_ps_coe
+from zoeppritz.modcer import rps_cer1977
+
+# Vs/Vp ratios of the Hessian table, values outside are clipped
+VS_VP_NODES = np.linspace(0.2, 0.7, 51)
+# Relative difference of the finite differences
+STEP = 1e-3
+
+
+def _residual(x, vs_vp_ratio, angles):
+    """Exact less linear Rps of relative differences x at zero contrast."""
+    ro_rd, vp_rd, vs_rd = x
+    vp1, vp2 = 1 - vp_rd / 2, 1 + vp_rd / 2
+    vs1 = vs_vp_ratio * (1 - vs_rd / 2)
+    vs2 = vs_vp_ratio * (1 + vs_rd / 2)
+    ro1, ro2 = 1 - ro_rd / 2, 1 + ro_rd / 2
+    exact, _ = rps_cer1977(vp2 / vp1, vs1 / vp1, vs2 / vp1, ro2 / ro1,
+                           AngleGrid(angles))
+    ave_angles = inc2ave_angle(np.asarray(angles), vp_rd)
+    return exact - aki1980_ps(vs_vp_ratio, ro_rd, vp_rd, vs_rd, ave_angles)
+
+
+@lru_cache(maxsize=32)
+def hessian_table(angles):
+    """
+    Second derivatives of the exact less linear Rps at zero contrast.
+
+    Parameters
+    ----------
+    angles : tuple
+        incident angles in degrees, hashable.
+
+    Returns
+    -------
+    table : array
+        shape (len(VS_VP_NODES), m, 3, 3), symmetric in the last two axes
+        of density, Vp and Vs.
+    """
+    ratio = VS_VP_NODES[:, None]
+    steps = np.eye(3) * STEP
+    table = np.empty((len(VS_VP_NODES), len(angles), 3, 3))
+    for a in range(3):
+        for b in range(a, 3):
+            d2 = 0
+            for sa, sb in ((1, 1), (1, -1), (-1, 1), (-1, -1)):
+                x = sa * steps[a] + sb * steps[b]
+                d2 = d2 + sa * sb * _residual(x, ratio, angles)
+            table[:, :, a, b] = table[:, :, b, a] = d2 / (4 * STEP ** 2)
+    return table
+
+
+def quad_hessian(vs_vp_ratio, inc_angles):
+    """
+    Interpolate the Hessian table at Vs/Vp ratios.
+
+    Parameters
+    ----------
+    vs_vp_ratio : float or array
+        scalar, or shape (k,) or (k, 1) for k models.
+    inc_angles : array
+        incident angles in degrees, shape (m,).
+
+    Returns
+    -------
+    hess : array
+        shape (m, 3, 3), or (k, m, 3, 3).
+    """
+    table = hessian_table(tuple(np.asarray(inc_angles, dtype=float).tolist()))
+    lo, hi = VS_VP_NODES[0], VS_VP_NODES[-1]
+    ratio = np.clip(np.ravel(vs_vp_ratio), lo, hi)
+    pos = (ratio - lo) / (VS_VP_NODES[1] - lo)
+    i = np.minimum(pos.astype(int), len(VS_VP_NODES) - 2)
+    w = (pos - i)[:, None, None, None]
+    hess = (1 - w) * table[i] + w * table[i + 1]
+    return hess[0] if np.ndim(vs_vp_ratio) == 0 else hess
+
+
+def rps_quadratic(vs_vp_ratio, ro_rd, vp_rd, vs_rd, inc_angles,
+                  amp_type='real'):
+    """
+    Calculate PS reflection amplitude with the quadratic approximation.
+
+    Parameters
+    ----------
+    vs_vp_ratio : float or array
+        Vs over Vp ratio of background model, scalar or shape (k, 1).
+    ro_rd, vp_rd, vs_rd : float or array
+        relative differences of density, Vp and Vs, scalar or (k, 1).
+    inc_angles : array
+        incident angles in degrees, shape (m,).
+    amp_type : str
+        amplitude type, 'abs' for absolute value, 'real' for the real value.
+
+    Returns
+    -------
+    rps : array
+        PS reflection amplitude, shape (m,) or (k, m).
+    """
+    ave_angles = inc2ave_angle(inc_angles, vp_rd)
+    R = aki1980_ps(vs_vp_ratio, ro_rd, vp_rd, vs_rd, ave_angles)
+    x = np.stack(np.broadcast_arrays(ro_rd, vp_rd, vs_rd), axis=-1)
+    hess = quad_hessian(vs_vp_ratio, inc_angles)
+    R = R + 0.5 * np.einsum('...a,...ab,...b->...', x, hess, x)
+    if amp_type == 'real':
+        return R
+    elif amp_type == 'abs':
+        return np.abs(R)
+    else:
+        raise ValueError("Unknown amplitude type")
+
+
+def rps_quadratic_jac(vs_vp_ratio, ro_rd, vp_rd, vs_rd, inc_angles,
+                      out=None):
+    """
+    Calculate the Jacobian matrix of rps_quadratic().
+
+    The Vp column includes the change of the average angles with vp_rd,
+    so the matrix is the exact derivative of rps_quadratic().
+
+    Parameters
+    ----------
+    vs_vp_ratio, ro_rd, vp_rd, vs_rd : float or array
+        see rps_quadratic().
+    inc_angles : array
+        incident angles in degrees, shape (m,).
+    out : array
+        buffer to fill in place, shape (m, 3) or (k, m, 3).
+
+    Returns
+    -------
+    A : array
+        The Jacobian matrix, shape (m, 3) or (k, m, 3). The three columns
+        are for density, Vp, and Vs, respectively.
+    """
+    ave_angles = inc2ave_angle(inc_angles, vp_rd)
+    A = aki1980_ps_coe(vs_vp_ratio, ave_angles, out=out)
+    x = np.stack(np.broadcast_arrays(ro_rd, vp_rd, vs_rd), axis=-1)
+    hess = quad_hessian(vs_vp_ratio, inc_angles)
+    A += np.einsum('...ab,...b->...a', hess, x)
+
+    # dR/d(average angle) of aki1980_ps()
+    angles = ave_angles / 180. * np.pi
+    sin1, cos1 = np.sin(angles), np.cos(angles)
+    cosj = np.sqrt(1 - (vs_vp_ratio * sin1) ** 2)
+    cosj_pd = -vs_vp_ratio ** 2 * sin1 * cos1 / cosj
+    scale = sin1 / (2 * cosj)
+    scale_pd = cos1 / (2 * cosj) - sin1 * cosj_pd / (2 * cosj ** 2)
+    kcc = 2 * vs_vp_ratio * cos1 * cosj
+    kss = 2 * vs_vp_ratio ** 2 * sin1 ** 2
+    kcc_pd = 2 * vs_vp_ratio * (cos1 * cosj_pd - sin1 * cosj)
+    kss_pd = 4 * vs_vp_ratio ** 2 * sin1 * cos1
+    cd_pd = scale_pd * (1 - kss + kcc) + scale * (kcc_pd - kss_pd)
+    cs_pd = 2 * (scale_pd * (kcc - kss) + scale * (kcc_pd - kss_pd))
+    ave_pd = cd_pd * ro_rd + cs_pd * vs_rd
+    # d(average angle)/d(vp_rd), average = (inc + arcsin(r1 sin inc)) / 2
+    inc = np.asarray(inc_angles) / 180. * np.pi
+    r1 = (2 + vp_rd) / (2 - vp_rd)
+    r1_pd = 4 / (2 - vp_rd) ** 2
+    sin_inc = np.sin(inc)
+    trans_pd = sin_inc * r1_pd / np.sqrt(1 - (r1 * sin_inc) ** 2)
+    A[..., 1] += ave_pd * 0.5 * trans_pd
+    return A
@@ -6,7 +6,7 @@ Rpp modeling and inversion with quadratic approximation, Wang 1999.
 
 from math import pi
 import numpy as np
-from zoeppritz.modaki import aki1980_coe
+from zoeppritz.modaki import aki1980
 
 
 def wang1999(vs_vp_ratio, ro_rd, vp_rd, vs_rd, average_angles,
@@ -17,9 +17,7 @@ def wang1999(vs_vp_ratio, ro_rd, vp_rd, vs_rd, average_angles,
 
     For arguments, refer function aki1980()
     """
-    A = aki1980_coe(vs_vp_ratio, average_angles)
-    x = np.array([ro_rd, vp_rd, vs_rd])
-    R = np.matmul(A, x)
+    R = aki1980(vs_vp_ratio, ro_rd, vp_rd, vs_rd, average_angles)
 
     angles = average_angles / 180. * pi
     quad_coef = vs_vp_ratio ** 3 * np.cos(angles) * np.sin(angles) ** 2
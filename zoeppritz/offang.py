@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Offset to incident angle conversion of prestack gathers.
+
+The gathers are offset gathers sorted by increasing offset, with shape
+(..., nt, nx) for nt zero-offset two-way times and nx offsets. The leading
+axes, if any, are gathers, e.g. CDPs of a line. Each time sample of an
+angle gather is a row of amplitudes at incident angles, which is the input
+of the inversions, e.g. cer1itr(), wan1itr().
+"""
+
+from math import pi
+import numpy as np
+
+# Post-critical angles are sorted after all real angles in degrees
+ANGLE_PAD = 135.
+ANGLE_SPAN = 180.
+
+
+def vrms2vint(times, vrms):
+    """
+    Convert RMS velocity to interval velocity by Dix equation.
+
+    Parameters
+    ----------
+    times : array
+        zero-offset two-way times, shape (nt,), increasing.
+    vrms : array
+        RMS velocity at the times, shape (..., nt).
+
+    Returns
+    -------
+    vint : array
+        interval velocity of the layer above each time, shape (..., nt).
+        The first sample is the RMS velocity.
+    """
+    times = np.asarray(times, dtype=float)
+    vrms = np.asarray(vrms, dtype=float)
+    v2t = vrms ** 2 * times
+    vint = np.empty_like(vrms)
+    vint[..., 0] = vrms[..., 0]
+    vint[..., 1:] = np.sqrt(np.diff(v2t, axis=-1) / np.diff(times))
+    return vint
+
+
+def vint2vrms(times, vint):
+    """
+    Convert interval velocity to RMS velocity, inverse of vrms2vint().
+
+    Parameters
+    ----------
+    times : array
+        zero-offset two-way times, shape (nt,), increasing.
+    vint : array
+        interval velocity of the layer above each time, shape (..., nt).
+
+    Returns
+    -------
+    vrms : array
+        RMS velocity, shape (..., nt).
+    """
+    times = np.asarray(times, dtype=float)
+    vint = np.asarray(vint, dtype=float)
+    dt = np.diff(times, prepend=0.)
+    v2t = np.cumsum(vint ** 2 * dt, axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        vrms = np.sqrt(v2t / times)
+    return np.where(times == 0, vint, vrms)
+
+
+def offset2angle(times, offsets, vrms, vint=None, method='straight'):
+    """
+    Calculate incident angles of (time, offset) samples.
+
+    Parameters
+    ----------
+    times : array
+        zero-offset two-way times, shape (nt,).
+    offsets : array
+        source-receiver offsets, shape (nx,), same length unit as the
+        velocity times the time.
+    vrms : array
+        RMS velocity, shape (nt,) or (..., nt).
+    vint : array
+        interval velocity for the 'dix' method, same shape as vrms.
+        It is derived from vrms by Dix equation if not given.
+    method : str
+        'straight' for straight ray, tan(angle) = x / (vrms * t0).
+        'dix' for the ray parameter of the hyperbolic moveout with the
+        local interval velocity, sin(angle) = vint * x / (vrms**2 * t),
+        where t is the moveout time (Walden, 1991).
+
+    Returns
+    -------
+    angles : array
+        incident angles in degrees, shape (..., nt, nx).
+        Post-critical samples are NaN.
+    """
+    times = np.asarray(times, dtype=float)
+    offsets = np.asarray(offsets, dtype=float)
+    vrms = np.asarray(vrms, dtype=float)
+    t0 = times[:, None]
+    x = offsets[None, :]
+    v = vrms[..., None]
+    if method == 'straight':
+        angles = np.arctan2(np.abs(x), v * t0)
+    elif method == 'dix':
+        if vint is None:
+            vint = vrms2vint(times, vrms)
+        vi = np.asarray(vint, dtype=float)[..., None]
+        t = np.sqrt(t0 ** 2 + (x / v) ** 2)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin1 = vi * np.abs(x) / (v ** 2 * t)
+        sin1 = np.where(x == 0, 0., sin1)
+        with np.errstate(invalid='ignore'):
+            angles = np.arcsin(np.where(sin1 < 1, sin1, np.nan))
+    else:
+        raise ValueError("Unknown method {}".format(method))
+    return angles / pi * 180.
+
+
+def angle_gather(gather, times, offsets, vrms, angles, vint=None,
+                 method='straight'):
+    """
+    Convert offset gathers to angle gathers by linear interpolation.
+
+    Parameters
+    ----------
+    gather : array
+        offset gathers, shape (..., nt, nx).
+    times : array
+        zero-offset two-way times, shape (nt,).
+    offsets : array
+        offsets, shape (nx,), increasing.
+    vrms : array
+        RMS velocity, shape (nt,) or (..., nt).
+    angles : array
+        output incident angles in degrees, shape (na,), increasing.
+    vint : array
+        interval velocity, see offset2angle().
+    method : str
+        'straight' or 'dix', see offset2angle().
+
+    Returns
+    -------
+    agather : array
+        angle gathers, shape (..., nt, na). Angles outside the offset
+        coverage of a time sample are NaN.
+    """
+    gather = np.asarray(gather, dtype=float)
+    sample_angles = offset2angle(times, offsets, vrms, vint=vint,
+                                 method=method)
+    sample_angles = np.broadcast_to(sample_angles, gather.shape)
+    return interp_rows(sample_angles, gather, angles)
+
+
+def angle_stack(gather, times, offsets, vrms, ranges, vint=None,
+                method='straight'):
+    """
+    Stack offset gathers into angle ranges.
+
+    Parameters
+    ----------
+    gather : array
+        offset gathers, shape (..., nt, nx).
+    times : array
+        zero-offset two-way times, shape (nt,).
+    offsets : array
+        offsets, shape (nx,).
+    vrms : array
+        RMS velocity, shape (nt,) or (..., nt).
+    ranges : list
+        angle ranges in degrees, e.g. [(0, 10), (10, 20)].
+        A range includes its lower bound and excludes the upper bound.
+    vint : array
+        interval velocity, see offset2angle().
+    method : str
+        'straight' or 'dix', see offset2angle().
+
+    Returns
+    -------
+    stacks : array
+        mean amplitude in each range, shape (..., nt, len(ranges)).
+        Ranges without live samples are NaN.
+    """
+    gather = np.asarray(gather, dtype=float)
+    sample_angles = offset2angle(times, offsets, vrms, vint=vint,
+                                 method=method)
+    stacks = np.empty(gather.shape[:-1] + (len(ranges),))
+    with np.errstate(invalid='ignore'):
+        for i, (amin, amax) in enumerate(ranges):
+            live = (sample_angles >= amin) & (sample_angles < amax)
+            fold = live.sum(axis=-1)
+            total = np.where(live, gather, 0).sum(axis=-1)
+            stacks[..., i] = np.where(fold > 0, total / fold, np.nan)
+    return stacks
+
+
+def interp_rows(x, y, xnew):
+    """
+    Linear interpolation along the last axis, all rows at once.
+
+    Parameters
+    ----------
+    x : array
+        angles in degrees, shape (..., n), increasing along the last axis.
+        NaN are allowed at the end of a row, e.g. post-critical angles.
+    y : array
+        values at x, same shape as x.
+    xnew : array
+        angles in degrees to interpolate at, shape (na,).
+
+    Returns
+    -------
+    ynew : array
+        values at xnew, shape (..., na). NaN outside the range of x.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    xnew = np.asarray(xnew, dtype=float)
+    n = x.shape[-1]
+    rows = x.reshape(-1, n)
+    vals = y.reshape(-1, n)
+    nrow = rows.shape[0]
+
+    # Shift every row to its own interval to search all rows in one call
+    shift = np.arange(nrow)[:, None] * ANGLE_SPAN
+    keys = np.where(np.isnan(rows), ANGLE_PAD, rows) + shift
+    idx = np.searchsorted(keys.ravel(), (xnew[None, :] + shift).ravel(),
+                          side='right').reshape(nrow, -1)
+    idx -= np.arange(nrow)[:, None] * n
+    i1 = np.clip(idx, 1, n - 1)
+    i0 = i1 - 1
+    x0 = np.take_along_axis(rows, i0, axis=1)
+    x1 = np.take_along_axis(rows, i1, axis=1)
+    y0 = np.take_along_axis(vals, i0, axis=1)
+    y1 = np.take_along_axis(vals, i1, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = np.where(x1 > x0, (xnew - x0) / (x1 - x0), 0.)
+    ynew = y0 + w * (y1 - y0)
+    outside = (idx == 0) | (idx == n) & (xnew > rows[:, -1:]) | \
+        np.isnan(ynew)
+    ynew[outside] = np.nan
+    return ynew.reshape(x.shape[:-1] + (len(xnew),))
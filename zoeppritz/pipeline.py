@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Streaming inversion pipeline: read, precondition, invert, write.
+
+Every stage is a generator over chunks (start, stop, data), where data is
+the rows start:stop of the gathers or models. Stages are chained by
+passing one generator to the next. buffered() runs the upstream stages in
+a thread behind a bounded queue, so reading overlaps inversion and at most
+a fixed number of chunks are in memory.
+"""
+
+import queue
+import threading
+import numpy as np
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.gracer import postcritical
+from zoeppritz.dataio import iter_chunks
+from zoeppritz.batch import invert_chunk
+
+# Seconds between checks of the stop flag of a blocked producer
+POLL_INTERVAL = 0.1
+
+
+def read_stage(gathers, chunk_size):
+    """
+    Read chunks of gathers into memory.
+
+    Parameters
+    ----------
+    gathers : array
+        gathers, shape (k, m), usually a memmap.
+    chunk_size : int
+        number of gathers per chunk.
+
+    Yields
+    ------
+    start, stop, data : int, int, array
+    """
+    for start, stop, chunk in iter_chunks(gathers, chunk_size):
+        yield start, stop, np.array(chunk, dtype=float)
+
+
+def mute_stage(chunks, angles, r1):
+    """
+    Mute post-critical angles to NaN, see gracer.postcritical().
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of gathers.
+    angles : array
+        incident angles in degrees, shape (m,).
+    r1 : float or array
+        Vp2 / Vp1 of the background model, scalar or shape (k,) for
+        all k gathers.
+
+    Yields
+    ------
+    start, stop, data : int, int, array
+    """
+    grid = AngleGrid(angles)
+    for start, stop, data in chunks:
+        r1_chunk = r1 if np.ndim(r1) == 0 else \
+            np.asarray(r1[start:stop])[:, None]
+        mask = np.broadcast_to(postcritical(r1_chunk, grid), data.shape)
+        data[mask] = np.nan
+        yield start, stop, data
+
+
+def normalize_stage(chunks, scale):
+    """
+    Scale amplitudes to reflection coefficients.
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of gathers.
+    scale : float or array
+        amplitude scale, scalar or shape (m,) per angle.
+
+    Yields
+    ------
+    start, stop, data : int, int, array
+    """
+    for start, stop, data in chunks:
+        data *= scale
+        yield start, stop, data
+
+
+def invert_stage(chunks, angles, x_ini, rps=None, vs_vp_ratio=0.5,
+                 **kwargs):
+    """
+    Invert chunks of gathers by batch.invert_chunk().
+
+    Per-gather inputs are sliced to the rows of each chunk, as in
+    batch.run_batch().
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of gathers.
+    angles : array
+        incident angles in degrees, shape (m,).
+    x_ini : array
+        initial model, shape (n,) or (k, n) for all k gathers.
+    rps : array
+        Rps gathers, shape (k, m), see invert_chunk().
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or shape (k,).
+    kwargs : dict
+        other arguments of invert_chunk(), e.g. equation, niter.
+
+    Yields
+    ------
+    start, stop, x : int, int, array
+        the inverted models of the chunk.
+    """
+    x_ini = np.asarray(x_ini, dtype=float)
+    for start, stop, data in chunks:
+        yield start, stop, invert_chunk(
+            angles, data, x_ini[start:stop] if x_ini.ndim == 2 else x_ini,
+            rps=None if rps is None else rps[start:stop],
+            vs_vp_ratio=vs_vp_ratio if np.ndim(vs_vp_ratio) == 0
+            else vs_vp_ratio[start:stop],
+            **kwargs)
+
+
+def write_stage(chunks, out):
+    """
+    Write chunks in place.
+
+    Parameters
+    ----------
+    chunks : iterable
+        chunks of models.
+    out : array
+        output, shape (k, n), usually a memmap.
+
+    Yields
+    ------
+    start, stop : int, int
+        rows written
+    """
+    for start, stop, data in chunks:
+        out[start:stop] = data
+        yield start, stop
+
+
+def buffered(chunks, maxsize=2):
+    """
+    Run a stage in a background thread behind a bounded queue.
+
+    Parameters
+    ----------
+    chunks : iterable
+        the upstream stage.
+    maxsize : int
+        maximum number of chunks waiting in the queue.
+
+    Yields
+    ------
+    item
+        items of the upstream stage, in order. An exception raised
+        upstream is raised here.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=POLL_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in chunks:
+                if not put(('item', item)):
+                    return
+            put(('end', None))
+        except BaseException as e:
+            put(('error', e))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            kind, item = items.get()
+            if kind == 'end':
+                return
+            elif kind == 'error':
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run_pipeline(gathers, out, angles, x_ini, chunk_size=1024, r1=None,
+                 scale=1., maxsize=2, **kwargs):
+    """
+    Read, mute, normalize, invert and write all gathers.
+
+    Reading and writing run in their own threads, each with a queue of at
+    most maxsize chunks.
+
+    Parameters
+    ----------
+    gathers : array
+        Rpp gathers, shape (k, m), usually a memmap.
+    out : array
+        output models, shape (k, n), usually a memmap.
+    angles : array
+        incident angles in degrees, shape (m,).
+    x_ini : array
+        initial model, shape (n,) or (k, n).
+    chunk_size : int
+        number of gathers per chunk.
+    r1 : float or array
+        Vp2 / Vp1 to mute post-critical angles, no mute if None.
+    scale : float or array
+        amplitude scale, see normalize_stage().
+    maxsize : int
+        queue size between the threads.
+    kwargs : dict
+        other arguments of batch.invert_chunk(), e.g. equation, niter,
+        and the per-gather rps or vs_vp_ratio of invert_stage().
+
+    Returns
+    -------
+    nchunk : int
+        number of chunks written.
+
+    Raises
+    ------
+    ValueError
+        if a per-gather input has not one row per gather.
+    """
+    k = len(gathers)
+    per_gather = {'x_ini': x_ini if np.ndim(x_ini) == 2 else None,
+                  'rps': kwargs.get('rps'),
+                  'vs_vp_ratio': kwargs.get('vs_vp_ratio')
+                  if np.ndim(kwargs.get('vs_vp_ratio', 0)) else None}
+    for name, value in per_gather.items():
+        if value is not None and len(value) != k:
+            raise ValueError("{} has {} rows for {} gathers"
+                             .format(name, len(value), k))
+    stage = buffered(read_stage(gathers, chunk_size), maxsize)
+    if r1 is not None:
+        stage = mute_stage(stage, angles, r1)
+    if np.any(np.asarray(scale) != 1):
+        stage = normalize_stage(stage, scale)
+    stage = invert_stage(stage, angles, x_ini, **kwargs)
+    nchunk = 0
+    for _ in write_stage(buffered(stage, maxsize), out):
+        nchunk += 1
+    return nchunk
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Coordinator and workers to invert a gather volume on several machines.
+
+The coordinator splits the gathers into chunks and serves them over TCP,
+with the message format of zoeppritz.service. Workers pull a chunk, invert
+it by batch.invert_chunk() and send the models back with the request for
+the next one, so fast workers take more chunks. When no chunk is left to
+hand out, an idle worker gets a copy of a chunk still running elsewhere and
+the first result wins. A chunk whose worker fails, disconnects, sends a
+malformed reply or stalls beyond the timeout is queued again, up to
+max_retries times, and the connection of that worker is closed.
+
+Start a worker on each node with
+
+    python -m zoeppritz.scheduler host port
+"""
+
+import sys
+import asyncio
+import socket
+from collections import deque, Counter
+from multiprocessing import Process
+from time import perf_counter
+import numpy as np
+from zoeppritz.batch import NPARAM, invert_chunk
+from zoeppritz.service import encode, read_message, recv_message
+
+
+class Coordinator(object):
+    """
+    Hand out chunks of gathers and assemble the inverted models.
+
+    Parameters
+    ----------
+    gathers : array
+        Rpp gathers, shape (k, m), usually a memmap.
+    out : array
+        Output models, shape (k, n), usually a memmap. Rows of chunks
+        that failed more than max_retries times are NaN.
+    angles : array
+        incident angles in degrees, shape (m,).
+    x_ini : array
+        Initial model, shape (n,) or (k, n).
+    chunk_size : int
+        number of gathers per chunk.
+    max_retries : int
+        times a failed chunk is queued again.
+    timeout : float
+        seconds a worker has to send the result of a chunk, None to wait
+        forever.
+    rps : array
+        Rps gathers, shape (k, m), see invert_chunk().
+    vs_vp_ratio : float or array
+        Vs/Vp ratio, scalar or shape (k,).
+    kwargs : dict
+        other arguments of invert_chunk(), JSON serializable,
+        e.g. equation, niter.
+
+    Attributes
+    ----------
+    stats : dict
+        'chunks' number of chunks, 'retries' chunks queued again,
+        'stolen' copies of running chunks handed out, 'failed' chunks
+        given up, 'timeouts' chunks of stalled workers, 'workers' chunks
+        finished per worker id, 'time' seconds.
+    """
+
+    def __init__(self, gathers, out, angles, x_ini, chunk_size=1024,
+                 max_retries=2, timeout=None, rps=None, vs_vp_ratio=0.5,
+                 **kwargs):
+        self.gathers = gathers
+        self.out = out
+        self.angles = np.asarray(angles, dtype=float)
+        self.x_ini = np.asarray(x_ini, dtype=float)
+        self.rps = rps
+        self.vs_vp_ratio = np.asarray(vs_vp_ratio, dtype=float)
+        self.kwargs = kwargs
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.nparam = NPARAM[kwargs.get('equation', 'zoeppritz')]
+        k = len(gathers)
+        chunks = [(i, min(i + chunk_size, k)) for i in range(0, k, chunk_size)]
+        self.nchunk = len(chunks)
+        self.pending = deque(chunks)
+        self.running = Counter()
+        self.attempts = Counter()
+        self.done = set()
+        self.failed = set()
+        self.stats = {'chunks': self.nchunk, 'retries': 0, 'stolen': 0,
+                      'failed': 0, 'timeouts': 0, 'workers': Counter(),
+                      'time': 0.}
+        self._nworker = 0
+        self._changed = None
+        self._finished = None
+        self._server = None
+
+    async def start(self, host='127.0.0.1', port=0):
+        """
+        Start listening for workers.
+
+        Returns
+        -------
+        address : tuple
+            (host, port) to pass to the workers.
+        """
+        self._changed = asyncio.Event()
+        self._finished = asyncio.Event()
+        self._t0 = perf_counter()
+        if self.nchunk == 0:
+            self._finished.set()
+        self._server = await asyncio.start_server(self.handle, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def wait(self):
+        """
+        Wait until every chunk is finished or failed, stop listening.
+
+        Returns
+        -------
+        stats : dict
+        """
+        await self._finished.wait()
+        self._server.close()
+        self.stats['time'] = perf_counter() - self._t0
+        return self.stats
+
+    async def handle(self, reader, writer):
+        """Serve a worker until no chunk is left or it disconnects."""
+        self._nworker += 1
+        wid = self._nworker
+        chunk = None
+        try:
+            while True:
+                try:
+                    header, arrays = await asyncio.wait_for(
+                        read_message(reader),
+                        None if chunk is None else self.timeout)
+                except asyncio.TimeoutError:
+                    self.stats['timeouts'] += 1
+                    raise
+                if chunk is not None:
+                    op = header.get('op')
+                    if op == 'result':
+                        self._finish(chunk, self._result(chunk, arrays), wid)
+                    elif op == 'error':
+                        self._fail(chunk)
+                    else:
+                        raise ValueError("Reply %r to a task" % op)
+                chunk = None
+                chunk = await self._next()
+                if chunk is None:
+                    writer.write(encode({'op': 'done'}))
+                    await writer.drain()
+                    break
+                writer.write(self._task(chunk))
+                await writer.drain()
+        except Exception:
+            # Disconnected, stalled or malformed, the stream is lost
+            if chunk is not None:
+                self._fail(chunk)
+        finally:
+            writer.close()
+
+    async def _next(self):
+        """Next chunk for an idle worker, None when all are finished."""
+        while not self._finished.is_set():
+            if self.pending:
+                chunk = self.pending.popleft()
+            else:
+                # Steal the oldest chunk that runs on one worker only
+                chunk = next((c for c, n in self.running.items() if n == 1),
+                             None)
+                if chunk is not None:
+                    self.stats['stolen'] += 1
+            if chunk is not None:
+                self.running[chunk] += 1
+                return chunk
+            self._changed.clear()
+            await self._changed.wait()
+        return None
+
+    def _task(self, chunk):
+        start, stop = chunk
+        x_ini = self.x_ini[start:stop] if self.x_ini.ndim == 2 \
+            else self.x_ini
+        ratio = self.vs_vp_ratio[start:stop] if self.vs_vp_ratio.ndim \
+            else self.vs_vp_ratio
+        arrays = [self.angles, np.asarray(self.gathers[start:stop], float),
+                  x_ini, ratio]
+        if self.rps is not None:
+            arrays.append(np.asarray(self.rps[start:stop], float))
+        header = {'op': 'task', 'start': start, 'stop': stop,
+                  'kwargs': self.kwargs}
+        return encode(header, arrays)
+
+    def _result(self, chunk, arrays):
+        """Models of a result message, ValueError if malformed."""
+        shape = (chunk[1] - chunk[0], self.nparam)
+        if len(arrays) != 1 or arrays[0].shape != shape:
+            raise ValueError("Result of shape %s, expect %s" %
+                             ([a.shape for a in arrays], shape))
+        return arrays[0]
+
+    def _finish(self, chunk, x, wid):
+        del self.running[chunk]
+        if chunk not in self.done and chunk not in self.failed:
+            self.out[chunk[0]:chunk[1]] = x
+            self.done.add(chunk)
+            self.stats['workers'][wid] += 1
+        self._update()
+
+    def _fail(self, chunk):
+        self.running[chunk] -= 1
+        if self.running[chunk] <= 0:
+            del self.running[chunk]
+        # A copy running elsewhere may still finish it
+        if chunk in self.done or chunk in self.failed or chunk in self.running:
+            return
+        self.attempts[chunk] += 1
+        if self.attempts[chunk] > self.max_retries:
+            self.out[chunk[0]:chunk[1]] = np.nan
+            self.failed.add(chunk)
+            self.stats['failed'] += 1
+        else:
+            self.pending.append(chunk)
+            self.stats['retries'] += 1
+        self._update()
+
+    def _update(self):
+        if len(self.done) + len(self.failed) == self.nchunk:
+            self._finished.set()
+        self._changed.set()
+
+
+def run_worker(address, timeout=None):
+    """
+    Invert chunks from a coordinator until it has none left.
+
+    Parameters
+    ----------
+    address : tuple
+        (host, port) of the coordinator.
+    timeout : float
+        socket timeout in seconds, None to block.
+
+    Returns
+    -------
+    ntask : int
+        number of chunks inverted.
+    """
+    ntask = 0
+    with socket.create_connection(address, timeout) as sock:
+        sock.sendall(encode({'op': 'ready'}))
+        while True:
+            header, arrays = recv_message(sock)
+            if header['op'] == 'done':
+                return ntask
+            angles, rpp, x_ini, ratio = arrays[:4]
+            rps = arrays[4] if len(arrays) > 4 else None
+            try:
+                x = invert_chunk(angles, rpp, x_ini, rps=rps,
+                                 vs_vp_ratio=ratio, **header['kwargs'])
+            except Exception as e:
+                reply = encode({'op': 'error',
+                                'error': '%s: %s' % (type(e).__name__, e)})
+            else:
+                reply = encode({'op': 'result'}, (x,))
+                ntask += 1
+            sock.sendall(reply)
+
+
+def schedule(gathers, out, angles, x_ini, nworker=2, host='127.0.0.1',
+             port=0, **kwargs):
+    """
+    Invert all gathers with a coordinator and local worker processes.
+
+    With nworker 0, workers on other nodes connect to host and port.
+
+    Parameters
+    ----------
+    gathers : array
+        Rpp gathers, shape (k, m).
+    out : array
+        Output models, shape (k, n).
+    angles : array
+        incident angles in degrees, shape (m,).
+    x_ini : array
+        Initial model, shape (n,) or (k, n).
+    nworker : int
+        number of local worker processes.
+    host, port : str, int
+        address to listen on.
+    kwargs : dict
+        other arguments of Coordinator, e.g. chunk_size, equation.
+
+    Returns
+    -------
+    stats : dict
+        see Coordinator.
+    """
+    n = NPARAM[kwargs.get('equation', 'zoeppritz')]
+    if out.shape != (len(gathers), n):
+        raise ValueError("Output shape %s, expect %s" %
+                         (out.shape, (len(gathers), n)))
+
+    async def run():
+        coordinator = Coordinator(gathers, out, angles, x_ini, **kwargs)
+        address = await coordinator.start(host, port)
+        workers = [Process(target=run_worker, args=(address,))
+                   for i in range(nworker)]
+        for worker in workers:
+            worker.start()
+        try:
+            return await coordinator.wait()
+        finally:
+            loop = asyncio.get_running_loop()
+            for worker in workers:
+                await loop.run_in_executor(None, worker.join)
+
+    return asyncio.run(run())
+
+
+if __name__ == '__main__':
+    print(run_worker((sys.argv[1], int(sys.argv[2]))))
@@ -0,0 +1,445 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+SEG-Y prestack gathers and attribute volumes, fixed-length traces.
+
+Traces are memory-mapped, samples are decoded in bulk from IBM or IEEE
+floats. The trace header index of inline, crossline and gather key (angle
+or offset) is built once and cached next to the file.
+"""
+
+import os
+import numpy as np
+from zoeppritz.batch import NPARAM, invert_chunk
+
+TEXT_HEADER_SIZE = 3200
+BINARY_HEADER_SIZE = 400
+TRACE_HEADER_SIZE = 240
+DATA_OFFSET = TEXT_HEADER_SIZE + BINARY_HEADER_SIZE
+
+# Byte locations (1-based) in the binary header
+BIN_DT = 3217
+BIN_NS = 3221
+BIN_FORMAT = 3225
+BIN_FIXED_LENGTH = 3503
+
+# Byte locations (1-based) in the trace header
+TRC_CDP = 21
+TRC_OFFSET = 37
+TRC_NS = 115
+TRC_DT = 117
+TRC_INLINE = 189
+TRC_CROSSLINE = 193
+
+# Sample format code and the data type on disk
+FORMATS = {1: '>u4', 2: '>i4', 3: '>i2', 5: '>f4', 8: 'i1'}
+
+INDEX_SUFFIX = '.idx.npz'
+
+# Value written for NaN and inf samples in IBM float, which has neither
+NULL_VALUE = -999.25
+
+
+def ibm2ieee(ibm):
+    """
+    Convert IBM 32-bit floats to IEEE floats.
+
+    Parameters
+    ----------
+    ibm : array
+        IBM floats as unsigned 32-bit integers.
+
+    Returns
+    -------
+    data : array
+        float32 values.
+    """
+    ibm = np.asarray(ibm, dtype=np.uint32)
+    sign = np.where(ibm >> 31, -1., 1.)
+    exponent = ((ibm >> 24) & 0x7f).astype(np.int32) - 64
+    fraction = (ibm & 0x00ffffff).astype(np.float64)
+    # value = fraction / 2**24 * 16**exponent
+    data = sign * np.ldexp(fraction, 4 * exponent - 24)
+    return data.astype(np.float32)
+
+
+def ieee2ibm(data, null=None):
+    """
+    Convert IEEE floats to IBM 32-bit floats.
+
+    Parameters
+    ----------
+    data : array
+        float values.
+    null : float
+        value written for NaN and inf, e.g. NULL_VALUE. None to raise.
+
+    Returns
+    -------
+    ibm : array
+        IBM floats as unsigned 32-bit integers.
+
+    Raises
+    ------
+    ValueError
+        if data are not finite and null is None.
+    """
+    data = np.asarray(data, dtype=np.float64)
+    bad = ~np.isfinite(data)
+    if np.any(bad):
+        if null is None:
+            raise ValueError("{} samples are not finite, IBM float has no "
+                             "NaN or inf, give a null value"
+                             .format(np.count_nonzero(bad)))
+        data = np.where(bad, null, data)
+    sign = (data < 0).astype(np.uint32)
+    mant, exp2 = np.frexp(np.abs(data))
+    # value = mant * 2**exp2 = fraction * 16**exp16, 1/16 <= fraction < 1
+    exp16 = (exp2 + 3) // 4
+    fraction = np.round(np.ldexp(mant, exp2 - 4 * exp16 + 24))
+    carry = fraction >= 2 ** 24
+    fraction = np.where(carry, fraction / 16, fraction)
+    exp16 = exp16 + carry
+    fraction = fraction.astype(np.uint32)
+    biased = np.clip(exp16 + 64, 0, 127).astype(np.uint32)
+    ibm = (sign << 31) | (biased << 24) | fraction
+    return np.where(data == 0, 0, ibm).astype(np.uint32)
+
+
+def text_header(lines=()):
+    """
+    Make the 3200-byte EBCDIC textual header.
+
+    Parameters
+    ----------
+    lines : list
+        up to 40 lines of text, 76 characters each.
+
+    Returns
+    -------
+    header : bytes
+    """
+    lines = list(lines)[:40]
+    lines += [''] * (40 - len(lines))
+    text = ''.join('C{:2d} {:<76s}'.format(i + 1, line[:76])
+                   for i, line in enumerate(lines))
+    return text.encode('cp500')
+
+
+class SegyFile(object):
+    """
+    A SEG-Y file with fixed-length traces.
+
+    Parameters
+    ----------
+    path : str
+        file path.
+    mode : str
+        'r' for read only, 'r+' for writing traces in place.
+    iline : int
+        byte location of inline number in the trace header.
+    xline : int
+        byte location of crossline number in the trace header.
+    key : int
+        byte location of the gather key, e.g. incident angle or offset.
+    """
+
+    def __init__(self, path, mode='r', iline=TRC_INLINE, xline=TRC_CROSSLINE,
+                 key=TRC_OFFSET):
+        self.path = path
+        self.byte_locations = (iline, xline, key)
+        with open(path, 'rb') as fp:
+            fp.seek(TEXT_HEADER_SIZE)
+            self.binary_header = fp.read(BINARY_HEADER_SIZE)
+        self.dt = self._binary_field(BIN_DT)
+        self.ns = self._binary_field(BIN_NS)
+        self.format = self._binary_field(BIN_FORMAT)
+        if self.format not in FORMATS:
+            raise ValueError("Unsupported sample format {}".format(
+                self.format))
+        self.trace_dtype = np.dtype([
+            ('header', 'u1', (TRACE_HEADER_SIZE,)),
+            ('data', FORMATS[self.format], (self.ns,)),
+        ])
+        self.traces = np.memmap(path, dtype=self.trace_dtype, mode=mode,
+                                offset=DATA_OFFSET)
+        self._index = None
+
+    def __len__(self):
+        return len(self.traces)
+
+    def _binary_field(self, byte):
+        i = byte - TEXT_HEADER_SIZE - 1
+        return int(np.frombuffer(self.binary_header[i:i + 2], '>i2')[0])
+
+    def header_field(self, byte, size=4, traces=slice(None)):
+        """
+        Read a trace header field of many traces.
+
+        Parameters
+        ----------
+        byte : int
+            byte location, 1-based as in the SEG-Y standard.
+        size : int
+            2 or 4 bytes
+        traces : slice or array
+            trace numbers, 0-based, default all.
+
+        Returns
+        -------
+        values : array
+            int32 values.
+        """
+        raw = self.traces['header'][traces, byte - 1:byte - 1 + size]
+        raw = np.ascontiguousarray(raw)
+        return raw.view('>i%d' % size).ravel().astype(np.int32)
+
+    def index(self):
+        """
+        Trace header index sorted by inline, crossline and key.
+
+        The index is loaded from the cache file if it is up to date,
+        otherwise built from the trace headers and cached.
+
+        Returns
+        -------
+        index : dict
+            'order' trace numbers sorted by inline, crossline, key.
+            'iline', 'xline', 'key' header values of the sorted traces.
+            'start', 'stop' sorted positions of each gather.
+        """
+        if self._index is None:
+            self._index = self._load_index()
+        if self._index is None:
+            self._index = self._build_index()
+            self._save_index(self._index)
+        return self._index
+
+    def _stamp(self):
+        st = os.stat(self.path)
+        return np.array([st.st_size, st.st_mtime_ns] +
+                        list(self.byte_locations), dtype=np.int64)
+
+    def _load_index(self):
+        cache = self.path + INDEX_SUFFIX
+        if not os.path.exists(cache):
+            return None
+        with np.load(cache) as f:
+            if not np.array_equal(f['stamp'], self._stamp()):
+                return None
+            return {k: f[k] for k in f.files if k != 'stamp'}
+
+    def _save_index(self, index):
+        try:
+            np.savez(self.path + INDEX_SUFFIX, stamp=self._stamp(), **index)
+        except OSError:
+            # Read-only location, the index lives in memory only
+            pass
+
+    def _build_index(self):
+        iline, xline, key = self.byte_locations
+        il = self.header_field(iline)
+        xl = self.header_field(xline)
+        ky = self.header_field(key)
+        order = np.lexsort((ky, xl, il))
+        il, xl, ky = il[order], xl[order], ky[order]
+        new = np.ones(len(order), dtype=bool)
+        new[1:] = (il[1:] != il[:-1]) | (xl[1:] != xl[:-1])
+        start = np.flatnonzero(new)
+        stop = np.append(start[1:], len(order))
+        return {'order': order, 'iline': il, 'xline': xl, 'key': ky,
+                'start': start, 'stop': stop}
+
+    def read_traces(self, traces):
+        """
+        Read and decode trace samples.
+
+        Parameters
+        ----------
+        traces : slice or array
+            trace numbers, 0-based.
+
+        Returns
+        -------
+        data : array
+            float32 samples, shape (number of traces, ns).
+        """
+        raw = self.traces['data'][traces]
+        if self.format == 1:
+            return ibm2ieee(raw)
+        return raw.astype(np.float32)
+
+    def write_traces(self, start, data, null=None):
+        """
+        Encode and write samples of consecutive traces in place.
+
+        Parameters
+        ----------
+        start : int
+            first trace number, 0-based.
+        data : array
+            samples, shape (number of traces, ns).
+        null : float
+            value of NaN and inf samples in IBM float, see ieee2ibm().
+            IEEE float keeps them as they are.
+        """
+        data = np.atleast_2d(data)
+        if self.format == 1:
+            data = ieee2ibm(data, null)
+        self.traces['data'][start:start + len(data)] = data
+
+    def iter_gathers(self):
+        """
+        Iterate gathers in inline, crossline order.
+
+        Yields
+        ------
+        iline : int
+            inline number
+        xline : int
+            crossline number
+        keys : array
+            gather keys, e.g. angles, increasing.
+        data : array
+            float32 samples, shape (number of keys, ns).
+        """
+        index = self.index()
+        for i, j in zip(index['start'], index['stop']):
+            traces = np.sort(index['order'][i:j])
+            pos = np.argsort(np.argsort(index['order'][i:j]))
+            data = self.read_traces(traces)[pos]
+            yield (int(index['iline'][i]), int(index['xline'][i]),
+                   index['key'][i:j], data)
+
+    def gather_headers(self):
+        """
+        Trace headers of the first trace of every gather.
+
+        Returns
+        -------
+        headers : array
+            shape (number of gathers, 240) uint8.
+        """
+        index = self.index()
+        return np.array(self.traces['header'][index['order'][index['start']]])
+
+    def flush(self):
+        self.traces.flush()
+
+
+def create_segy(path, headers, ns, dt, fmt=5, text=()):
+    """
+    Create a SEG-Y file to be filled by SegyFile.write_traces().
+
+    Parameters
+    ----------
+    path : str
+        file path.
+    headers : array
+        trace headers, shape (number of traces, 240) uint8.
+        Number of samples and sample interval are overwritten.
+    ns : int
+        number of samples per trace.
+    dt : int
+        sample interval in microseconds.
+    fmt : int
+        sample format code, 1 for IBM float, 5 for IEEE float.
+    text : list
+        lines of the textual header.
+
+    Returns
+    -------
+    segy : SegyFile
+        the file opened in 'r+' mode.
+    """
+    if fmt not in FORMATS:
+        raise ValueError("Unsupported sample format {}".format(fmt))
+    headers = np.array(headers, dtype=np.uint8).reshape(-1, TRACE_HEADER_SIZE)
+    binary = np.zeros(BINARY_HEADER_SIZE, dtype=np.uint8)
+    for byte, value in ((BIN_DT, dt), (BIN_NS, ns), (BIN_FORMAT, fmt),
+                        (BIN_FIXED_LENGTH, 1)):
+        i = byte - TEXT_HEADER_SIZE - 1
+        binary[i:i + 2] = np.array([value], '>i2').view(np.uint8)
+    headers[:, TRC_NS - 1:TRC_NS + 1] = np.array([ns], '>i2').view(np.uint8)
+    headers[:, TRC_DT - 1:TRC_DT + 1] = np.array([dt], '>i2').view(np.uint8)
+
+    trace_dtype = np.dtype([
+        ('header', 'u1', (TRACE_HEADER_SIZE,)),
+        ('data', FORMATS[fmt], (ns,)),
+    ])
+    with open(path, 'wb') as fp:
+        fp.write(text_header(text))
+        fp.write(binary.tobytes())
+        fp.truncate(DATA_OFFSET + trace_dtype.itemsize * len(headers))
+    segy = SegyFile(path, mode='r+')
+    segy.traces['header'] = headers
+    return segy
+
+
+def set_header_field(headers, byte, values, size=4):
+    """
+    Set a field of many trace headers.
+
+    Parameters
+    ----------
+    headers : array
+        trace headers, shape (number of traces, 240) uint8, modified.
+    byte : int
+        byte location, 1-based.
+    values : array
+        one value per trace or a scalar.
+    size : int
+        2 or 4 bytes
+    """
+    values = np.broadcast_to(values, (len(headers),))
+    raw = np.asarray(values, dtype='>i%d' % size).view(np.uint8)
+    headers[:, byte - 1:byte - 1 + size] = raw.reshape(-1, size)
+
+
+def invert_segy(segy, paths, x_ini, angles=None, fmt=5, null=NULL_VALUE,
+                **kwargs):
+    """
+    Invert gathers of a SEG-Y file, write one attribute volume per model
+    parameter.
+
+    Each time sample of a gather is inverted, gathers are streamed one by
+    one, so memory is bounded by the gather size.
+
+    Parameters
+    ----------
+    segy : SegyFile
+        the angle gathers, gather key is the incident angle in degrees.
+    paths : list
+        output file paths, one per model parameter, e.g. r1, r2, r3, r4.
+    x_ini : array
+        initial model, shape (n,).
+    angles : array
+        incident angles of gather traces, default the gather keys.
+    fmt : int
+        sample format code of the outputs.
+    null : float
+        value of the NaN models of muted samples in IBM float outputs,
+        None to raise instead.
+    kwargs : dict
+        arguments of batch.invert_chunk(), e.g. equation, niter.
+
+    Returns
+    -------
+    outputs : list
+        SegyFile of the attribute volumes.
+    """
+    equation = kwargs.get('equation', 'zoeppritz')
+    if len(paths) != NPARAM[equation]:
+        raise ValueError("Need {} output paths".format(NPARAM[equation]))
+    headers = segy.gather_headers()
+    set_header_field(headers, segy.byte_locations[2], 0)
+    outputs = [create_segy(path, headers, segy.ns, segy.dt, fmt=fmt)
+               for path in paths]
+    for i, (il, xl, keys, data) in enumerate(segy.iter_gathers()):
+        gather_angles = keys if angles is None else angles
+        x = invert_chunk(gather_angles, data.T, x_ini, **kwargs)
+        for j, out in enumerate(outputs):
+            out.write_traces(i, x[:, j], null)
+    for out in outputs:
+        out.flush()
+    return outputs
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Long-running modeling and inversion service.
+
+One process keeps the imports, angle grids and other caches warm and
+serves many small requests over a Unix socket or localhost TCP. Modeling
+requests on the same angles and equation that arrive within a short
+window are stacked into one call of modeling.modeling_batch(), see
+aio.AsyncEngine.
+
+A message is a 4-byte big-endian length, a JSON header of that length and
+the raw bytes of the NumPy arrays listed in the header:
+
+    {"op": "modeling", "equation": "zoeppritz", "reflection": "PP",
+     "arrays": [["<f8", [k, 6]], ["<f8", [m]]]}
+
+Replies carry "ok" and either the result arrays or an "error" string.
+Headers longer than MAX_HEADER and payloads larger than MAX_PAYLOAD are
+refused before they are read; the service replies with the error and
+closes the connection, which is out of step after a malformed message.
+Invert requests are batched the same way, and take only the options in
+INVERT_OPTIONS.
+
+Run as python -m zoeppritz.service --unix /tmp/zoeppritz.sock
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import numpy as np
+from zoeppritz.aio import AsyncEngine
+from zoeppritz.batch import NPARAM
+
+LENGTH = '!I'
+LENGTH_SIZE = struct.calcsize(LENGTH)
+
+# Options of an invert request and their JSON types
+INVERT_OPTIONS = {'equation': str, 'niter': int, 'vs_vp_ratio': float,
+                  'tol': float}
+
+# Largest niter of an invert request
+MAX_NITER = 1000
+
+# Largest JSON header and array payload of a message, in bytes
+MAX_HEADER = 1 << 16
+MAX_PAYLOAD = 1 << 30
+
+
+class MessageError(ValueError):
+    """A message header that is malformed or too large."""
+
+
+def encode(header, arrays=()):
+    """
+    Encode a message.
+
+    Parameters
+    ----------
+    header : dict
+        JSON serializable header.
+    arrays : list
+        NumPy arrays of the payload.
+
+    Returns
+    -------
+    buf : bytes
+    """
+    arrays = [np.ascontiguousarray(a) for a in arrays]
+    header = dict(header, arrays=[(a.dtype.str, a.shape) for a in arrays])
+    head = json.dumps(header).encode()
+    parts = [struct.pack(LENGTH, len(head)), head]
+    parts.extend(a.tobytes() for a in arrays)
+    return b''.join(parts)
+
+
+def _is_number(value, kind):
+    """True if value is a JSON number of kind, int or float."""
+    if isinstance(value, bool):
+        return False
+    if kind is int:
+        return isinstance(value, int)
+    return isinstance(value, (int, float)) and np.isfinite(value)
+
+
+def invert_options(kwargs):
+    """
+    Check the options of an invert request.
+
+    Parameters
+    ----------
+    kwargs : dict
+        options from the JSON header, see INVERT_OPTIONS. vs_vp_ratio is
+        a number or a list of numbers, one per gather.
+
+    Returns
+    -------
+    options : dict
+        arguments of aio.AsyncEngine.invert().
+
+    Raises
+    ------
+    TypeError
+        if an option has the wrong type.
+    ValueError
+        if an option is unknown or out of range.
+    """
+    if not isinstance(kwargs, dict):
+        raise TypeError("Options must be an object, not %s" %
+                        type(kwargs).__name__)
+    options = {}
+    for name, value in kwargs.items():
+        kind = INVERT_OPTIONS.get(name)
+        if kind is None:
+            raise ValueError("Unknown option %r" % name)
+        if name == 'vs_vp_ratio' and isinstance(value, list):
+            if not all(_is_number(v, float) for v in value):
+                raise TypeError("Option vs_vp_ratio must be numbers")
+            value = np.array(value, dtype=float)
+        elif kind is str:
+            if not isinstance(value, str):
+                raise TypeError("Option %s must be a string" % name)
+        elif not _is_number(value, kind):
+            raise TypeError("Option %s must be %s" % (name, kind.__name__))
+        options[name] = value
+    if options.get('equation', 'zoeppritz') not in NPARAM:
+        raise ValueError("Unknown equation %r" % options['equation'])
+    if not 0 < options.get('niter', 1) <= MAX_NITER:
+        raise ValueError("niter must be in 1 to %d" % MAX_NITER)
+    if options.get('tol', 0) < 0:
+        raise ValueError("tol must not be negative")
+    if np.any(np.asarray(options.get('vs_vp_ratio', 0.5)) <= 0):
+        raise ValueError("vs_vp_ratio must be positive")
+    return options
+
+
+def _header_length(buf, max_header):
+    n, = struct.unpack(LENGTH, buf)
+    if n > max_header:
+        raise MessageError("Header of %d bytes, at most %d" % (n, max_header))
+    return n
+
+
+def _parse_header(buf, max_payload):
+    """
+    Decode a JSON header and check its array specs.
+
+    Returns
+    -------
+    header : dict
+        without the array specs.
+    specs : list
+        (dtype, shape, size in bytes) of each array.
+
+    Raises
+    ------
+    MessageError
+        if the header is malformed or the payload exceeds max_payload.
+    """
+    try:
+        header = json.loads(buf)
+    except ValueError as e:
+        raise MessageError("Header is not JSON: %s" % e)
+    if not isinstance(header, dict):
+        raise MessageError("Header must be an object, not %s" %
+                           type(header).__name__)
+    specs = []
+    total = 0
+    arrays = header.pop('arrays', [])
+    if not isinstance(arrays, list):
+        raise MessageError("Array specs must be a list")
+    for spec in arrays:
+        try:
+            dtype, shape = spec
+            if not isinstance(dtype, str):
+                raise TypeError("dtype must be a string")
+            dtype = np.dtype(dtype)
+        except (TypeError, ValueError):
+            raise MessageError("Bad array spec %r" % (spec,))
+        if dtype.hasobject:
+            raise MessageError("Object arrays are not accepted")
+        if not isinstance(shape, list) or not all(
+                isinstance(d, int) and not isinstance(d, bool) and d >= 0
+                for d in shape):
+            raise MessageError("Bad array shape %r" % (shape,))
+        size = dtype.itemsize
+        for d in shape:
+            size *= d
+        total += size
+        if total > max_payload:
+            raise MessageError("Payload exceeds %d bytes" % max_payload)
+        specs.append((dtype, tuple(shape), size))
+    return header, specs
+
+
+async def read_message(reader, max_header=MAX_HEADER,
+                       max_payload=MAX_PAYLOAD):
+    """
+    Read a message from an asyncio stream.
+
+    Parameters
+    ----------
+    reader : asyncio.StreamReader
+    max_header : int
+        largest JSON header in bytes.
+    max_payload : int
+        largest total size of the arrays in bytes.
+
+    Returns
+    -------
+    header : dict
+    arrays : list
+
+    Raises
+    ------
+    MessageError
+        if the header is malformed or a size exceeds its limit, before
+        the oversized part is read.
+    """
+    n = _header_length(await reader.readexactly(LENGTH_SIZE), max_header)
+    header, specs = _parse_header(await reader.readexactly(n), max_payload)
+    arrays = []
+    for dtype, shape, size in specs:
+        buf = await reader.readexactly(size)
+        arrays.append(np.frombuffer(buf, dtype).reshape(shape))
+    return header, arrays
+
+
+def recv_message(sock, max_header=MAX_HEADER, max_payload=MAX_PAYLOAD):
+    """
+    Read a message from a blocking socket.
+
+    Parameters are those of read_message().
+
+    Returns
+    -------
+    header : dict
+    arrays : list
+    """
+    n = _header_length(_recv_exactly(sock, LENGTH_SIZE), max_header)
+    header, specs = _parse_header(_recv_exactly(sock, n), max_payload)
+    arrays = []
+    for dtype, shape, size in specs:
+        buf = _recv_exactly(sock, size)
+        arrays.append(np.frombuffer(buf, dtype).reshape(shape))
+    return header, arrays
+
+
+def _recv_exactly(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    pos = 0
+    while pos < n:
+        got = sock.recv_into(view[pos:])
+        if got == 0:
+            raise ConnectionError("Connection closed")
+        pos += got
+    return bytes(buf)
+
+
+class Service(object):
+    """
+    Modeling and inversion server.
+
+    Parameters
+    ----------
+    window : float
+        seconds to wait for more modeling requests to batch together.
+    max_batch : int
+        number of models that triggers a batch before the window ends.
+    executor : concurrent.futures.Executor
+        runs the computation, the event loop default if None.
+    max_header, max_payload : int
+        limits of a request in bytes, see read_message().
+
+    Attributes
+    ----------
+    stats : dict
+        number of modeling requests and of batches computed.
+    """
+
+    def __init__(self, window=0.002, max_batch=4096, executor=None,
+                 max_header=MAX_HEADER, max_payload=MAX_PAYLOAD):
+        self.executor = executor
+        self.max_header = max_header
+        self.max_payload = max_payload
+        self.engine = AsyncEngine(executor, window, max_batch)
+        self.stats = self.engine.modeler.stats
+
+    async def start(self, path=None, host='127.0.0.1', port=0):
+        """
+        Start serving on a Unix socket path, or on host and port.
+
+        Returns
+        -------
+        server : asyncio.Server
+        """
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        """
+        Serve requests of a connection until the client closes it.
+
+        A malformed message gets an error reply and closes the
+        connection.
+        """
+        try:
+            while True:
+                try:
+                    header, arrays = await read_message(
+                        reader, self.max_header, self.max_payload)
+                except asyncio.IncompleteReadError:
+                    break
+                except MessageError as e:
+                    reply = {'ok': False,
+                             'error': '%s: %s' % (type(e).__name__, e)}
+                    writer.write(encode(reply))
+                    await writer.drain()
+                    break
+                try:
+                    out = await self.dispatch(header, arrays)
+                    reply = {'ok': True}
+                except Exception as e:
+                    out = ()
+                    reply = {'ok': False,
+                             'error': '%s: %s' % (type(e).__name__, e)}
+                writer.write(encode(reply, out))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def dispatch(self, header, arrays):
+        """
+        Run a request.
+
+        Returns
+        -------
+        out : list
+            result arrays.
+        """
+        op = header.get('op')
+        if op == 'ping':
+            return ()
+        elif op == 'modeling':
+            models, angles = arrays
+            return await self.engine.modeling_batch(
+                models, angles, header['equation'], header['reflection'])
+        elif op == 'invert':
+            angles, rpp, x_ini = arrays[:3]
+            rps = arrays[3] if len(arrays) > 3 else None
+            options = invert_options(header.get('kwargs', {}))
+            x = await self.engine.invert(angles, rpp, x_ini, rps=rps,
+                                         **options)
+            return (x,)
+        else:
+            raise NotImplementedError("Unknown op %r" % op)
+
+
+class Client(object):
+    """
+    Blocking client of the service.
+
+    Parameters
+    ----------
+    address : str or tuple
+        Unix socket path, or (host, port).
+    timeout : float
+        socket timeout in seconds, None to block.
+    """
+
+    def __init__(self, address, timeout=None):
+        family = socket.AF_UNIX if isinstance(address, str) \
+            else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+
+    def request(self, header, arrays=()):
+        """
+        Send a request and wait for the reply.
+
+        Returns
+        -------
+        out : list
+            result arrays.
+        """
+        self.sock.sendall(encode(header, arrays))
+        reply, out = recv_message(self.sock)
+        if not reply.get('ok'):
+            raise RuntimeError(reply.get('error'))
+        return out
+
+    def modeling(self, models, angles, equation, reflection):
+        """
+        Model reflection coefficients, see modeling.modeling_batch().
+        """
+        header = {'op': 'modeling', 'equation': equation,
+                  'reflection': reflection}
+        models = np.atleast_2d(np.asarray(models, dtype=float))
+        angles = np.asarray(angles, dtype=float)
+        amp, pha = self.request(header, (models, angles))
+        return amp, pha
+
+    def invert(self, angles, rpp, x_ini, rps=None, **kwargs):
+        """
+        Invert gathers, see batch.invert_chunk().
+
+        Keyword arguments are sent in the JSON header, only those of
+        INVERT_OPTIONS are accepted. A vs_vp_ratio per gather should be a
+        list.
+        """
+        arrays = [np.asarray(angles, dtype=float),
+                  np.atleast_2d(np.asarray(rpp, dtype=float)),
+                  np.asarray(x_ini, dtype=float)]
+        if rps is not None:
+            arrays.append(np.atleast_2d(np.asarray(rps, dtype=float)))
+        x, = self.request({'op': 'invert', 'kwargs': kwargs}, arrays)
+        return x
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def serve(path=None, host='127.0.0.1', port=0, window=0.002):
+    """
+    Run the service until interrupted.
+    """
+    async def run():
+        server = await Service(window).start(path, host, port)
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--unix', help="Unix socket path")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--window', type=float, default=0.002,
+                        help="batching window in seconds")
+    args = parser.parse_args()
+    try:
+        serve(args.unix, args.host, args.port, args.window)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import time
+import asyncio
+import unittest
+import numpy as np
+from zoeppritz.modeling import modeling, modeling_batch
+from zoeppritz.batch import invert_chunk
+from zoeppritz.aio import AsyncEngine, Coalescer
+
+
+class Test(unittest.TestCase):
+    def test_modeling(self):
+        models = [(3.0, 1.5, 2.3, 3.3 + 0.1 * i, 1.7, 2.4) for i in range(8)]
+        engine = AsyncEngine(window=0.05)
+
+        async def run():
+            return await asyncio.gather(*(
+                engine.modeling(m, '0-40(5)', 'zoeppritz', 'PP')
+                for m in models))
+
+        results = asyncio.run(run())
+        for model, rc in zip(models, results):
+            np.testing.assert_allclose(
+                rc, modeling(model, '0-40(5)', 'zoeppritz', 'PP'))
+        self.assertEqual(engine.modeler.stats, {'requests': 8, 'batches': 1})
+
+    def test_invert(self):
+        angles = np.arange(0, 40, 4.)
+        amp, pha = modeling_batch([(3.0, 1.5, 2.3, 3.3, 1.7, 2.4)], angles,
+                                  'quadratic', 'PP')
+        rpp = amp * np.linspace(0.8, 1.2, 4)[:, None]
+        kwargs = dict(equation='quadratic', niter=5)
+        engine = AsyncEngine(window=0.05)
+
+        async def run():
+            return await asyncio.gather(*(
+                engine.invert(angles, r, (0., 0., 0.), **kwargs)
+                for r in rpp))
+
+        x = np.concatenate(asyncio.run(run()))
+        np.testing.assert_allclose(
+            x, invert_chunk(angles, rpp, (0., 0., 0.), **kwargs))
+        self.assertEqual(engine.inverter.stats['batches'], 1)
+
+    def test_cancel(self):
+        calls = []
+
+        def func(rows):
+            calls.append(len(rows))
+            time.sleep(0.2)
+            return rows * 2
+
+        async def run():
+            coalescer = Coalescer(func, window=0.05)
+            first = asyncio.ensure_future(
+                coalescer.submit((), np.ones((2, 3))))
+            second = asyncio.ensure_future(
+                coalescer.submit((), np.ones((1, 3))))
+            await asyncio.sleep(0)
+            first.cancel()
+            result = await second
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(
+                    coalescer.submit((), np.ones((1, 3))), 0.1)
+            return result
+
+        np.testing.assert_array_equal(asyncio.run(run()), [[2, 2, 2]])
+        self.assertEqual(calls[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2ratio
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.modcer import rpp_cer1977, rps_cer1977
+from zoeppritz.gracer import gradient, jacobian
+
+
+class Test(unittest.TestCase):
+    def test_forward(self):
+        # Two half spaces elastic model
+        vp1, vp2 = 4.0, 2.0
+        vs1, vs2 = 2.0, 1.0
+        ro1, ro2 = 2.4, 2.0
+        r1, r2, r3, r4 = elapar_hs2ratio(vp1, vs1, ro1, vp2, vs2, ro2)
+
+        angles = np.arange(0, 80, 5)
+        grid = AngleGrid(angles)
+        for amp_type in ('real', 'abs'):
+            amp, pha = rpp_cer1977(r1, r2, r3, r4, grid, amp_type=amp_type)
+            ps_amp, ps_pha = rps_cer1977(r1, r2, r3, r4, grid,
+                                         amp_type=amp_type)
+            for i, angle in enumerate(angles):
+                a, p = rpp_cer1977(r1, r2, r3, r4, angle, amp_type=amp_type)
+                self.assertAlmostEqual(amp[i], a, places=12)
+                self.assertAlmostEqual(pha[i], p, places=9)
+                a, p = rps_cer1977(r1, r2, r3, r4, angle, amp_type=amp_type)
+                self.assertAlmostEqual(ps_amp[i], a, places=12)
+                self.assertAlmostEqual(ps_pha[i], p, places=9)
+
+    def test_broadcast(self):
+        # A batch of models of shape (k, 1) against m angles
+        r1 = np.array([[0.5], [0.8], [1.2]])
+        r2, r3, r4 = 0.5, 0.25, 0.8
+        grid = AngleGrid(np.arange(1, 40, 3))
+        amp, _ = rpp_cer1977(r1, r2, r3, r4, grid)
+        self.assertEqual(amp.shape, (3, len(grid)))
+        for k in range(3):
+            a, _ = rpp_cer1977(r1[k, 0], r2, r3, r4, grid)
+            np.testing.assert_allclose(amp[k], a)
+
+    def test_jacobian(self):
+        vp1, vp2 = 5.72, 2.87
+        vs1, vs2 = 2.93, 1.61
+        ro1, ro2 = 2.86, 2.14
+        r1, r2, r3, r4 = elapar_hs2ratio(vp1, vs1, ro1, vp2, vs2, ro2)
+
+        angles = np.arange(1, 60, 6)
+        grid = AngleGrid(angles)
+        for mode in ('PP', 'PS'):
+            for method in ('numeric', 'analytic'):
+                jac = jacobian(r1, r2, r3, r4, grid, mode, method=method)
+                self.assertEqual(jac.shape, (len(angles), 4))
+                for i, angle in enumerate(angles):
+                    for j in range(4):
+                        g = gradient(r1, r2, r3, r4, angle, mode, j + 1,
+                                     method=method)
+                        self.assertAlmostEqual(jac[i, j], g, places=9)
+
+    def test_grid(self):
+        grid = AngleGrid([0, 30, 90], vp1=2.)
+        np.testing.assert_allclose(grid.sin1, [0, 0.5, 1], atol=1e-15)
+        np.testing.assert_allclose(grid.p, [0, 0.25, 0.5], atol=1e-15)
+        np.testing.assert_allclose(grid.sin2, np.sin(2 * grid.radians))
+        with self.assertRaises(ValueError):
+            rpp_cer1977(0.5, 0.5, 0.25, 1., grid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from zoeppritz.modavo import avo_modeling
+from zoeppritz.dataio import open_gathers, save_gathers
+from zoeppritz.attributes import avo_attributes, run_attributes
+
+
+class Test(unittest.TestCase):
+    def test_attributes(self):
+        angles = np.array([5., 15., 25., 35.])
+        rng = np.random.default_rng(1)
+        igc = rng.normal(0, 0.1, (4, 3, 5, 3))
+        rpp = avo_modeling('shuey3', 0.5, igc, angles)
+        stacks = [np.ascontiguousarray(rpp[..., i]) for i in range(4)]
+        outs = [np.zeros((4, 3, 5)) for i in range(3)]
+        nchunk = avo_attributes(stacks, outs, angles, chunk_size=3)
+        self.assertEqual(nchunk, 2)
+        for i in range(3):
+            np.testing.assert_allclose(outs[i], igc[..., i], atol=1e-12)
+        with self.assertRaises(ValueError):
+            avo_attributes(stacks, outs, angles, method='shuey2')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            stack_paths = [os.path.join(tmp, 'stack%d.bin' % i)
+                           for i in range(4)]
+            out_paths = [os.path.join(tmp, name + '.npy')
+                         for name in ('intercept', 'gradient')]
+            for path, stack in zip(stack_paths, stacks):
+                save_gathers(path, stack.astype('<f4'))
+            run_attributes(stack_paths, out_paths, angles, method='shuey2',
+                           chunk_size=2)
+            intercept = open_gathers(out_paths[0])
+            self.assertEqual(intercept.dtype, np.float32)
+            self.assertEqual(intercept.shape, (4, 3, 5))
+            # Two terms fit the curvature of the small angles only
+            np.testing.assert_allclose(intercept, igc[..., 0], atol=0.02)
+            del intercept
+
+
+if __name__ == '__main__':
+    unittest.main()
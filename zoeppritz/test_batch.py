@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modwan import wang1999
+from zoeppritz.modeling import modeling_batch
+from zoeppritz.batch import invert_chunk, run_batch, run_parallel, \
+    run_threaded, model_threaded, autotune_tile, autotune_invert_tile, \
+    TILE_CANDIDATES
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.angles = np.arange(0, 40, 4)
+        ro_rd, vp_rd, vs_rd, self.ratio = elapar_hs2delta(
+            3.0, 1.5, 2.3, 3.3, 1.7, 2.4)
+        rpp = wang1999(self.ratio, ro_rd, vp_rd, vs_rd,
+                       inc2ave_angle(self.angles, vp_rd))
+        self.gathers = rpp * np.linspace(0.8, 1.2, 23)[:, None]
+
+    def test_parallel(self):
+        kwargs = dict(equation='quadratic', niter=5)
+        expect = np.zeros((23, 3))
+        run_batch(self.gathers, expect, self.angles, (0., 0., 0.),
+                  vs_vp_ratio=self.ratio, **kwargs)
+
+        out = run_parallel(self.gathers, self.angles, (0., 0., 0.), nproc=2,
+                           chunk_size=5, vs_vp_ratio=self.ratio, **kwargs)
+        np.testing.assert_array_equal(out, expect)
+
+        # Per-gather initial models and ratios, into a given output
+        out = np.zeros((23, 3))
+        run_parallel(self.gathers, self.angles, np.zeros((23, 3)), nproc=2,
+                     chunk_size=4, out=out,
+                     vs_vp_ratio=np.full(23, self.ratio), **kwargs)
+        np.testing.assert_array_equal(out, expect)
+
+    def test_threaded(self):
+        kwargs = dict(equation='quadratic', niter=5, vs_vp_ratio=self.ratio)
+        expect = np.zeros((23, 3))
+        run_batch(self.gathers, expect, self.angles, (0., 0., 0.), **kwargs)
+        out = np.zeros((23, 3))
+        run_threaded(self.gathers, out, self.angles, (0., 0., 0.),
+                     nthread=3, **kwargs)
+        np.testing.assert_array_equal(out, expect)
+        out = np.zeros((23, 3))
+        run_threaded(self.gathers, out, self.angles, (0., 0., 0.),
+                     nthread=3, chunk_size=5, **kwargs)
+        np.testing.assert_array_equal(out, expect)
+        self.assertIn(autotune_invert_tile(len(self.angles)),
+                      TILE_CANDIDATES)
+
+        models = np.array([3.0, 1.5, 2.3, 3.3, 1.7, 2.4]) * \
+            np.linspace(0.9, 1.1, 50)[:, None]
+        amp, pha = model_threaded(models, self.angles, 'zoeppritz', 'PP',
+                                  nthread=3, tile=8)
+        expect = modeling_batch(models, self.angles, 'zoeppritz', 'PP')
+        np.testing.assert_array_equal(amp, expect[0])
+        np.testing.assert_array_equal(pha, expect[1])
+        self.assertIn(autotune_tile(len(self.angles)), TILE_CANDIDATES)
+
+    def test_float32(self):
+        kwargs = dict(equation='quadratic', niter=5, vs_vp_ratio=self.ratio)
+        x64 = invert_chunk(self.angles, self.gathers, (0., 0., 0.), **kwargs)
+        x32 = invert_chunk(self.angles, self.gathers, (0., 0., 0.),
+                           dtype=np.float32, **kwargs)
+        self.assertEqual(x32.dtype, np.float64)
+        np.testing.assert_allclose(x32, x64, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
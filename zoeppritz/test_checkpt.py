@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modwan import wang1999
+from zoeppritz.checkpt import Checkpoint
+from zoeppritz.batch import run_batch
+
+
+class Test(unittest.TestCase):
+    def test_resume(self):
+        angles = np.arange(0, 40, 4)
+        ro_rd, vp_rd, vs_rd, ratio = elapar_hs2delta(
+            3.0, 1.5, 2.3, 3.3, 1.7, 2.4)
+        rpp = wang1999(ratio, ro_rd, vp_rd, vs_rd,
+                       inc2ave_angle(angles, vp_rd))
+        gathers = rpp * np.linspace(0.8, 1.2, 10)[:, None]
+        kwargs = dict(equation='quadratic', niter=20, vs_vp_ratio=ratio,
+                      chunk_size=3)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            full = os.path.join(tmp, 'full.ckp')
+            out1 = np.zeros((10, 3))
+            stats = run_batch(gathers, out1, angles, (0., 0., 0.),
+                              checkpoint=full, checkpoint_every=2, **kwargs)
+            self.assertEqual((stats['chunks'], stats['skipped']), (4, 0))
+            self.assertGreater(stats['checkpoint_time'], 0)
+            records = Checkpoint(full).records
+            self.assertEqual(len(records), 4)
+            # The iterations reached, not those requested
+            nit = np.concatenate([r[2] for r in records])
+            self.assertTrue((nit > 0).all() and (nit < 20).all())
+
+            # A run preempted after two chunks, in the middle of a write
+            part = os.path.join(tmp, 'part.ckp')
+            with open(full, 'rb') as fp:
+                buf = fp.read()
+            # header, 3x3 models, 3 iterations, crc
+            record_size = 28 + 3 * 3 * 8 + 3 * 8 + 4
+            # the job header is before 3 chunks of 3 gathers and one of 1
+            job_size = len(buf) - 3 * record_size - (28 + 3 * 8 + 8 + 4)
+            with open(part, 'wb') as fp:
+                fp.write(buf[:job_size + 2 * record_size + 50])
+            ckpt = Checkpoint(part)
+            self.assertEqual(ckpt.done(), {(0, 3), (3, 6)})
+            self.assertEqual(os.path.getsize(part),
+                             job_size + 2 * record_size)
+
+            # A resume of another job does not mix results
+            for other in (dict(chunk_size=4), dict(equation='linear'),
+                          dict(niter=10), dict(tol=1e-6),
+                          dict(dtype=np.float32), dict(vs_vp_ratio=0.45),
+                          dict(vs_vp_ratio=np.full(10, ratio))):
+                with self.assertRaises(ValueError):
+                    run_batch(gathers, np.zeros((10, 3)), angles,
+                              (0., 0., 0.), checkpoint=part,
+                              **dict(kwargs, **other))
+            with self.assertRaises(ValueError):
+                run_batch(gathers, np.zeros((10, 3)), angles + 1.,
+                          (0., 0., 0.), checkpoint=part, **kwargs)
+            with self.assertRaises(ValueError):
+                run_batch(gathers, np.zeros((10, 3)), angles,
+                          (0., 0.01, 0.), checkpoint=part, **kwargs)
+            with self.assertRaises(ValueError):
+                run_batch(gathers[:9], np.zeros((9, 3)), angles,
+                          (0., 0., 0.), checkpoint=part, **kwargs)
+            self.assertEqual(os.path.getsize(part),
+                             job_size + 2 * record_size)
+
+            # Defaults given explicitly are the same job
+            out2 = np.zeros((10, 3))
+            stats = run_batch(gathers, out2, angles, [0, 0, 0],
+                              checkpoint=part, tol=1e-10,
+                              dtype=np.float64, **kwargs)
+            self.assertEqual((stats['chunks'], stats['skipped']), (2, 2))
+            np.testing.assert_array_equal(out1, out2)
+            self.assertEqual(Checkpoint(part).done(),
+                             Checkpoint(full).done())
+
+
+if __name__ == '__main__':
+    unittest.main()
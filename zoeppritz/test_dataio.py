@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modwan import wang1999
+from zoeppritz.dataio import open_gathers, create_volume, save_gathers, \
+    iter_chunks
+from zoeppritz.batch import run_batch, invert_chunk
+
+
+class Test(unittest.TestCase):
+    def test_roundtrip(self):
+        arr = np.arange(60, dtype='<f4').reshape(10, 6)
+        with tempfile.TemporaryDirectory() as tmp:
+            for name in ('gathers.bin', 'gathers.npy'):
+                path = os.path.join(tmp, name)
+                save_gathers(path, arr)
+                mm = open_gathers(path)
+                self.assertEqual(mm.shape, arr.shape)
+                self.assertEqual(mm.dtype, arr.dtype)
+                np.testing.assert_array_equal(mm, arr)
+                chunks = [(i, j) for i, j, c in iter_chunks(mm, 4)]
+                self.assertEqual(chunks, [(0, 4), (4, 8), (8, 10)])
+                del mm
+
+            path = os.path.join(tmp, 'bad.bin')
+            with open(path, 'wb') as fp:
+                fp.write(b'\0' * 256)
+            with self.assertRaises(ValueError):
+                open_gathers(path)
+
+    def test_run_batch(self):
+        # Gathers of Wang 1999 amplitudes from perturbed models
+        vp1, vp2 = 3.0, 3.3
+        vs1, vs2 = 1.5, 1.7
+        ro1, ro2 = 2.3, 2.4
+        angles = np.arange(0, 40, 4)
+        scales = np.linspace(0.5, 1.5, 7)
+        models, rpp, ratios = [], [], []
+        for s in scales:
+            ro_rd, vp_rd, vs_rd, ratio = elapar_hs2delta(
+                vp1, vs1, ro1, vp1 + (vp2 - vp1) * s, vs2, ro2)
+            ave_angles = inc2ave_angle(angles, vp_rd)
+            rpp.append(wang1999(ratio, ro_rd, vp_rd, vs_rd, ave_angles))
+            models.append((ro_rd, vp_rd, vs_rd))
+            ratios.append(ratio)
+        rpp = np.array(rpp)
+        models = np.array(models)
+        ratios = np.array(ratios)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'rpp.bin')
+            save_gathers(path, rpp)
+            gathers = open_gathers(path)
+            out = create_volume(os.path.join(tmp, 'model.npy'), (7, 3))
+            run_batch(gathers, out, angles, (0., 0., 0.), chunk_size=3,
+                      equation='quadratic', niter=10, vs_vp_ratio=ratios)
+            np.testing.assert_allclose(out, models, atol=1e-3)
+            del gathers, out
+
+        x = invert_chunk(angles, rpp[:2], (0., 0., 0.), equation='linear',
+                         vs_vp_ratio=ratio)
+        self.assertEqual(x.shape, (2, 3))
+        with self.assertRaises(NotImplementedError):
+            invert_chunk(angles, rpp, (0., 0., 0.), equation='cubic')
+
+
+if __name__ == '__main__':
+    unittest.main()
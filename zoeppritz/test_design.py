@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+from itertools import combinations
+import numpy as np
+from zoeppritz.utils import elapar_hs2ratio
+from zoeppritz.design import angle_rows, log_det_information, select_angles
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.model = np.array(elapar_hs2ratio(3.0, 1.5, 2.3, 3.3, 1.7, 2.4))
+        self.angles = np.arange(1, 60, 5.)
+
+    def test_updates(self):
+        # The updated log det is that of the selected angles
+        models = self.model * np.array([[1.], [1.02], [0.98]])
+        for rps in (False, True):
+            index, log_det = select_angles(self.angles, models, 6, rps=rps,
+                                           ridge=1e-12)
+            self.assertEqual(len(set(index)), 6)
+            for i in range(6):
+                expect = log_det_information(self.angles[index[:i + 1]],
+                                             models, rps)
+                if (i + 1) * (1 + rps) < 4:
+                    self.assertEqual(log_det[i], -np.inf)
+                else:
+                    self.assertAlmostEqual(log_det[i], expect, places=8)
+            full = log_det[np.isfinite(log_det)]
+            self.assertTrue(np.all(np.diff(full) > 0))
+
+    def test_ridge(self):
+        # The ridge is negligible on a fine candidate grid
+        angles = np.arange(1, 60, 1.)
+        index, log_det = select_angles(angles, self.model, 8)
+        for ridge in (1e-6, 1e-12):
+            other, _ = select_angles(angles, self.model, 8, ridge=ridge)
+            np.testing.assert_array_equal(other, index)
+        self.assertAlmostEqual(
+            log_det[-1], log_det_information(angles[index], self.model),
+            places=8)
+
+    def test_greedy(self):
+        # Greedy finds the best subset of 5 of 12 angles
+        index, log_det = select_angles(self.angles, self.model, 5)
+        rows = angle_rows(self.angles, self.model)[0, :, 0]
+        log_dets = {c: np.linalg.slogdet(rows[list(c)].T @ rows[list(c)])[1]
+                    for c in combinations(range(12), 5)}
+        best = max(log_dets, key=log_dets.get)
+        self.assertEqual(tuple(sorted(index)), best)
+        self.assertAlmostEqual(log_det[-1], log_dets[best])
+        uniform = log_det_information(self.angles[::3][:5], self.model)
+        self.assertGreater(log_det[-1], uniform)
+        with self.assertRaises(ValueError):
+            select_angles(self.angles, self.model, 13)
+
+
+if __name__ == '__main__':
+    unittest.main()
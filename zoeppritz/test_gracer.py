@@ -2,8 +2,10 @@
 # Copyright (c) Ezcad Development Team. All Rights Reserved.
 
 import unittest
+import numpy as np
 from zoeppritz.utils import elapar_hs2ratio
-from zoeppritz.gracer import gradient
+from zoeppritz.modcer import rpp_cer1977
+from zoeppritz.gracer import gradient, jacobian
 
 
 class Test(unittest.TestCase):
@@ -160,6 +162,27 @@ class Test(unittest.TestCase):
         res = fr_ana - fr_num
         print(r1, r2, r3, r4, angle, mode, rid, fr_ana, fr_num, abs(res))
 
+    def test_jacobian_scalar(self):
+        # A scalar angle is in degrees, as for an array of angles
+        r = np.array([0.9, 0.45, 0.4, 1.1])
+        angle = 30.
+        h = 1e-6
+        expect = [(rpp_cer1977(*(r + h * e), angle)[0] -
+                   rpp_cer1977(*(r - h * e), angle)[0]) / (2 * h)
+                  for e in np.eye(4)]
+        np.testing.assert_allclose(expect, [0.695, 0.451, -0.442, 0.362],
+                                   atol=1e-3)
+        for method in ('numeric', 'analytic'):
+            jac = jacobian(*r, angle, 'PP', method=method, delta=1e-7)
+            self.assertEqual(jac.shape, (4,))
+            np.testing.assert_allclose(jac, expect, atol=1e-5)
+            np.testing.assert_allclose(
+                jac, jacobian(*r, [angle], 'PP', method=method,
+                              delta=1e-7)[0])
+        out = np.zeros(4)
+        jacobian(*r, angle, 'PP', out=out, delta=1e-7)
+        np.testing.assert_allclose(out, expect, atol=1e-5)
+
 
 if __name__ == '__main__':
     unittest.main()
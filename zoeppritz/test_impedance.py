@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.modaki import aki1980
+from zoeppritz.dataio import save_gathers, open_gathers
+from zoeppritz.impedance import background, elastic_impedance, \
+    extended_elastic_impedance, impedance_volumes
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        self.vp = rng.uniform(2.5, 3.5, (6, 4))
+        self.vs = self.vp * rng.uniform(0.45, 0.55, (6, 4))
+        self.ro = rng.uniform(2.1, 2.5, (6, 4))
+
+    def test_ei(self):
+        vp, vs, ro = self.vp, self.vs, self.ro
+        np.testing.assert_allclose(elastic_impedance(vp, vs, ro, 0.),
+                                   vp * ro)
+        np.testing.assert_allclose(extended_elastic_impedance(vp, vs, ro, 0.),
+                                   vp * ro)
+
+        # The sweep equals angle by angle
+        chi = np.linspace(-90, 90, 7)
+        sweep = extended_elastic_impedance(vp, vs, ro, chi, 0.5)
+        self.assertEqual(sweep.shape, (7, 6, 4))
+        for i in range(7):
+            np.testing.assert_allclose(
+                sweep[i], extended_elastic_impedance(vp, vs, ro, chi[i], 0.5))
+
+        # Half the log difference of EI is the Aki-Richards Rpp at the
+        # incident angle, for a small contrast
+        vp1, vs1, ro1, vp2, vs2, ro2 = 3.0, 1.5, 2.3, 3.03, 1.52, 2.31
+        ro_rd, vp_rd, vs_rd, ratio = \
+            elapar_hs2delta(vp1, vs1, ro1, vp2, vs2, ro2)
+        angles = np.arange(0, 40, 5.)
+        ei1, ei2 = elastic_impedance(np.array([vp1, vp2]),
+                                     np.array([vs1, vs2]),
+                                     np.array([ro1, ro2]), angles, ratio).T
+        rpp = aki1980(ratio, ro_rd, vp_rd, vs_rd, angles)
+        np.testing.assert_allclose(0.5 * np.log(ei2 / ei1), rpp, atol=1e-5)
+
+    def test_volumes(self):
+        vp, vs, ro = self.vp, self.vs, self.ro
+        chi = np.array([-30., 0., 45.])
+        outs = [np.zeros_like(vp) for i in range(3)]
+        nchunk = impedance_volumes(vp, vs, ro, outs, chi=chi, chunk_size=4)
+        self.assertEqual(nchunk, 2)
+        np.testing.assert_allclose(
+            outs, extended_elastic_impedance(vp, vs, ro, chi))
+        with self.assertRaises(ValueError):
+            impedance_volumes(vp, vs, ro, outs)
+
+        # The background of memmaps is accumulated chunk by chunk
+        vp = vp.copy()
+        vp[2, 1] = np.nan
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name + '.bin')
+                     for name in ('vp', 'vs', 'ro')]
+            for path, x in zip(paths, (vp, vs, ro)):
+                save_gathers(path, x)
+            volumes = [open_gathers(path) for path in paths]
+            np.testing.assert_allclose(
+                background(*volumes, chunk_size=4),
+                [np.nanmean(x) for x in (vp, vs, ro)])
+            del volumes
+        with self.assertRaises(ValueError):
+            impedance_volumes(vp, vs, ro, outs, angles=[10., 20.])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta, elapar_hs2ratio
+from zoeppritz.modeling import modeling
+from zoeppritz.interfaces import Interface, Interfaces, INTERFACE_DTYPE
+
+
+class Test(unittest.TestCase):
+    def test_interfaces(self):
+        self.assertEqual(INTERFACE_DTYPE.itemsize, 48)
+        models = np.array([(3.0, 1.5, 2.3, 3.3 + 0.1 * i, 1.7, 2.4)
+                           for i in range(5)])
+        interfaces = Interfaces.from_models(models)
+        self.assertTrue(np.shares_memory(interfaces.data, models))
+        self.assertTrue(np.shares_memory(interfaces.vp2, models))
+        self.assertIs(interfaces.models.base, models)
+
+        r1, r2, r3, r4 = interfaces.ratio()
+        ro_rd, vp_rd, vs_rd, ratio = interfaces.delta()
+        for i in range(5):
+            one = interfaces[i]
+            self.assertIsInstance(one, Interface)
+            self.assertFalse(hasattr(one, '__dict__'))
+            self.assertEqual(one.ratio(), elapar_hs2ratio(*models[i]))
+            np.testing.assert_allclose(
+                (r1[i], r2[i], r3[i], r4[i]), elapar_hs2ratio(*models[i]))
+            np.testing.assert_allclose(
+                (ro_rd[i], vp_rd[i], vs_rd[i], ratio[i]),
+                elapar_hs2delta(*models[i]))
+
+        amp, pha = interfaces[1:3].modeling(np.arange(0, 30, 5.),
+                                            'zoeppritz', 'PP')
+        rc = modeling(tuple(interfaces[2]), '0-30(5)', 'zoeppritz', 'PP')
+        np.testing.assert_allclose(amp[1], rc[:, 1])
+
+        vp = np.array([3.0, 3.3, 3.1])
+        logs = Interfaces.from_logs(vp, vp / 2, vp * 0 + 2.3)
+        np.testing.assert_array_equal(logs.vp1, vp[:-1])
+        np.testing.assert_array_equal(logs.vs2, vp[1:] / 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2ratio
+from zoeppritz.inv4d import Baseline
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        vp2 = np.array([3.3, 3.4, 3.2])
+        self.base = np.stack(np.broadcast_arrays(
+            *elapar_hs2ratio(3.0, 1.5, 2.3, vp2, 1.7, 2.4)), axis=-1)
+        # Fluid substitution lowers Vp and density, Vs hardly changes
+        self.monitor = np.stack(np.broadcast_arrays(
+            *elapar_hs2ratio(3.0, 1.5, 2.3, vp2 * 0.98, 1.705, 2.38)),
+            axis=-1)
+        self.angles = np.arange(1, 40, 3.)
+
+    def test_invert(self):
+        for rps in (False, True):
+            baseline = Baseline(self.angles, self.base, rps=rps)
+            d_mon = baseline.forward(self.monitor)
+            x = baseline.invert(d_mon, niter=10)
+            np.testing.assert_allclose(x, self.monitor, atol=1e-7)
+
+            # A common error of both vintages cancels
+            error = 0.01 * np.cos(np.radians(
+                np.tile(self.angles, 2 if rps else 1)))
+            d_base = baseline.data + error
+            x = baseline.invert(d_mon + error, d_base, niter=10)
+            np.testing.assert_allclose(x, self.monitor, atol=1e-7)
+        # One step is close with PS, whose data constrain r2
+        x1 = baseline.invert(d_mon + error, d_base)
+        np.testing.assert_allclose(x1, self.monitor, atol=3e-3)
+
+    def test_muted(self):
+        # Muted far angles do not pull the change toward zero
+        for rps in (False, True):
+            baseline = Baseline(self.angles, self.base, rps=rps)
+            d_mon = baseline.forward(self.monitor)
+            d_mon[1, 10:13] = np.nan
+            d_mon[2, 12] = np.nan
+            x = baseline.invert(d_mon, niter=10)
+            np.testing.assert_allclose(x, self.monitor, atol=1e-7)
+            d_base = baseline.data.copy()
+            d_base[0, 11] = np.nan
+            x = baseline.invert(d_mon, d_base, niter=10)
+            np.testing.assert_allclose(x, self.monitor, atol=1e-7)
+
+    def test_save(self):
+        baseline = Baseline(self.angles, self.base, rps=True)
+        d_mon = baseline.forward(self.monitor)
+        d_mon[1, 3] = np.nan
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.npz')
+            baseline.save(path)
+            loaded = Baseline.load(path)
+        self.assertTrue(loaded.rps)
+        np.testing.assert_array_equal(loaded.pinv, baseline.pinv)
+        np.testing.assert_array_equal(loaded.invert(d_mon, niter=2),
+                                      baseline.invert(d_mon, niter=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,7 +5,7 @@ import unittest
 import numpy as np
 from zoeppritz.utils import elapar_hs2ratio
 from zoeppritz.modcer import rpp_cer1977, rps_cer1977
-from zoeppritz.invcer import cer1itr
+from zoeppritz.invcer import cer1itr, cer1inv, cer1inv_coarse
 
 
 class Test(unittest.TestCase):
@@ -141,6 +141,26 @@ class Test(unittest.TestCase):
         self.assertLessEqual(0.25932287 - x_new[2], 0.001)
         self.assertLessEqual(0.76031868 - x_new[3], 0.001)
 
+    def test_coarse(self):
+        r1, r2, r3, r4 = elapar_hs2ratio(4.0, 2.0, 2.4, 2.0, 1.0, 2.0)
+        angles = np.arange(1, 60, 1)
+        rpp = np.array([rpp_cer1977(r1, r2, r3, r4, a)[0] for a in angles])
+        x_ini = (2.4 / 4.0, 2.2 / 4.0, 1.3 / 4.0, 1.6 / 2.4)
+
+        x_full, nit = cer1inv(angles, rpp, x_ini, niter=20)
+        x, stats = cer1inv_coarse(angles, rpp, x_ini, niter=20)
+        np.testing.assert_allclose(x, (r1, r2, r3, r4), atol=1e-9)
+        self.assertEqual([s for s, n in stats['strides']], [4, 2, 1])
+        self.assertEqual(stats['evaluations'],
+                         sum(n * len(angles[::s])
+                             for s, n in stats['strides']))
+        self.assertLess(stats['evaluations'], 0.6 * nit * len(angles))
+
+        # Strides leaving too few angles are skipped
+        x, stats = cer1inv_coarse(angles[:12], rpp[:12], x_ini,
+                                  strides=(4, 1), niter=20)
+        self.assertEqual([s for s, n in stats['strides']], [1])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2ratio
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.modcer import rpp_cer1977
+from zoeppritz.invcer import cer1itr
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modwan import wang1999
+from zoeppritz.invwan import wan1inv_batch
+from zoeppritz.invreg import difference_operator, invert_regularized, \
+    defined
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        # A smooth model on a 6 x 7 grid
+        ny, nx = 6, 7
+        yy, xx = np.meshgrid(np.linspace(0, 1, ny), np.linspace(0, 1, nx),
+                             indexing='ij')
+        self.x_true = np.stack([0.04 + 0.01 * xx, 0.09 + 0.01 * yy,
+                                0.12 - 0.02 * xx * yy], axis=-1)
+        self.angles = np.arange(0, 40, 4.)
+        x = self.x_true[..., None, :]
+        self.rpp = wang1999(0.5, x[..., 0], x[..., 1], x[..., 2],
+                            inc2ave_angle(self.angles, x[..., 1]))
+
+    def test_operator(self):
+        D = difference_operator((3, 4))
+        self.assertEqual(D.shape, (2 * 4 + 3 * 3, 12))
+        np.testing.assert_array_equal(D @ np.ones(12), 0)
+        self.assertEqual(difference_operator((1, 5)).shape, (4, 5))
+
+    def test_unregularized(self):
+        x = invert_regularized(self.angles, self.rpp, (0., 0., 0.), lam=0.,
+                               equation='quadratic', niter=10)
+        x_batch, nit = wan1inv_batch(self.angles, self.rpp.reshape(-1, 10),
+                                     (0., 0., 0.), niter=10, tol=0.)
+        np.testing.assert_allclose(x.reshape(-1, 3), x_batch, atol=1e-8)
+
+    def test_regularized(self):
+        rng = np.random.default_rng(3)
+        noisy = self.rpp + rng.normal(0, 0.001, self.rpp.shape)
+        noisy[0, 0, 5:] = np.nan
+        errors = []
+        for lam in (0., 0.05):
+            x = invert_regularized(self.angles, noisy, (0., 0., 0.), lam=lam,
+                                   equation='quadratic')
+            self.assertEqual(x.shape, (6, 7, 3))
+            errors.append(np.sqrt(np.mean((x - self.x_true) ** 2)))
+        self.assertLess(errors[1], 0.5 * errors[0])
+
+    def test_zoeppritz(self):
+        # Unregularized, the gathers are those of cer1itr()
+        yy, xx = np.meshgrid(np.linspace(0, 1, 4), np.linspace(0, 1, 5),
+                             indexing='ij')
+        x_true = np.stack(np.broadcast_arrays(*elapar_hs2ratio(
+            3.0, 1.5, 2.3, 3.3 + 0.1 * xx, 1.7 + 0.05 * yy,
+            2.4 + 0.02 * xx * yy)), axis=-1)
+        grid = AngleGrid(self.angles)
+        rpp = rpp_cer1977(*(x_true[..., i:i + 1] for i in range(4)),
+                          grid)[0]
+        x_ini = x_true.mean(axis=(0, 1)) * np.array([1.01, 0.99, 1.01, 0.99])
+        x = invert_regularized(self.angles, rpp, x_ini, lam=0.,
+                               equation='zoeppritz', niter=5)
+        self.assertEqual(x.shape, (4, 5, 4))
+        for i, j in np.ndindex(4, 5):
+            x_i = x_ini
+            for it in range(5):
+                x_i = cer1itr(grid, rpp[i, j], x_i)
+            np.testing.assert_allclose(x[i, j], x_i, atol=1e-6)
+        np.testing.assert_allclose(x, x_true, atol=1e-4)
+
+    def test_post_critical(self):
+        # The far angle is post-critical, muted but one live sample
+        angles = np.arange(0, 80, 8.)
+        x = self.x_true[..., None, :]
+        with np.errstate(invalid='ignore'):
+            rpp = wang1999(0.5, x[..., 0], x[..., 1], x[..., 2],
+                           inc2ave_angle(angles, x[..., 1]))
+        self.assertTrue(np.isnan(rpp[..., -1]).all())
+        bad = rpp.copy()
+        bad[2, 3, -1] = 0.3
+        with np.errstate(all='raise'):
+            x = invert_regularized(angles, rpp, (0., 0., 0.), lam=0.,
+                                   equation='quadratic', niter=10)
+            x_bad = invert_regularized(angles, bad, (0., 0., 0.), lam=0.,
+                                       equation='quadratic', niter=10)
+        np.testing.assert_allclose(x, self.x_true, atol=1e-10)
+        self.assertTrue(np.isfinite(x_bad).all())
+        # Steps stop before the live sample turns post-critical
+        self.assertTrue(defined(angles, x_bad.reshape(-1, 3))[2 * 7 + 3]
+                        .all())
+        # Other gathers are not affected
+        x_bad[2, 3] = x[2, 3]
+        np.testing.assert_allclose(x_bad, x, atol=1e-10)
+
+
+if __name__ == '__main__':
+    unittest.main()
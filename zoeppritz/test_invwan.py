@@ -6,7 +6,8 @@ import numpy as np
 from zoeppritz.utils import elapar_hs2delta
 from zoeppritz.modaki import inc2ave_angle
 from zoeppritz.modwan import wang1999
-from zoeppritz.invwan import wan1itr
+from zoeppritz.invwan import wan1itr, wan1inv_batch
+from zoeppritz.workspace import Workspace
 
 
 class Test(unittest.TestCase):
@@ -48,6 +49,50 @@ class Test(unittest.TestCase):
     def test_2(self):
         self.assertTrue(True)
 
+    def test_workspace(self):
+        ro_rd, vp_rd, vs_rd, vs_vp_ratio = \
+            elapar_hs2delta(3.0, 1.5, 2.3, 3.3, 1.7, 2.4)
+        angles = np.arange(0, 60, 6)
+        rpp = wang1999(vs_vp_ratio, ro_rd, vp_rd, vs_rd,
+                       inc2ave_angle(angles, vp_rd))
+        workspace = Workspace(len(angles) + 5, 3)
+        buffer = workspace.A
+        x_ws = x_new = (0., 0., 0.)
+        for i in range(5):
+            x_new = wan1itr(angles, rpp, x_new, vs_vp_ratio)
+            x_ws = wan1itr(angles, rpp, x_ws, vs_vp_ratio,
+                           workspace=workspace)
+            np.testing.assert_array_equal(x_ws, x_new)
+        self.assertIs(workspace.A, buffer)
+        with self.assertRaises(ValueError):
+            workspace.views(len(angles) + 6)
+
+    def test_batch(self):
+        vp1 = np.array([3.0, 3.0, 2.5, 2.0])
+        vs1 = np.array([1.5, 1.4, 1.2, 1.0])
+        ro1 = np.array([2.3, 2.2, 2.1, 2.0])
+        ro_rd, vp_rd, vs_rd, vs_vp_ratio = elapar_hs2delta(
+            vp1, vs1, ro1, vp1 * 1.1, vs1 * 1.12, ro1 * 1.04)
+        angles = np.arange(0, 60, 6)
+        rpp = wang1999(vs_vp_ratio[:, None], ro_rd[:, None], vp_rd[:, None],
+                       vs_rd[:, None], inc2ave_angle(angles, vp_rd[:, None]))
+        rpp[1, 7:] = np.nan
+        rpp[2, 2:] = np.nan
+        x, nit = wan1inv_batch(angles, rpp, (0., 0., 0.), vs_vp_ratio,
+                               niter=20, tol=1e-12)
+        for i in (0, 1, 3):
+            keep = np.isfinite(rpp[i])
+            x_i = (0., 0., 0.)
+            for j in range(nit[i]):
+                x_i = wan1itr(angles[keep], rpp[i][keep], x_i,
+                              vs_vp_ratio[i])
+            np.testing.assert_allclose(x[i], x_i, atol=1e-12)
+            np.testing.assert_allclose(x[i], (ro_rd[i], vp_rd[i], vs_rd[i]),
+                                       atol=1e-12)
+        self.assertTrue(np.isnan(x[2]).all())
+        self.assertEqual(nit[2], 0)
+        self.assertTrue((nit[[0, 1, 3]] <= 8).all())
+
 
 if __name__ == '__main__':
     unittest.main()
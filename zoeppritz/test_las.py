@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.las import read_las, elastic_logs, log2interfaces
+
+LAS_TEXT = """~VERSION INFORMATION
+ VERS.                  2.0 :   CWLS LOG ASCII STANDARD -VERSION 2.0
+ WRAP.                   NO :   ONE LINE PER DEPTH STEP
+~WELL INFORMATION
+#MNEM.UNIT       DATA           DESCRIPTION
+ STRT.M          1000.0 :  START DEPTH
+ STOP.M          1000.5 :  STOP DEPTH
+ STEP.M          0.25 :  STEP
+ NULL.           -999.25 :  NULL VALUE
+ WELL.           ANY WELL :  WELL
+~CURVE INFORMATION
+ DEPT.M                 :  DEPTH
+ DT  .US/F              :  SONIC TRANSIT TIME
+ DTS .US/F              :  SHEAR TRANSIT TIME
+ RHOB.KG/M3             :  BULK DENSITY
+~A  DEPT     DT       DTS      RHOB
+1000.00  101.6    203.2    2300.0
+1000.25  92.36    -999.25  2400.0
+1000.50  76.2     152.4    2500.0
+"""
+
+
+class Test(unittest.TestCase):
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'well.las')
+            with open(path, 'w') as fp:
+                fp.write(LAS_TEXT)
+            las = read_las(path)
+
+            # Wrapped data are parsed the same way
+            path = os.path.join(tmp, 'wrap.las')
+            with open(path, 'w') as fp:
+                fp.write(LAS_TEXT.replace('152.4    2500.0', '152.4\n2500.0'))
+            wrap = read_las(path)
+
+            # Comment lines are skipped
+            path = os.path.join(tmp, 'comment.las')
+            with open(path, 'w') as fp:
+                fp.write(LAS_TEXT.replace('1000.25', '# logged twice\n'
+                                          '  #1000.00 0 0 0\n\n1000.25'))
+            comment = read_las(path)
+
+            path = os.path.join(tmp, 'bad.las')
+            with open(path, 'w') as fp:
+                fp.write(LAS_TEXT + '1000.75 1.0\n')
+            with self.assertRaises(ValueError):
+                read_las(path)
+            with open(path, 'w') as fp:
+                fp.write(LAS_TEXT.replace('92.36', '92,36'))
+            with self.assertRaisesRegex(ValueError, "'92,36' on line 18"):
+                read_las(path)
+
+        self.assertEqual(las.well['WELL'], 'ANY WELL')
+        self.assertEqual(las.mnemonics(), ['DEPT', 'DT', 'DTS', 'RHOB'])
+        self.assertEqual(len(las), 3)
+        np.testing.assert_array_equal(las.data, wrap.data)
+        np.testing.assert_array_equal(las.data, comment.data)
+        dts, unit = las.curve('dts')
+        self.assertEqual(unit, 'US/F')
+        self.assertTrue(dts.flags['C_CONTIGUOUS'])
+        self.assertTrue(np.isnan(dts[1]))
+
+        vp, vs, ro = elastic_logs(las)
+        np.testing.assert_allclose(vp, [3.0, 3.3, 4.0], rtol=1e-3)
+        np.testing.assert_allclose(vs[[0, 2]], [1.5, 2.0])
+        np.testing.assert_allclose(ro, [2.3, 2.4, 2.5])
+
+        ro_rd, vp_rd, vs_rd, ratio = elapar_hs2delta(
+            *log2interfaces(vp, vs, ro))
+        self.assertEqual(vp_rd.shape, (2,))
+        self.assertAlmostEqual(vp_rd[0], 0.3 / 3.15, places=3)
+        self.assertTrue(np.isnan(vs_rd[0]))
+
+        with self.assertRaises(KeyError):
+            elastic_logs(las, ro='NPHI')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.modaki import inc2ave_angle, aki1980
+from zoeppritz.modavo import NPARAM, transform, avo_coe, avo_modeling
+from zoeppritz.invavo import avo_pinv, avo_inv
+
+
+class Test(unittest.TestCase):
+    def test_coe(self):
+        ro_rd, vp_rd, vs_rd, vs_vp_ratio = \
+            elapar_hs2delta(3.0, 1.5, 2.3, 3.3, 1.7, 2.4)
+        angles = np.arange(0, 40, 4.)
+        ave_angles = inc2ave_angle(angles, vp_rd)
+        rpp = aki1980(vs_vp_ratio, ro_rd, vp_rd, vs_rd, ave_angles)
+
+        # Shuey terms do not depend on Vs/Vp
+        s2 = np.sin(np.radians(angles)) ** 2
+        t2 = np.tan(np.radians(angles)) ** 2
+        np.testing.assert_allclose(avo_coe('shuey3', vs_vp_ratio, angles),
+                                   np.stack([s2 * 0 + 1, s2, t2 - s2], 1),
+                                   atol=1e-14)
+
+        # The Aki model mapped to each parameterization gives the same Rpp
+        x_aki = np.array([ro_rd, vp_rd, vs_rd])
+        for method in ('shuey3', 'fatti'):
+            T = transform(method, vs_vp_ratio)
+            x = np.linalg.solve(T, x_aki)
+            np.testing.assert_allclose(
+                avo_modeling(method, vs_vp_ratio, x, ave_angles), rpp,
+                atol=1e-14)
+        ip_rd, is_rd = np.linalg.solve(transform('fatti'), x_aki)[:2]
+        self.assertAlmostEqual(ip_rd, ro_rd + vp_rd)
+        self.assertAlmostEqual(is_rd, ro_rd + vs_rd)
+        with self.assertRaises(ValueError):
+            transform('zoeppritz')
+
+    def test_inv(self):
+        angles = np.arange(0, 40, 4.)
+        rng = np.random.default_rng(0)
+        for method, n in NPARAM.items():
+            x = rng.normal(0, 0.1, (5, n))
+            rpp = avo_modeling(method, 0.5, x, angles)
+            np.testing.assert_allclose(avo_inv(method, angles, rpp), x,
+                                       atol=1e-12)
+        P = avo_pinv('fatti', tuple(angles), 0.5, 0., 0.25)
+        self.assertIs(avo_pinv('fatti', tuple(angles), 0.5, 0., 0.25), P)
+        self.assertFalse(P.flags.writeable)
+
+
+if __name__ == '__main__':
+    unittest.main()
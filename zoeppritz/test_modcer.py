@@ -2,9 +2,10 @@
 # Copyright (c) Ezcad Development Team. All Rights Reserved.
 
 import unittest
-# import numpy as np
+import numpy as np
 from zoeppritz.utils import elapar_hs2ratio
-from zoeppritz.modcer import rpp_cer1977, rps_cer1977
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.modcer import rpp_cer1977, rps_cer1977, near_critical
 
 
 class Test(unittest.TestCase):
@@ -55,6 +56,30 @@ class Test(unittest.TestCase):
         err = amp_truth - amp
         self.assertLessEqual(err, 0.001)
 
+    def test_float32(self):
+        # Random physical models, pre- and post-critical angles
+        rng = np.random.default_rng(0)
+        k = 500
+        vp1 = rng.uniform(2, 4, k)
+        vp2 = vp1 * rng.uniform(0.7, 1.4, k)
+        vs1 = vp1 * rng.uniform(0.4, 0.65, k)
+        vs2 = vp2 * rng.uniform(0.4, 0.65, k)
+        ro1 = rng.uniform(2, 2.6, k)
+        ro2 = ro1 * rng.uniform(0.85, 1.15, k)
+        ratios = [r[:, None] for r in
+                  elapar_hs2ratio(vp1, vs1, ro1, vp2, vs2, ro2)]
+        angles = np.arange(0, 89.5, 0.25)
+        grid64 = AngleGrid(angles)
+        grid32 = AngleGrid(angles, dtype=np.float32)
+        self.assertTrue(near_critical(*ratios[:3], grid64).any())
+        for func, amp_type in ((rpp_cer1977, 'real'), (rps_cer1977, 'abs')):
+            amp64, pha64 = func(*ratios, grid64, amp_type=amp_type)
+            amp32, pha32 = func(*ratios, grid32, amp_type=amp_type)
+            self.assertEqual(amp32.dtype, np.float32)
+            self.assertLess(np.abs(amp32 - amp64).max(), 1e-5)
+            dpha = np.abs(pha32 - pha64)
+            self.assertLess(np.minimum(dpha, 360 - dpha).max(), 0.01)
+
 
 if __name__ == '__main__':
     unittest.main()
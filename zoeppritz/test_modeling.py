@@ -20,8 +20,8 @@ class Test(unittest.TestCase):
 
         angles = '1,2,3'
         equation, reflection = 'linear', 'PS'
-        with self.assertRaises(NotImplementedError):
-            r = modeling(model, angles, equation, reflection)
+        r = modeling(model, angles, equation, reflection)
+        self.assertEqual(r.shape, (3, 3))
 
         angles = '1,2,3'
         equation, reflection = 'quadratic', 'PP'
@@ -30,8 +30,8 @@ class Test(unittest.TestCase):
 
         angles = '1,2,3'
         equation, reflection = 'quadratic', 'PS'
-        with self.assertRaises(NotImplementedError):
-            r = modeling(model, angles, equation, reflection)
+        r = modeling(model, angles, equation, reflection)
+        self.assertEqual(r.shape, (3, 3))
 
         angles = '1,2,3'
         equation, reflection = 'zoeppritz', 'PP'
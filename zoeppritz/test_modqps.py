@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta, elapar_hs2ratio
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.modcer import rps_cer1977
+from zoeppritz.modaki import inc2ave_angle, aki1980, aki1980_ps
+from zoeppritz.modqps import rps_quadratic, rps_quadratic_jac
+from zoeppritz.batch import invert_chunk
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.angles = np.arange(0, 45, 5.)
+
+    def model(self, scale):
+        # Contrasts of 5%, 7.5% and 10% in density, Vp, Vs times scale
+        vp1, vs1, ro1 = 3.0, 1.5, 2.3
+        x = np.array([0.05, 0.075, 0.1]) * scale
+        ro2, vp2, vs2 = [v * (2 + d) / (2 - d) for v, d in
+                         zip((ro1, vp1, vs1), x)]
+        return vp1, vs1, ro1, vp2, vs2, ro2
+
+    def test_accuracy(self):
+        for scale in (1, 0.5):
+            model = self.model(scale)
+            ro_rd, vp_rd, vs_rd, ratio = elapar_hs2delta(*model)
+            exact, _ = rps_cer1977(*elapar_hs2ratio(*model),
+                                   AngleGrid(self.angles))
+            ave_angles = inc2ave_angle(self.angles, vp_rd)
+            err1 = np.abs(aki1980_ps(ratio, ro_rd, vp_rd, vs_rd, ave_angles)
+                          - exact).max()
+            err2 = np.abs(rps_quadratic(ratio, ro_rd, vp_rd, vs_rd,
+                                        self.angles) - exact).max()
+            self.assertLess(err1, 0.02 * scale ** 2)
+            self.assertLess(err2, 0.2 * err1)
+
+    def test_jacobian(self):
+        ro_rd, vp_rd, vs_rd, ratio = elapar_hs2delta(*self.model(1))
+        x = np.array([ro_rd, vp_rd, vs_rd])
+        A = rps_quadratic_jac(ratio, *x, self.angles)
+        delta = 1e-6
+        for i in range(3):
+            dx = np.eye(3)[i] * delta
+            r1 = rps_quadratic(ratio, *(x + dx), self.angles)
+            r0 = rps_quadratic(ratio, *(x - dx), self.angles)
+            np.testing.assert_allclose(A[:, i], (r1 - r0) / (2 * delta),
+                                       atol=1e-8)
+
+        # Batch of models of shape (k, 1)
+        k = np.array([[0.45], [0.5]])
+        A2 = rps_quadratic_jac(k, ro_rd, vp_rd, vs_rd, self.angles)
+        self.assertEqual(A2.shape, (2, len(self.angles), 3))
+        np.testing.assert_allclose(
+            A2[1], rps_quadratic_jac(0.5, ro_rd, vp_rd, vs_rd, self.angles))
+
+    def test_joint(self):
+        ro_rd, vp_rd, vs_rd, ratio = elapar_hs2delta(*self.model(1))
+        ave_angles = inc2ave_angle(self.angles, vp_rd)
+        rpp = aki1980(ratio, ro_rd, vp_rd, vs_rd, ave_angles)
+        rps = aki1980_ps(ratio, ro_rd, vp_rd, vs_rd, ave_angles)
+        x = invert_chunk(self.angles, rpp[None], (0., 0., 0.), 'linear',
+                         niter=30, rps=rps[None], vs_vp_ratio=ratio)
+        np.testing.assert_allclose(x[0], (ro_rd, vp_rd, vs_rd), atol=1e-8)
+
+
+if __name__ == '__main__':
+    unittest.main()
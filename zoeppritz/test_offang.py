@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.offang import vrms2vint, vint2vrms, offset2angle, \
+    angle_gather, angle_stack
+
+
+class Test(unittest.TestCase):
+    def test_dix(self):
+        times = np.linspace(0, 2, 21)
+        vint = np.linspace(1.5, 3.5, 21)
+        vrms = vint2vrms(times, vint)
+        np.testing.assert_allclose(vrms2vint(times, vrms), vint)
+
+        # Batch of velocity functions
+        vrms2 = np.vstack((vrms, vrms * 1.1))
+        self.assertEqual(vrms2vint(times, vrms2).shape, (2, 21))
+
+    def test_constant_velocity(self):
+        # Straight ray and Dix angles agree in a constant velocity
+        times = np.linspace(0.1, 2, 20)
+        offsets = np.linspace(0, 3, 16)
+        vrms = np.full(20, 2.5)
+        a1 = offset2angle(times, offsets, vrms, method='straight')
+        a2 = offset2angle(times, offsets, vrms, method='dix')
+        self.assertEqual(a1.shape, (20, 16))
+        np.testing.assert_allclose(a1, a2)
+        truth = np.degrees(np.arctan(offsets[None, :] /
+                                     (2.5 * times[:, None])))
+        np.testing.assert_allclose(a1, truth)
+        with self.assertRaises(ValueError):
+            offset2angle(times, offsets, vrms, method='else')
+
+    def test_angle_gather(self):
+        times = np.linspace(0.5, 2, 4)
+        offsets = np.linspace(0, 4, 41)
+        vrms = np.array([2.0, 2.2, 2.4, 2.6])
+        sample_angles = offset2angle(times, offsets, vrms)
+        # Amplitude is a linear function of angle
+        gathers = np.stack((0.1 - 0.002 * sample_angles,
+                            0.2 - 0.001 * sample_angles))
+        angles = np.arange(0, 60, 5)
+        ag = angle_gather(gathers, times, offsets, vrms, angles)
+        self.assertEqual(ag.shape, (2, 4, 12))
+        live = ~np.isnan(ag[0])
+        expect = np.broadcast_to(0.1 - 0.002 * angles, (4, 12))
+        np.testing.assert_allclose(ag[0][live], expect[live], atol=1e-12)
+        # Far angles are out of offset coverage at late times
+        self.assertTrue(np.isnan(ag[0, -1, -1]))
+        self.assertFalse(np.isnan(ag[0, 0, -1]))
+
+        stacks = angle_stack(gathers, times, offsets, vrms,
+                             [(0, 10), (10, 20), (80, 90)])
+        self.assertEqual(stacks.shape, (2, 4, 3))
+        self.assertTrue(np.all(np.isnan(stacks[..., 2])))
+        self.assertTrue(np.all(stacks[0, :, 0] > stacks[0, :, 1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
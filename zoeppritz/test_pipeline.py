@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modwan import wang1999
+from zoeppritz.batch import invert_chunk
+from zoeppritz.pipeline import run_pipeline, buffered
+
+
+class Test(unittest.TestCase):
+    def test_pipeline(self):
+        vp1, vp2 = 3.0, 3.3
+        vs1, vs2 = 1.5, 1.7
+        ro1, ro2 = 2.3, 2.4
+        ro_rd, vp_rd, vs_rd, ratio = \
+            elapar_hs2delta(vp1, vs1, ro1, vp2, vs2, ro2)
+        # A conservative mute, as if the critical angle were 39.5 degrees
+        r1 = 1. / np.sin(np.radians(39.5))
+        angles = np.arange(1, 60, 3)
+        pre = angles < 39.5
+        rpp = wang1999(ratio, ro_rd, vp_rd, vs_rd,
+                       inc2ave_angle(angles[pre], vp_rd))
+
+        # Post-critical samples are garbage to be muted
+        gathers = np.full((5, len(angles)), 9.)
+        gathers[:, pre] = rpp * 2
+        x_ini = (0., 0., 0.)
+        kwargs = dict(equation='quadratic', niter=20, vs_vp_ratio=ratio)
+        out = np.zeros((5, 3))
+        nchunk = run_pipeline(gathers, out, angles, x_ini, chunk_size=2,
+                              r1=r1, scale=0.5, **kwargs)
+        self.assertEqual(nchunk, 3)
+        expect = invert_chunk(angles[pre], rpp[None, :], x_ini, **kwargs)
+        np.testing.assert_allclose(out, np.tile(expect, (5, 1)))
+        np.testing.assert_allclose(out[0], (ro_rd, vp_rd, vs_rd), atol=1e-3)
+
+        # Per-gather initial models and ratios follow their chunks
+        x_ini = np.linspace(0, 0.05, 15).reshape(5, 3)
+        kwargs['vs_vp_ratio'] = ratio * np.linspace(0.9, 1.1, 5)
+        kwargs['niter'] = 2
+        run_pipeline(gathers, out, angles, x_ini, chunk_size=2, r1=r1,
+                     scale=0.5, **kwargs)
+        np.testing.assert_array_equal(
+            out, invert_chunk(angles[pre], np.tile(rpp, (5, 1)), x_ini,
+                              **kwargs))
+        with self.assertRaises(ValueError):
+            run_pipeline(gathers, out, angles, x_ini[:4], **kwargs)
+        with self.assertRaises(ValueError):
+            run_pipeline(gathers, out, angles, x_ini[0],
+                         **dict(kwargs, vs_vp_ratio=[ratio] * 4))
+
+    def test_buffered(self):
+        self.assertEqual(list(buffered(iter(range(10)), 2)), list(range(10)))
+
+        def fail():
+            yield 1
+            raise RuntimeError("read error")
+
+        with self.assertRaises(RuntimeError):
+            list(buffered(fail()))
+
+        # Stopping early does not hang the producer
+        stage = buffered(iter(range(100)), 1)
+        self.assertEqual(next(stage), 0)
+        stage.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
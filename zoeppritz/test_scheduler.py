@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import asyncio
+import socket
+import struct
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2delta
+from zoeppritz.modaki import inc2ave_angle
+from zoeppritz.modwan import wang1999
+from zoeppritz.batch import run_batch
+from zoeppritz.service import encode, recv_message
+from zoeppritz.scheduler import Coordinator, run_worker, schedule
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.angles = np.arange(0, 40, 4)
+        ro_rd, vp_rd, vs_rd, self.ratio = elapar_hs2delta(
+            3.0, 1.5, 2.3, 3.3, 1.7, 2.4)
+        rpp = wang1999(self.ratio, ro_rd, vp_rd, vs_rd,
+                       inc2ave_angle(self.angles, vp_rd))
+        self.gathers = rpp * np.linspace(0.8, 1.2, 23)[:, None]
+        self.kwargs = dict(equation='quadratic', niter=5)
+        self.expect = np.zeros((23, 3))
+        run_batch(self.gathers, self.expect, self.angles, (0., 0., 0.),
+                  vs_vp_ratio=self.ratio, **self.kwargs)
+
+    def test_schedule(self):
+        out = np.zeros((23, 3))
+        stats = schedule(self.gathers, out, self.angles, (0., 0., 0.),
+                         nworker=2, chunk_size=5,
+                         vs_vp_ratio=np.full(23, self.ratio), **self.kwargs)
+        np.testing.assert_array_equal(out, self.expect)
+        self.assertEqual(stats['chunks'], 5)
+        self.assertEqual(stats['failed'], 0)
+        self.assertGreaterEqual(sum(stats['workers'].values()), 5)
+
+    def test_retry(self):
+        out = np.zeros((23, 3))
+
+        def drop(address):
+            # A worker that dies with a chunk in hand
+            with socket.create_connection(address, 10) as sock:
+                sock.sendall(encode({'op': 'ready'}))
+                header, arrays = recv_message(sock)
+            return header['start'], header['stop']
+
+        async def run():
+            coordinator = Coordinator(
+                self.gathers, out, self.angles, (0., 0., 0.), chunk_size=5,
+                max_retries=1, vs_vp_ratio=self.ratio, **self.kwargs)
+            address = await coordinator.start()
+            loop = asyncio.get_running_loop()
+            chunk = await loop.run_in_executor(None, drop, address)
+            while not coordinator.stats['retries']:
+                await asyncio.sleep(0.01)
+            await loop.run_in_executor(None, run_worker, address, 10)
+            return chunk, await coordinator.wait()
+
+        chunk, stats = asyncio.run(run())
+        self.assertEqual(chunk, (0, 5))
+        self.assertEqual(stats['retries'], 1)
+        self.assertEqual(stats['failed'], 0)
+        np.testing.assert_array_equal(out, self.expect)
+
+    def test_malformed(self):
+        out = np.zeros((23, 3))
+
+        def bad(address, reply):
+            # A worker that takes a chunk and answers with reply
+            with socket.create_connection(address, 10) as sock:
+                sock.sendall(encode({'op': 'ready'}))
+                header, arrays = recv_message(sock)
+                if reply is not None:
+                    sock.sendall(reply)
+                # Until the coordinator drops the connection
+                return header['start'], sock.recv(1)
+
+        replies = [struct.pack('!I', 8) + b'not json',
+                   encode({'op': 'result'}, (np.zeros((2, 3)),)),
+                   encode({'op': 'ready'}),
+                   None]
+
+        async def run():
+            coordinator = Coordinator(
+                self.gathers, out, self.angles, (0., 0., 0.), chunk_size=5,
+                max_retries=1, timeout=0.2, vs_vp_ratio=self.ratio,
+                **self.kwargs)
+            address = await coordinator.start()
+            loop = asyncio.get_running_loop()
+            starts = []
+            for i, reply in enumerate(replies):
+                start, tail = await loop.run_in_executor(None, bad, address,
+                                                         reply)
+                self.assertEqual(tail, b'')
+                starts.append(start)
+                while coordinator.stats['retries'] <= i:
+                    await asyncio.sleep(0.01)
+            await loop.run_in_executor(None, run_worker, address, 10)
+            return starts, await coordinator.wait()
+
+        starts, stats = asyncio.run(run())
+        self.assertEqual(starts, [0, 5, 10, 15])
+        self.assertEqual(stats['retries'], 4)
+        self.assertEqual(stats['timeouts'], 1)
+        self.assertEqual(stats['failed'], 0)
+        np.testing.assert_array_equal(out, self.expect)
+
+
+if __name__ == '__main__':
+    unittest.main()
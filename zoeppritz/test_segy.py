@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import tempfile
+import unittest
+import numpy as np
+from zoeppritz.modaki import aki1980, inc2ave_angle
+from zoeppritz.segy import SegyFile, create_segy, set_header_field, \
+    invert_segy, ibm2ieee, ieee2ibm, TRC_INLINE, TRC_CROSSLINE, TRC_OFFSET, \
+    INDEX_SUFFIX, NULL_VALUE
+
+
+class Test(unittest.TestCase):
+    def test_ibm(self):
+        # 0x42640000 is 100.0 and 0xC276A000 is -118.625 in IBM float
+        ibm = np.array([0x42640000, 0xC276A000, 0], dtype=np.uint32)
+        np.testing.assert_array_equal(ibm2ieee(ibm), [100., -118.625, 0.])
+        np.testing.assert_array_equal(ieee2ibm([100., -118.625, 0.]), ibm)
+
+        data = np.random.RandomState(0).randn(1000).astype(np.float32)
+        data *= 10. ** np.arange(-10, 10, 0.02)
+        np.testing.assert_allclose(ibm2ieee(ieee2ibm(data)), data,
+                                   rtol=1e-6)
+
+        # IBM float has no NaN or inf
+        with self.assertRaises(ValueError):
+            ieee2ibm([1., np.nan])
+        with self.assertRaises(ValueError):
+            ieee2ibm([np.inf])
+        np.testing.assert_array_equal(
+            ibm2ieee(ieee2ibm([np.nan, -np.inf, 2.], null=NULL_VALUE)),
+            [NULL_VALUE, NULL_VALUE, 2.])
+
+    def test_gathers(self):
+        # Two inlines, three crosslines, four angles per gather.
+        # Traces are written in angle-major order to exercise sorting.
+        angles = np.array([5, 15, 25, 35])
+        il, xl, an = np.meshgrid([10, 11], [20, 21, 22], angles,
+                                 indexing='ij')
+        il, xl, an = [a.ravel() for a in (il, xl, an)]
+        order = np.lexsort((xl, il, an))
+        il, xl, an = il[order], xl[order], an[order]
+        ntr, ns = len(il), 30
+
+        # Aki 1980 amplitudes of a model varying with time
+        vp_rd = np.linspace(0.05, 0.15, ns)
+        ro_rd, vs_rd, ratio = 0.04, 0.12, 0.5
+        rpp = np.array([aki1980(ratio, ro_rd, v, vs_rd,
+                                inc2ave_angle(angles, v)) for v in vp_rd])
+        data = rpp[:, np.searchsorted(angles, an)].T
+
+        headers = np.zeros((ntr, 240), dtype=np.uint8)
+        set_header_field(headers, TRC_INLINE, il)
+        set_header_field(headers, TRC_CROSSLINE, xl)
+        set_header_field(headers, TRC_OFFSET, an)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'gathers.sgy')
+            segy = create_segy(path, headers, ns, 4000, fmt=1)
+            segy.write_traces(0, data)
+            segy.flush()
+            del segy
+
+            segy = SegyFile(path)
+            self.assertEqual((len(segy), segy.ns, segy.dt, segy.format),
+                             (ntr, ns, 4000, 1))
+            np.testing.assert_allclose(segy.read_traces(slice(None)), data,
+                                       rtol=1e-6)
+            gathers = list(segy.iter_gathers())
+            self.assertTrue(os.path.exists(path + INDEX_SUFFIX))
+            self.assertEqual(len(gathers), 6)
+            iline, xline, keys, gather = gathers[1]
+            self.assertEqual((iline, xline), (10, 21))
+            np.testing.assert_array_equal(keys, angles)
+            np.testing.assert_allclose(gather, rpp.T, rtol=1e-6)
+
+            # The cached index is reused
+            index = SegyFile(path).index()
+            np.testing.assert_array_equal(index['order'],
+                                          segy.index()['order'])
+
+            paths = [os.path.join(tmp, n + '.sgy') for n in 'dps']
+            outputs = invert_segy(segy, paths, (0., 0., 0.),
+                                  equation='linear', niter=30,
+                                  vs_vp_ratio=ratio)
+            vp = SegyFile(paths[1]).read_traces(slice(None))
+            self.assertEqual(vp.shape, (6, ns))
+            np.testing.assert_allclose(vp, np.tile(vp_rd, (6, 1)),
+                                       atol=1e-4)
+            self.assertEqual(outputs[0].header_field(TRC_INLINE)[-1], 11)
+            with self.assertRaises(ValueError):
+                invert_segy(segy, paths[:2], (0., 0., 0.), equation='linear')
+
+            # Muted samples are written as the null value, not as zeros
+            out = create_segy(paths[0], headers[:2], ns, 4000, fmt=1)
+            with self.assertRaises(ValueError):
+                out.write_traces(0, np.full((2, ns), np.nan))
+            out.write_traces(0, np.full((2, ns), np.nan), NULL_VALUE)
+            np.testing.assert_array_equal(out.read_traces(slice(None)),
+                                          NULL_VALUE)
+            del segy, outputs, out
+
+
+if __name__ == '__main__':
+    unittest.main()
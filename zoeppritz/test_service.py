@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import os
+import json
+import socket
+import struct
+import asyncio
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from zoeppritz.modeling import modeling_batch
+from zoeppritz.batch import invert_chunk
+from zoeppritz.service import Service, Client, MessageError, encode, \
+    recv_message, LENGTH, MAX_HEADER, MAX_PAYLOAD
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'zoeppritz.sock')
+        self.service = Service(window=0.05)
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(
+                self.service.start(self.path))
+            started.set()
+            self.loop.run_forever()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait(5)
+
+    def tearDown(self):
+        async def stop():
+            self.server.close()
+            # Let the connections see the clients close
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            if tasks:
+                await asyncio.wait(tasks, timeout=5)
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+        self.tmp.cleanup()
+
+    def test_modeling(self):
+        angles = np.arange(0, 40, 5.)
+        models = np.array([(3.0, 1.5, 2.3, 3.3 + 0.1 * i, 1.7, 2.4)
+                           for i in range(8)])
+
+        def request(i):
+            with Client(self.path, timeout=10) as client:
+                return client.modeling(models[i], angles, 'zoeppritz', 'PP')
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(request, range(8)))
+        amp, pha = modeling_batch(models, angles, 'zoeppritz', 'PP')
+        for i, (a, p) in enumerate(results):
+            np.testing.assert_allclose(a[0], amp[i])
+            np.testing.assert_allclose(p[0], pha[i])
+        self.assertEqual(self.service.stats['requests'], 8)
+        self.assertLess(self.service.stats['batches'], 8)
+
+        # A bad model fails its own request only
+        with Client(self.path, timeout=10) as client:
+            with self.assertRaises(RuntimeError):
+                client.modeling(models[0], angles, 'linear', 'SS')
+            a, p = client.modeling(models[:2], angles, 'linear', 'PP')
+            self.assertEqual(a.shape, (2, 8))
+
+    def test_invert(self):
+        angles = np.arange(0, 40, 4.)
+        amp, pha = modeling_batch([(3.0, 1.5, 2.3, 3.3, 1.7, 2.4)], angles,
+                                  'quadratic', 'PP')
+        rpp = amp * np.linspace(0.8, 1.2, 4)[:, None]
+        kwargs = dict(equation='quadratic', niter=5, vs_vp_ratio=0.5)
+        expect = invert_chunk(angles, rpp, (0., 0., 0.), **kwargs)
+
+        # Concurrent requests are batched
+        def request(i):
+            with Client(self.path, timeout=10) as client:
+                return client.invert(angles, rpp[i], (0., 0., 0.), **kwargs)
+
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(request, range(4)))
+        np.testing.assert_array_equal(np.vstack(results), expect)
+        stats = self.service.engine.inverter.stats
+        self.assertEqual(stats['requests'], 4)
+        self.assertLess(stats['batches'], 4)
+
+        with Client(self.path, timeout=10) as client:
+            x = client.invert(angles, rpp, (0., 0., 0.), tol=0,
+                              **dict(kwargs, vs_vp_ratio=[0.5] * 4))
+            np.testing.assert_array_equal(
+                x, invert_chunk(angles, rpp, (0., 0., 0.), tol=0, **kwargs))
+
+            # Rps takes its own batch
+            rps = -0.5 * rpp
+            x = client.invert(angles, rpp, (0., 0., 0.), rps=rps,
+                              equation='linear', niter=2)
+            np.testing.assert_array_equal(
+                x, invert_chunk(angles, rpp, (0., 0., 0.), rps=rps,
+                                equation='linear', niter=2))
+
+            # Only checked options reach the inversion
+            for bad in (dict(workspace=1), dict(dtype='float32'),
+                        dict(niter='5'), dict(niter=True), dict(niter=1.5),
+                        dict(niter=10 ** 6), dict(equation='cubic'),
+                        dict(tol=-1.), dict(vs_vp_ratio='0.5'),
+                        dict(vs_vp_ratio=[0.5, None, 0.5, 0.5])):
+                with self.assertRaises(RuntimeError):
+                    client.invert(angles, rpp, (0., 0., 0.), **bad)
+            self.assertEqual(client.invert(angles, rpp, (0., 0., 0.),
+                                           **kwargs).shape, (4, 3))
+
+    def test_malformed(self):
+        def header(obj):
+            head = json.dumps(obj).encode()
+            return struct.pack(LENGTH, len(head)) + head
+
+        # Refused before the oversized part is sent
+        for buf in (struct.pack(LENGTH, MAX_HEADER + 1),
+                    struct.pack(LENGTH, 2) + b'{]',
+                    header([1, 2]),
+                    header({'op': 'ping', 'arrays': [['|O', [1]]]}),
+                    header({'op': 'ping', 'arrays': [['<f8', [-1]]]}),
+                    header({'op': 'ping', 'arrays': [['<f8', [1.5]]]}),
+                    header({'op': 'ping', 'arrays': [[8, [1]]]}),
+                    header({'op': 'ping',
+                            'arrays': [['<f8', [MAX_PAYLOAD // 8 + 1]]]}),
+                    header({'op': 'ping', 'arrays': [['<f8', [1 << 30]],
+                                                     ['<f8', [1 << 30]]]})):
+            with socket.socket(socket.AF_UNIX) as sock:
+                sock.settimeout(10)
+                sock.connect(self.path)
+                sock.sendall(buf)
+                reply, out = recv_message(sock)
+                self.assertFalse(reply['ok'])
+                self.assertIn('MessageError', reply['error'])
+                # The connection is closed after the reply
+                self.assertEqual(sock.recv(1), b'')
+
+        # The client checks replies the same way
+        for buf, limits in ((encode({'ok': True}, [np.zeros(4)]),
+                             dict(max_payload=16)),
+                            (encode({'ok': True, 'pad': 'x' * 100}),
+                             dict(max_header=64))):
+            a, b = socket.socketpair()
+            with a, b:
+                a.sendall(buf)
+                with self.assertRaises(MessageError):
+                    recv_message(b, **limits)
+
+        with Client(self.path, timeout=10) as client:
+            self.assertEqual(client.request({'op': 'ping'}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
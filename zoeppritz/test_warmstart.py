@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+
+import unittest
+import numpy as np
+from zoeppritz.utils import elapar_hs2ratio
+from zoeppritz.modeling import modeling_batch
+from zoeppritz.invcer import cer1inv
+from zoeppritz.warmstart import morton_order, invert_warm
+
+
+class Test(unittest.TestCase):
+    def test_morton(self):
+        order = morton_order((4, 4))
+        np.testing.assert_array_equal(order[:8], [0, 4, 1, 5, 8, 12, 9, 13])
+        order = morton_order((3, 5))
+        np.testing.assert_array_equal(np.sort(order), np.arange(15))
+
+    def test_warm(self):
+        # A smooth model on a 5 x 6 grid
+        ny, nx = 5, 6
+        yy, xx = np.meshgrid(np.linspace(0, 1, ny), np.linspace(0, 1, nx),
+                             indexing='ij')
+        halfspace = np.stack(np.broadcast_arrays(
+            3.0, 1.5, 2.3, 3.3 + 0.01 * xx, 1.7 + 0.005 * yy,
+            2.4 + 0.005 * xx * yy), axis=-1).reshape(-1, 6)
+        models = np.stack(elapar_hs2ratio(*halfspace.T), axis=-1) \
+            .reshape(ny, nx, 4)
+        angles = np.arange(1, 40, 3.)
+        rpp, _ = modeling_batch(halfspace, angles, 'zoeppritz', 'PP')
+        gathers = rpp.reshape(ny, nx, -1).copy()
+        gathers[2, 3, 6:] = np.nan
+        # A cold start far from every model
+        x_ini = np.array([1.05, 0.45, 0.55, 1.0])
+
+        x, stats = invert_warm(angles, gathers, x_ini, niter=20, tol=1e-4,
+                               fm='analytic', cold=True)
+        np.testing.assert_allclose(x, models, atol=1e-8)
+        self.assertEqual(stats['seeded'], ny * nx - 1)
+
+        # Only the neighbour starts explain so few iterations
+        cold = [cer1inv(angles, g, x_ini, niter=20, tol=1e-4,
+                        fm='analytic')[1] for g in rpp]
+        self.assertGreater(min(cold), 3)
+        self.assertGreater(np.mean(stats['nit'] <= 2), 0.9)
+        self.assertGreater(stats['cold'], 3)
+        self.assertAlmostEqual(stats['reduction'],
+                               1 - stats['mean'] / stats['cold'])
+        self.assertGreater(stats['reduction'], 0.5)
+        self.assertNotIn('cold', invert_warm(angles, gathers[:1], x_ini)[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
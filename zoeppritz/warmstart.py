@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Warm-started inversion of a grid of gathers.
+
+Neighbouring gathers have nearly the same model. The gathers are visited
+along a Morton (Z-order) curve, which keeps most of the neighbours of a
+gather solved before it, and each inversion starts from the model of a
+solved neighbour instead of x_ini. Inversions stop at convergence, see
+invcer.cer1inv(), so a good start saves iterations.
+"""
+
+import numpy as np
+from zoeppritz.anggrid import AngleGrid
+from zoeppritz.invcer import cer1inv
+from zoeppritz.workspace import Workspace
+
+
+def morton_order(shape):
+    """
+    Visiting order of a grid along a Morton curve.
+
+    Parameters
+    ----------
+    shape : tuple
+        grid shape.
+
+    Returns
+    -------
+    order : array
+        flat indices in C order of the grid points, in visiting order.
+    """
+    coords = np.indices(shape).reshape(len(shape), -1)
+    nbit = max(int(n - 1).bit_length() for n in shape)
+    code = np.zeros(coords.shape[1], dtype=np.int64)
+    for b in range(nbit):
+        for a in range(len(shape)):
+            code |= ((coords[a] >> b) & 1) << (b * len(shape) + a)
+    return np.argsort(code, kind='stable')
+
+
+def solved_neighbour(index, shape, solved):
+    """
+    A solved face neighbour of a grid point.
+
+    Parameters
+    ----------
+    index : int
+        flat index in C order.
+    shape : tuple
+        grid shape.
+    solved : array
+        bool, flat, True for solved points.
+
+    Returns
+    -------
+    neighbour : int
+        flat index, or -1 if no neighbour is solved.
+    """
+    coord = np.unravel_index(index, shape)
+    strides = np.cumprod((1,) + shape[:0:-1])[::-1]
+    for a, n in enumerate(shape):
+        for step in (-1, 1):
+            if 0 <= coord[a] + step < n and solved[index + step * strides[a]]:
+                return index + step * strides[a]
+    return -1
+
+
+def invert_warm(angles, gathers, x_ini, niter=10, tol=1e-8, order='morton',
+                cold=False, **kwargs):
+    """
+    Invert a grid of gathers, each started from a solved neighbour.
+
+    Parameters
+    ----------
+    angles : array
+        incident angles in degrees, shape (m,).
+    gathers : array
+        Rpp amplitude, shape grid + (m,), e.g. (ny, nx, m). NaN are muted
+        samples.
+    x_ini : array
+        Initial model r1, r2, r3, r4 of gathers without solved neighbour,
+        shape (4,).
+    niter : int
+        maximum number of iterations of each gather.
+    tol : float
+        convergence threshold, see invcer.cer1inv().
+    order : str
+        'morton' for a Morton curve, 'raster' for C order.
+    cold : bool
+        also invert every gather from x_ini, to measure the saving.
+    kwargs : dict
+        other arguments of cer1itr(), e.g. fm, constraints.
+
+    Returns
+    -------
+    x : array
+        Inverted models, shape grid + (4,). Gathers with fewer than 4 live
+        angles are NaN.
+    stats : dict
+        'nit' iterations of each gather, shape grid, 'mean' and 'max' of
+        them, 'seeded' number of gathers started from a solved one. With
+        cold, 'cold' mean iterations from x_ini and 'reduction' the
+        fraction of them saved, 1 - mean / cold.
+    """
+    gathers = np.asarray(gathers, dtype=float)
+    shape, m = gathers.shape[:-1], gathers.shape[-1]
+    k = int(np.prod(shape))
+    rpp = gathers.reshape(k, m)
+    angles = np.asarray(angles, dtype=float)
+    grid = AngleGrid(angles)
+    workspace = Workspace(m, 4)
+    if order == 'morton':
+        visit = morton_order(shape)
+    elif order == 'raster':
+        visit = np.arange(k)
+    else:
+        raise ValueError("Unknown order %s" % order)
+
+    x = np.full((k, 4), np.nan)
+    nit = np.zeros(k, dtype=int)
+    nit_cold = np.zeros(k, dtype=int)
+    solved = np.zeros(k, dtype=bool)
+    seeded = 0
+    last = -1
+    for i in visit:
+        keep = np.isfinite(rpp[i])
+        if keep.sum() < 4:
+            continue
+        grid_i = grid if keep.all() else AngleGrid(angles[keep])
+        # The nearest solved gather, else the last one solved
+        seed = solved_neighbour(i, shape, solved)
+        if seed < 0:
+            seed = last
+        x_start = x_ini if seed < 0 else x[seed]
+        seeded += int(seed >= 0)
+        x[i], nit[i] = cer1inv(grid_i, rpp[i][keep], x_start, niter=niter,
+                               tol=tol, workspace=workspace, **kwargs)
+        if cold:
+            nit_cold[i] = cer1inv(grid_i, rpp[i][keep], x_ini, niter=niter,
+                                  tol=tol, workspace=workspace, **kwargs)[1]
+        solved[i] = True
+        last = i
+    stats = {'nit': nit.reshape(shape),
+             'mean': nit[solved].mean() if solved.any() else 0.,
+             'max': nit.max(), 'seeded': seeded}
+    if cold:
+        stats['cold'] = nit_cold[solved].mean() if solved.any() else 0.
+        stats['reduction'] = 1 - stats['mean'] / stats['cold'] \
+            if stats['cold'] else 0.
+    return x.reshape(shape + (4,)), stats
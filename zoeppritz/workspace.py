@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) Ezcad Development Team. All Rights Reserved.
+"""
+Reusable buffers of linearized inversion iterations.
+"""
+
+import numpy as np
+
+
+class Workspace(object):
+    """
+    Buffers for the Jacobian and residual of Ax=b, reused by the
+    iterations of cer1itr(), wan1itr() and aki1itr() and across gathers.
+
+    Parameters
+    ----------
+    m : int
+        maximum number of angles.
+    n : int
+        number of model parameters.
+    nmode : int
+        1 for PP, 2 for joint PP and PS rows.
+    dtype : dtype
+        float type of the buffers.
+
+    Attributes
+    ----------
+    A : array
+        Jacobian, shape (nmode * m, n).
+    b : array
+        residual, shape (nmode * m,).
+    """
+
+    def __init__(self, m, n, nmode=1, dtype=np.float64):
+        self.A = np.empty((nmode * m, n), dtype=dtype)
+        self.b = np.empty(nmode * m, dtype=dtype)
+
+    def views(self, m, nmode=1):
+        """
+        The leading rows for m angles, e.g. the live angles of a muted
+        gather.
+
+        Returns
+        -------
+        A, b : array
+            views of shape (nmode * m, n) and (nmode * m,).
+        """
+        rows = nmode * m
+        if rows > len(self.b):
+            raise ValueError("Workspace of %d rows, need %d" %
+                             (len(self.b), rows))
+        return self.A[:rows], self.b[:rows]